@@ -2,9 +2,15 @@
 # exit on error
 set -o errexit
 
+# Requiere DJANGO_SECRET_KEY en el entorno: sin DEBUG, settings.py no arranca sin ella
 pip install -r requirements.txt
 
 cd concesionaria
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+
+# Arranque (Start Command del servicio): gunicorn gestiona los procesos y
+# uvicorn atiende ASGI, necesario para el stock en vivo por SSE:
+#   cd concesionaria && EVENTOS_SSE_ACTIVO=1 gunicorn concesionaria.asgi:application -k uvicorn_worker.UvicornWorker
+# Con `gunicorn concesionaria.wsgi` (WSGI) dejar EVENTOS_SSE_ACTIVO sin definir.
@@ -8,12 +8,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
-from django.core.asgi import get_asgi_application
+_inicio = time.perf_counter()
+
+from django.core.asgi import get_asgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'concesionaria.settings')
 application = get_asgi_application()
 
-application = get_asgi_application()
+# Plantillas, URLs, índices y caché listos antes de la primera petición
+# (pasos en ARRANQUE_PASOS; ver myapp_conces/arranque.py)
+from myapp_conces.arranque import al_iniciar  # noqa: E402
 
-application = get_asgi_application()
+al_iniciar(_inicio, django_listo=time.perf_counter())
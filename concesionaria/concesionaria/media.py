@@ -0,0 +1,133 @@
+"""
+Servidor de archivos multimedia
+================================
+Sirve MEDIA_ROOT también en producción (DEBUG=False), con:
+
+- Cache-Control largo e `immutable` para archivos con nombre de hash
+  (autos/3f/3fa9...c1.webp, ver myapp_conces/storage.py)
+- ETag / Last-Modified y respuestas 304
+- Peticiones Range (206) para descargas parciales
+- Delegación al proxy: X-Accel-Redirect (nginx) o X-Sendfile (Apache)
+  si MEDIA_X_ACCEL_PREFIX o MEDIA_SENDFILE_HEADER están configurados
+- Si no hay proxy, FileResponse usa wsgi.file_wrapper (sendfile del servidor)
+"""
+
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Nombre generado por ImagenHashStorage: <2 hex>/<32 hex>.<ext>
+NOMBRE_HASH = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{30})\.[a-z0-9]+$')
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANO_BLOQUE = 64 * 1024
+
+
+def _rango_solicitado(request, tamano, etag):
+    """
+    Devuelve (inicio, fin) inclusivo, None si se pide el archivo completo,
+    o 'invalido' si el rango no se puede satisfacer.
+    Solo se soporta un rango; varios rangos → archivo completo.
+    """
+    cabecera = request.headers.get('Range')
+    if not cabecera:
+        return None
+    # If-Range: si el archivo cambió, se devuelve completo
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+
+    coincidencia = RANGO.match(cabecera.strip())
+    if not coincidencia:
+        return None
+    inicio, fin = coincidencia.groups()
+    if inicio == '' and fin == '':
+        return None
+    if inicio == '':
+        # bytes=-500 → últimos 500 bytes
+        largo = int(fin)
+        if largo == 0:
+            return 'invalido'
+        return max(0, tamano - largo), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def _leer_rango(ruta, inicio, fin):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        restante = fin - inicio + 1
+        while restante > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+
+
+@require_safe
+def servir_media(request, path):
+    try:
+        ruta = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    # Nada de archivos ocultos ni temporales (.tmp del storage)
+    if any(parte.startswith('.') for parte in Path(path).parts) or not ruta.is_file():
+        raise Http404
+
+    estado = ruta.stat()
+    hash_nombre = NOMBRE_HASH.search(path)
+    if hash_nombre:
+        etag = f'"{hash_nombre.group(2)}"'
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_INMUTABLE_SEGUNDOS}, immutable'
+    else:
+        etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_SEGUNDOS}'
+
+    def cabeceras(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(estado.st_mtime)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if no_modificado is not None:
+        return cabeceras(no_modificado)
+
+    content_type = mimetypes.guess_type(ruta.name)[0] or 'application/octet-stream'
+
+    # Con proxy delante: él lee el disco (y resuelve los Range)
+    if settings.MEDIA_X_ACCEL_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_X_ACCEL_PREFIX.rstrip('/') + '/' + path
+        return cabeceras(response)
+    if settings.MEDIA_SENDFILE_HEADER:
+        response = HttpResponse(content_type=content_type)
+        response[settings.MEDIA_SENDFILE_HEADER] = os.fspath(ruta)
+        return cabeceras(response)
+
+    rango = _rango_solicitado(request, estado.st_size, etag)
+    if rango == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{estado.st_size}'
+        return cabeceras(response)
+    if rango:
+        inicio, fin = rango
+        response = StreamingHttpResponse(_leer_rango(ruta, inicio, fin), status=206, content_type=content_type)
+        response['Content-Length'] = str(fin - inicio + 1)
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+        return cabeceras(response)
+
+    return cabeceras(FileResponse(open(ruta, 'rb'), content_type=content_type))
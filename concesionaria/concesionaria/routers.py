@@ -0,0 +1,176 @@
+"""
+Router de réplicas de lectura
+==============================
+Envía las lecturas de las vistas públicas de solo lectura (catálogo,
+búsqueda y detalle) a una de las réplicas configuradas. Todo lo demás
+(escrituras, carrito, compra, panel) sigue usando la base `default`.
+
+Piezas:
+- ReplicaMiddleware → decide por petición si se puede leer de réplica
+- ReplicaRouter → aplica esa decisión en db_for_read / db_for_write
+
+Read-your-writes:
+Tras una escritura (POST o una vista de REPLICA_WRITE_VIEWS) se deja una
+cookie con la hora hasta la que el usuario queda "pegado" a la primaria.
+Así quien agrega un auto al carrito no ve datos atrasados de la réplica.
+
+Salud de las réplicas:
+- Cada petición elige una réplica y la usa para todas sus lecturas.
+- La comprobación de que responde se recuerda REPLICA_HEALTH_SECONDS (no
+  se hace por consulta); si falla, la réplica queda fuera
+  REPLICA_RETRY_SECONDS.
+- Si una consulta falla en la réplica a mitad de la vista, el middleware
+  la marca caída y repite la vista contra la primaria (solo son vistas
+  GET de lectura).
+
+Prueba local con dos archivos SQLite:
+    cp db.sqlite3 replica.sqlite3
+    DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3 python manage.py runserver
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+# ¿La petición actual puede leer de una réplica? ¿Cuál eligió?
+_usar_replica = ContextVar('usar_replica', default=False)
+_replica_elegida = ContextVar('replica_elegida', default=None)
+
+# Última comprobación de cada réplica: alias → (sana, momento hasta el que vale)
+_salud_replicas = {}
+
+
+def replicas_configuradas():
+    """Alias de las réplicas declaradas en settings.DATABASES."""
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def marcar_caida(alias):
+    """Deja la réplica fuera durante REPLICA_RETRY_SECONDS."""
+    _salud_replicas[alias] = (False, time.monotonic() + settings.REPLICA_RETRY_SECONDS)
+
+
+def _replica_disponible(alias):
+    """
+    Comprueba que la réplica exista y responda. El resultado se recuerda
+    REPLICA_HEALTH_SECONDS si está sana y REPLICA_RETRY_SECONDS si falló.
+    """
+    sana, hasta = _salud_replicas.get(alias, (False, 0))
+    if hasta > time.monotonic():
+        return sana
+
+    config = settings.DATABASES[alias]
+    try:
+        if config['ENGINE'].endswith('sqlite3'):
+            # SQLite crea el archivo al conectar: si no existe, no hay réplica
+            if not Path(config['NAME']).exists():
+                raise OperationalError(f"No existe el archivo de réplica {config['NAME']}")
+        connections[alias].ensure_connection()
+    except OperationalError:
+        marcar_caida(alias)
+        return False
+
+    _salud_replicas[alias] = (True, time.monotonic() + settings.REPLICA_HEALTH_SECONDS)
+    return True
+
+
+class ReplicaRouter:
+    """
+    Lecturas a réplica solo cuando el middleware lo permite;
+    escrituras y migraciones siempre en la primaria.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _usar_replica.get():
+            return DEFAULT_DB_ALIAS
+        elegida = _replica_elegida.get()
+        if elegida is None:
+            # Una réplica por petición: todas sus lecturas ven el mismo estado
+            candidatas = [alias for alias in replicas_configuradas() if _replica_disponible(alias)]
+            elegida = random.choice(candidatas) if candidatas else DEFAULT_DB_ALIAS
+            _replica_elegida.set(elegida)
+        return elegida
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las bases contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema desde la primaria
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Marca la petición como apta para réplica si la vista está en
+    REPLICA_READ_VIEWS, el método es seguro y el usuario no escribió
+    hace menos de REPLICA_STICKY_SECONDS.
+    """
+
+    COOKIE = 'db_primaria_hasta'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _usar_replica.set(False)
+        token_elegida = _replica_elegida.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _usar_replica.reset(token)
+            _replica_elegida.reset(token_elegida)
+
+        if self._es_escritura(request):
+            hasta = int(time.time()) + settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                self.COOKIE, str(hasta),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not replicas_configuradas() or request.method not in ('GET', 'HEAD'):
+            return None
+        if self._pegado_a_primaria(request):
+            return None
+        if request.resolver_match.view_name in settings.REPLICA_READ_VIEWS:
+            _usar_replica.set(True)
+        return None
+
+    def process_exception(self, request, exception):
+        """Si la réplica falló a mitad de la vista, repetirla contra la primaria."""
+        alias = _replica_elegida.get()
+        if not isinstance(exception, DatabaseError) or alias in (None, DEFAULT_DB_ALIAS):
+            return None
+        logger.warning('Falló la réplica %s; se repite la petición en la primaria', alias, exc_info=exception)
+        marcar_caida(alias)
+        connections[alias].close()
+        _usar_replica.set(False)
+        _replica_elegida.set(None)
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
+
+    def _pegado_a_primaria(self, request):
+        try:
+            return int(request.COOKIES.get(self.COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _es_escritura(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        match = getattr(request, 'resolver_match', None)
+        return match is not None and match.view_name in settings.REPLICA_WRITE_VIEWS
@@ -13,7 +13,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,13 +25,26 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-ws-4#qxr!bf2%c6w)$atsrz8be58j##u_@t9k(=v+m%sr)^90p'
-
+# ==================================
+# ENTORNO - En producción: DJANGO_SECRET_KEY=... (DEBUG va apagado salvo DJANGO_DEBUG=1)
+# ==================================
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'  # En desarrollo: DJANGO_DEBUG=1
+
+# SECURITY WARNING: keep the secret key used in production secret!
+# Sin DEBUG es obligatoria: una clave publicada en el repositorio permitiría
+# firmar sesiones y enlaces. `manage.py test` corre con DEBUG apagado y no la necesita.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', '')
+if not SECRET_KEY:
+    if not DEBUG and sys.argv[1:2] != ['test']:
+        raise ImproperlyConfigured(
+            'Falta DJANGO_SECRET_KEY: es obligatoria con DEBUG apagado (en desarrollo usa DJANGO_DEBUG=1).'
+        )
+    SECRET_KEY = 'django-insecure-ws-4#qxr!bf2%c6w)$atsrz8be58j##u_@t9k(=v+m%sr)^90p'
 
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver', 'modulo6-concesionaria.onrender.com', '.onrender.com']
+# Hosts extra separados por comas: DJANGO_ALLOWED_HOSTS=autoventas.com,www.autoventas.com
+ALLOWED_HOSTS += [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 # ==================================
 # CONFIGURACIÓN DE AUTENTICACIÓN
@@ -68,7 +83,9 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'myapp_conces.auditoria.AuditoriaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'concesionaria.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'concesionaria.urls'
@@ -77,12 +94,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'myapp_conces.context_processors.eventos',
+            ],
+            # Cada plantilla se compila una vez por proceso (el arranque del
+            # worker las compila todas de antemano, ver arranque.py). Con
+            # DEBUG el autoreload de runserver vacía el caché al editarlas.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -94,10 +120,45 @@ WSGI_APPLICATION = 'concesionaria.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexiones persistentes: cada worker reutiliza la suya en vez de abrir
+# una por petición (0 = cerrar al terminar cada petición)
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 0 if DEBUG else 600))
+
 DATABASES = {
-    'default': dj_database_url.config(default=f'sqlite:///{BASE_DIR / "db.sqlite3"}')
+    'default': dj_database_url.config(
+        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
+        conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=DB_CONN_MAX_AGE > 0,
+    )
 }
 
+# ==================================
+# RÉPLICAS DE LECTURA
+# ==================================
+# Lista separada por comas: DATABASE_REPLICA_URLS=postgres://...,postgres://...
+for indice, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{indice}'] = dj_database_url.parse(
+        url.strip(), conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=DB_CONN_MAX_AGE > 0,
+    )
+
+DATABASE_ROUTERS = ['concesionaria.routers.ReplicaRouter']
+
+# Vistas cuyas lecturas pueden ir a una réplica
+REPLICA_READ_VIEWS = [
+    'public:catalogo',
+    'public:buscar_automovil',
+    'public:detalle_auto',
+    'api:automoviles',
+    'api:automovil',
+]
+# Vistas GET que escriben: tras ellas el usuario lee de la primaria un rato
+REPLICA_WRITE_VIEWS = [
+    'public:eliminar_del_carrito',
+    'public:finalizar_compra',
+]
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+REPLICA_HEALTH_SECONDS = int(os.environ.get('REPLICA_HEALTH_SECONDS', 5))  # Cuánto se confía en una comprobación sana
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -146,6 +207,205 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Subida de imágenes de automóviles (ver myapp_conces/storage.py e imagenes.py)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2_621_440      # Más de 2.5 MB se vuelca a disco por bloques
+IMAGEN_MAX_BYTES = 8 * 1024 * 1024           # Tamaño máximo por imagen
+IMAGEN_MAX_LADO = 8000                       # Píxeles máximos por lado de la imagen subida
+IMAGEN_LADO_NORMALIZADO = 1600               # Lado máximo tras normalizar
+IMAGEN_CALIDAD_WEBP = 82
+IMAGENES_EN_SEGUNDO_PLANO = os.environ.get('IMAGENES_EN_SEGUNDO_PLANO', '1') == '1'
+IMAGENES_HUERFANAS_HORAS = 24                # Antigüedad mínima para borrar un archivo sin referencia
+
+# Archivos subidos para importación masiva (fuera de MEDIA_ROOT: no son públicos)
+IMPORTACIONES_DIR = BASE_DIR / 'importaciones'
+
+# Entrega de archivos multimedia (ver concesionaria/media.py)
+MEDIA_CACHE_INMUTABLE_SEGUNDOS = 365 * 24 * 3600   # Nombres con hash: nunca cambian
+MEDIA_CACHE_SEGUNDOS = 3600                         # Archivos antiguos con nombre original
+# Con nginx delante: location interna que apunta a MEDIA_ROOT, p. ej. '/protected-media/'
+MEDIA_X_ACCEL_PREFIX = os.environ.get('MEDIA_X_ACCEL_PREFIX', '')
+# Con Apache + mod_xsendfile: 'X-Sendfile'
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+
+# ==================================
+# CORREO - Mensajes de contacto (ver myapp_conces/correo.py)
+# ==================================
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '0') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-responder@autoventas.local')
+CONTACTO_DESTINATARIOS = os.environ.get('CONTACTO_DESTINATARIOS', 'ventas@autoventas.local').split(',')
+CONTACTO_MAX_INTENTOS = 6
+CONTACTO_REINTENTO_BASE_SEGUNDOS = 60        # 1 min, 2 min, 4 min... hasta el tope
+CONTACTO_REINTENTO_MAX_SEGUNDOS = 3600
+CONTACTO_ALQUILER_SEGUNDOS = 300             # Tiempo que un worker reserva un lote
+
+# ==================================
+# TAREAS EN SEGUNDO PLANO (ver myapp_conces/tareas.py y `manage.py worker`)
+# ==================================
+TAREAS_COLAS = ['default', 'imagenes', 'importaciones', 'reportes']
+TAREAS_MAX_INTENTOS = 3
+TAREAS_REINTENTO_BASE_SEGUNDOS = 30
+TAREAS_REINTENTO_MAX_SEGUNDOS = 3600
+TAREAS_LATIDO_SEGUNDOS = 30          # Cada cuánto renueva el worker el latido de sus tareas
+TAREAS_TIMEOUT_SEGUNDOS = 300        # En proceso sin latido más tiempo que esto → worker caído
+TAREAS_REVISION_SEGUNDOS = 60        # Cada cuánto busca el worker tareas abandonadas
+TAREAS_RETENCION_DIAS = 7
+
+# ==================================
+# REPORTES (ver myapp_conces/reportes.py)
+# ==================================
+# Reportes imprimibles generados: el storage lo escribe el worker y lo lee la
+# web, así que tiene que ser común a ambos. Por defecto MEDIA_ROOT/.reportes
+# (el disco de media; concesionaria/media.py no sirve rutas con punto: se
+# descargan desde el panel). Sin disco común (p. ej. web y worker en Render)
+# usar un storage compartido: REPORTES_STORAGE_BACKEND=storages.backends.s3.S3Storage
+# y REPORTES_LOCATION como prefijo.
+REPORTES_STORAGE = {
+    'BACKEND': os.environ.get('REPORTES_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+    'OPTIONS': {'location': os.environ.get('REPORTES_LOCATION', str(MEDIA_ROOT / '.reportes'))},
+}
+REPORTES_LOTE = 500                  # Autos leídos y renderizados por vez
+REPORTES_MINIATURA_LADO = 160        # Píxeles de las miniaturas embebidas
+REPORTES_RETENCION_HORAS = 24
+
+# ==================================
+# ARRANQUE DE WORKERS (ver myapp_conces/arranque.py; `manage.py warmup` solo mide)
+# ==================================
+# Al cargar wsgi/asgi se ejecutan estos pasos antes de la primera petición
+ARRANQUE_CALENTAR = os.environ.get('ARRANQUE_CALENTAR', '1') == '1'
+ARRANQUE_PASOS = [
+    'myapp_conces.arranque.compilar_plantillas',
+    'myapp_conces.arranque.resolver_urls',
+    'myapp_conces.autocompletado.precargar',
+    'myapp_conces.arranque.cache_inventario',
+]
+ARRANQUE_AUTOS_EN_CACHE = 200        # Autos disponibles más recientes que se dejan en caché
+
+# ==================================
+# EVENTOS EN VIVO (ver myapp_conces/eventos.py)
+# ==================================
+# Solo al servir por ASGI (uvicorn, ver build.sh): bajo WSGI cada navegador con
+# el catálogo abierto ocuparía un worker. Apagado, /eventos/stock/ da 404 y las
+# plantillas no cargan stock.js
+EVENTOS_SSE_ACTIVO = os.environ.get('EVENTOS_SSE_ACTIVO', '0') == '1'
+# MemoriaBroker reparte solo dentro del proceso; con varios workers ASGI
+# configurar un backend compartido que implemente eventos.Broker
+EVENTOS_BROKER = os.environ.get('EVENTOS_BROKER', 'myapp_conces.eventos.MemoriaBroker')
+EVENTOS_LATIDO_SEGUNDOS = 15
+EVENTOS_DURACION_MAX_SEGUNDOS = 300  # Después se cierra; EventSource reconecta solo
+
+# ==================================
+# CACHÉ
+# ==================================
+# Un nodo: LocMemCache (por defecto) o FileBasedCache.
+# Varios nodos: una caché compartida, p. ej.
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://...
+SESSION_CACHE_BACKEND = os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # Aparte, para que las sesiones no desplacen a los autos de la caché (ni al revés)
+    'sesiones': {
+        'BACKEND': SESSION_CACHE_BACKEND,
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sesiones'),
+    },
+}
+# ¿La caché 'default' la ven todos los procesos? LocMem y Dummy no: entonces
+# los autos por id se cachean solo en el L1 de cada proceso y
+# version_inventario() se lee de la base (ver cache_automoviles.py)
+CACHES_LOCALES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+CACHE_COMPARTIDA = os.environ.get(
+    'CACHE_COMPARTIDA', '0' if CACHES['default']['BACKEND'] in CACHES_LOCALES else '1',
+) == '1'
+
+# ==================================
+# SESIONES Y MENSAJES
+# ==================================
+# Por defecto en la base: la ven todos los workers. Con una caché compartida
+# (SESSION_CACHE_BACKEND Redis o Memcached) se puede usar cached_db (se lee
+# de la caché y se escribe en caché y base a la vez) o cache (sin base).
+# Con una caché local cada worker tendría su propia copia de la sesión (un
+# logout en uno no se vería en los otros): el arranque lo rechaza
+# (ver myapp_conces/apps.py).
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+SESSION_CACHE_ALIAS = 'sesiones'
+SESSION_SAVE_EVERY_REQUEST = False  # Solo se escribe la sesión si cambió
+# Los mensajes flash viajan en una cookie firmada; solo si no caben en
+# ella se guarda el resto en la sesión
+MESSAGE_STORAGE = os.environ.get('MESSAGE_STORAGE', 'django.contrib.messages.storage.fallback.FallbackStorage')
+SESIONES_LIMPIEZA_LOTE = 1000       # Ver `manage.py limpiar_sesiones`
+
+# Automóviles por id en dos niveles (ver myapp_conces/cache_automoviles.py)
+AUTOMOVIL_CACHE_L1_MAX = 1000        # Entradas en memoria de cada proceso
+AUTOMOVIL_CACHE_L1_SEGUNDOS = 5      # Lo más que un proceso puede servir un dato ya invalidado
+AUTOMOVIL_CACHE_SEGUNDOS = 300       # Vida en la caché compartida
+
+# ==================================
+# SUCURSALES (ver myapp_conces/sucursales.py)
+# ==================================
+SUCURSAL_PRINCIPAL = 'Principal'   # Recibe el stock cargado desde el panel o la importación
+SUCURSAL_RADIO_KM = 50             # "Disponible cerca de mí"
+
+# ==================================
+# AUTOCOMPLETADO DEL BUSCADOR (ver myapp_conces/autocompletado.py)
+# ==================================
+AUTOCOMPLETADO_MAX_SUGERENCIAS = 8
+AUTOCOMPLETADO_REVISION_SEGUNDOS = 2   # Cada cuánto se mira si otro proceso cambió el inventario
+
+# ==================================
+# API DE CATÁLOGO (ver myapp_conces/api.py)
+# ==================================
+API_LIMITE_POR_DEFECTO = 50
+API_LIMITE_MAXIMO = 500
+API_CACHE_SEGUNDOS = 60    # Después el cliente revalida con If-None-Match (304 si no cambió)
+
+# ==================================
+# ANÁLISIS DE PRECIOS (ver myapp_conces/analisis_precios.py)
+# ==================================
+PRECIOS_MIN_COMPARABLES = 5      # Autos de la misma marca y año para juzgar atípicos
+PRECIOS_MAX_ATIPICOS = 50        # Atípicos listados (los más alejados de su mediana)
+PRECIOS_CACHE_SEGUNDOS = 3600    # La clave incluye version_inventario(): un cambio lo recalcula
+
+# ==================================
+# CARRITOS (ver myapp_conces/carritos.py y `manage.py limpiar_carritos`)
+# ==================================
+CARRITO_ABANDONO_DIAS = 30     # Activo sin actividad → se cierra
+CARRITO_RETENCION_DIAS = 90    # Cerrado sin compra → se borra
+CARRITO_IDEMPOTENCIA_HORAS = 24  # Cuánto se recuerda una Idempotency-Key
+CARRITO_MAX_CANTIDAD = 99      # Unidades de un auto por petición
+CARRITO_MAX_ITEMS = 50         # Autos distintos por petición a /carrito/items/
+RESERVA_MINUTOS = 15           # Cuánto aparta stock un auto agregado al carrito (ver reservas.py)
+
+# ==================================
+# AUDITORÍA DEL INVENTARIO (ver myapp_conces/auditoria.py y `manage.py compactar_auditoria`)
+# ==================================
+AUDITORIA_LOTE = 500           # Fuera de una petición: se escribe al juntar tantos cambios...
+AUDITORIA_MAX_SEGUNDOS = 5     # ...o cuando el más viejo espera más que esto
+AUDITORIA_DETALLE_DIAS = 90    # Después el historial queda resumido por auto y día
+
+# ==================================
+# LÍMITE DE PETICIONES (ver myapp_conces/limites.py)
+# ==================================
+THROTTLE_ACTIVO = os.environ.get('THROTTLE_ACTIVO', '1') == '1'
+# Proxies delante de la app: la IP del cliente es esa entrada de X-Forwarded-For
+# contando desde la derecha. Render agrega una (y define RENDER); con 0 se usa
+# REMOTE_ADDR y, detrás de un proxy, todos los anónimos compartirían límite
+THROTTLE_PROXIES_CONFIABLES = int(os.environ.get('THROTTLE_PROXIES_CONFIABLES', 1 if os.environ.get('RENDER') else 0))
+THROTTLE_LIMITES = {
+    'busqueda': {'anonimo': '30/m', 'autenticado': '120/m'},
+    'carrito': {'anonimo': '20/m', 'autenticado': '60/m'},
+    'contacto': {'anonimo': '5/h', 'autenticado': '20/h'},
+    'autocompletado': {'anonimo': '300/m', 'autenticado': '600/m'},  # Una petición por tecla
+    'api': {'anonimo': '120/m', 'autenticado': '600/m'},
+    'eventos': {'anonimo': '10/m', 'autenticado': '30/m'},  # Conexiones SSE nuevas
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
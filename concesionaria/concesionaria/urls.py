@@ -4,13 +4,14 @@ URLs principales de la aplicación Concesionaria
 Estructura organizativa:
 - / → URLs públicas (catálogo, contacto, etc.)
 - /panel/ → URLs administrativas (inventario, gestión)
+- /api/v1/ → API JSON de solo lectura del catálogo
 - /admin/ → Panel de administración de Django
 """
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from .media import servir_media
 
 urlpatterns = [
     # ========================================================================
@@ -27,10 +28,16 @@ urlpatterns = [
     # URLs ADMINISTRATIVAS - Panel de gestión con autenticación
     # ========================================================================
     path('panel/', include('myapp_login.urls')),
+
+    # ========================================================================
+    # API JSON - Solo lectura, versionada
+    # ========================================================================
+    path('api/v1/', include('myapp_conces.api_urls')),
 ]
 
 # ============================================================================
-# CONFIGURACIÓN PARA ARCHIVOS MULTIMEDIA (Solo en desarrollo)
+# ARCHIVOS MULTIMEDIA - Desarrollo y producción (ver concesionaria/media.py)
 # ============================================================================
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), servir_media, name='media'),
+]
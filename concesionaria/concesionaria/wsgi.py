@@ -8,12 +8,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+import time
 
-from django.core.wsgi import get_wsgi_application
+_inicio = time.perf_counter()
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'concesionaria.settings')
 application = get_wsgi_application()
 
-application = get_wsgi_application()
+# Plantillas, URLs, índices y caché listos antes de la primera petición
+# (pasos en ARRANQUE_PASOS; ver myapp_conces/arranque.py)
+from myapp_conces.arranque import al_iniciar  # noqa: E402
 
-application = get_wsgi_application()
+al_iniciar(_inicio, django_listo=time.perf_counter())
@@ -1,10 +1,241 @@
-from django.contrib import admin
-from .models import Automovil
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F
+from django.utils.functional import cached_property
+from .auditoria import CAMPOS_AUDITADOS, actualizar_auditado, instantanea, registrar_diferencias
+from .cache_automoviles import invalidar
+from .eventos import publicar_stock
+from .models import Automovil, CambioAutomovil, MensajeContacto, StockSucursal, Sucursal
+from .sucursales import sincronizar_totales
+
+
+# ========================================================================
+# FILTROS POR RANGO
+# Rangos fijos en vez de un enlace por valor distinto: no hay SELECT DISTINCT
+# y cada opción se resuelve con un rango sobre una columna indexada.
+# ========================================================================
+class RangoFilter(admin.SimpleListFilter):
+    """Filtro genérico por rangos (desde, hasta) sobre un campo numérico."""
+    campo = None
+    rangos = ()  # (clave, etiqueta, desde, hasta) — None = sin límite
+
+    def lookups(self, request, model_admin):
+        return [(clave, etiqueta) for clave, etiqueta, _, _ in self.rangos]
+
+    def queryset(self, request, queryset):
+        for clave, _, desde, hasta in self.rangos:
+            if self.value() == clave:
+                if desde is not None:
+                    queryset = queryset.filter(**{f'{self.campo}__gte': desde})
+                if hasta is not None:
+                    queryset = queryset.filter(**{f'{self.campo}__lt': hasta})
+                return queryset
+        return queryset
+
+
+class RangoPrecioFilter(RangoFilter):
+    title = 'precio'
+    parameter_name = 'rango_precio'
+    campo = 'precio'
+    rangos = (
+        ('0-10k', 'Menos de $10.000', None, 10000),
+        ('10k-25k', '$10.000 - $25.000', 10000, 25000),
+        ('25k-50k', '$25.000 - $50.000', 25000, 50000),
+        ('50k-100k', '$50.000 - $100.000', 50000, 100000),
+        ('100k+', 'Más de $100.000', 100000, None),
+    )
+
+
+class RangoAnioFilter(RangoFilter):
+    title = 'año'
+    parameter_name = 'rango_anio'
+    campo = 'anio'
+    rangos = (
+        ('-2000', 'Antes de 2000', None, 2000),
+        ('2000s', '2000 - 2009', 2000, 2010),
+        ('2010s', '2010 - 2019', 2010, 2020),
+        ('2020+', '2020 en adelante', 2020, None),
+    )
+
+
+# ========================================================================
+# PAGINADOR CON CONTEO ESTIMADO (PostgreSQL)
+# ========================================================================
+class PaginadorEstimado(Paginator):
+    """
+    En PostgreSQL usa las estadísticas del planificador en vez de COUNT(*):
+    - sin filtros → pg_class.reltuples
+    - con filtros → filas estimadas por EXPLAIN
+    Si la estimación es pequeña se hace el COUNT(*) real, que es barato.
+    En otros motores se comporta como el Paginator normal.
+    """
+    umbral_conteo_exacto = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                estimado = cursor.fetchone()[0]
+            else:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                estimado = plan[0]['Plan']['Plan Rows']
+
+        if estimado < self.umbral_conteo_exacto:
+            return super().count
+        return int(estimado)
+
+
+class StockSucursalInline(admin.TabularInline):
+    model = StockSucursal
+    extra = 0
+    fields = ('sucursal', 'cantidad')
+
 
 # Register your models here.
 class AutomovilAdmin(admin.ModelAdmin):
-    list_display = ('marca', 'modelo', 'anio', 'precio', 'disponible')
+    list_display = ('marca', 'modelo', 'anio', 'precio', 'cantidad', 'disponible')
+    inlines = [StockSucursalInline]
+    readonly_fields = ('cantidad', 'reservado')  # Total de las sucursales: se edita en el stock de cada una
     search_fields = ('marca', 'modelo')
-    list_filter = ('anio', 'precio')
+    list_filter = ('disponible', RangoAnioFilter, RangoPrecioFilter)
+    ordering = ('-id',)
+    sortable_by = ('anio', 'precio')  # Solo columnas indexadas
+
+    # Tablas grandes: sin COUNT(*) total ni facetas, conteo estimado al paginar
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    paginator = PaginadorEstimado
+    list_per_page = 50
+
+    actions = ['marcar_disponible', 'marcar_no_disponible', 'subir_precio_5', 'bajar_precio_5']
+
+    def _publicar_stock(self, queryset):
+        # update() no dispara señales: avisar a las páginas en vivo a mano
+        for automovil in queryset.only('id', 'cantidad', 'reservado', 'disponible').iterator():
+            publicar_stock(automovil)
+
+    def _invalidar_cache(self, queryset):
+        # Igual que arriba: la caché por id no se entera sola de un update()
+        invalidar(*queryset.values_list('id', flat=True))
+
+    # ====================================================================
+    # ACCIONES MASIVAS - Un solo UPDATE sobre los seleccionados
+    # ====================================================================
+    @admin.action(description='Marcar como disponibles', permissions=['change'])
+    def marcar_disponible(self, request, queryset):
+        actualizados = actualizar_auditado(queryset.filter(cantidad__gt=0), CambioAutomovil.EDITADO, disponible=True)
+        self._invalidar_cache(queryset)
+        self._publicar_stock(queryset)
+        self.message_user(request, f'{actualizados} automóviles marcados como disponibles.', messages.SUCCESS)
+
+    @admin.action(description='Marcar como no disponibles', permissions=['change'])
+    def marcar_no_disponible(self, request, queryset):
+        actualizados = actualizar_auditado(queryset, CambioAutomovil.EDITADO, disponible=False)
+        self._invalidar_cache(queryset)
+        self._publicar_stock(queryset)
+        self.message_user(request, f'{actualizados} automóviles marcados como no disponibles.', messages.SUCCESS)
+
+    @admin.action(description='Subir precio un 5%%', permissions=['manage_precio'])
+    def subir_precio_5(self, request, queryset):
+        actualizados = actualizar_auditado(queryset, CambioAutomovil.PRECIO, precio=F('precio') * 105 / 100)
+        self._invalidar_cache(queryset)
+        self.message_user(request, f'Precio actualizado en {actualizados} automóviles.', messages.SUCCESS)
+
+    @admin.action(description='Bajar precio un 5%%', permissions=['manage_precio'])
+    def bajar_precio_5(self, request, queryset):
+        actualizados = actualizar_auditado(queryset, CambioAutomovil.PRECIO, precio=F('precio') * 95 / 100)
+        self._invalidar_cache(queryset)
+        self.message_user(request, f'Precio actualizado en {actualizados} automóviles.', messages.SUCCESS)
+
+    def has_manage_precio_permission(self, request):
+        return request.user.has_perm('myapp_conces.manage_precio')
+
+    # ====================================================================
+    # AUDITORÍA - Altas, ediciones y bajas quedan en CambioAutomovil
+    # ====================================================================
+    def save_model(self, request, obj, form, change):
+        # El formulario ya copió los datos nuevos en `obj`: lo previo está en form.initial
+        campos = [campo for campo in CAMPOS_AUDITADOS if campo in form.fields]
+        antes = {campo: form.initial.get(campo) for campo in campos} if change else {}
+        super().save_model(request, obj, form, change)
+        despues = instantanea(obj)
+        if change:
+            despues = {campo: despues[campo] for campo in campos}
+        registrar_diferencias(obj.id, CambioAutomovil.EDITADO if change else CambioAutomovil.CREADO, antes, despues)
+
+    def delete_model(self, request, obj):
+        automovil_id, antes = obj.id, instantanea(obj)
+        super().delete_model(request, obj)
+        registrar_diferencias(automovil_id, CambioAutomovil.ELIMINADO, antes, {})
+
+    def delete_queryset(self, request, queryset):
+        antes = {automovil.id: instantanea(automovil) for automovil in queryset}
+        super().delete_queryset(request, queryset)
+        for automovil_id, valores in antes.items():
+            registrar_diferencias(automovil_id, CambioAutomovil.ELIMINADO, valores, {})
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sincronizar_totales([form.instance.id])
 
 admin.site.register(Automovil, AutomovilAdmin)
+
+
+class MensajeContactoAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'correo', 'creado', 'estado', 'intentos', 'proximo_intento')
+    list_filter = ('estado',)
+    search_fields = ('correo',)
+    ordering = ('-id',)
+    show_full_result_count = False
+
+admin.site.register(MensajeContacto, MensajeContactoAdmin)
+
+
+class SucursalAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'ciudad', 'activa')
+    list_filter = ('activa',)
+    search_fields = ('nombre', 'ciudad')
+
+admin.site.register(Sucursal, SucursalAdmin)
+
+
+class CambioAutomovilAdmin(admin.ModelAdmin):
+    """Historial de solo lectura: se filtra por auto o por usuario (ambos indexados)."""
+    list_display = ('fecha', 'automovil_id', 'usuario', 'accion', 'cambios')
+    list_filter = ('accion',)
+    list_select_related = ('usuario',)
+    ordering = ('-fecha',)
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+
+    def get_search_results(self, request, queryset, search_term):
+        # "123" → historial del auto 123 (índice automovil_id, -fecha)
+        if search_term.isdigit():
+            return queryset.filter(automovil_id=int(search_term)), False
+        return queryset, False
+
+    search_help_text = 'Id del automóvil'
+    search_fields = ('automovil_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(CambioAutomovil, CambioAutomovilAdmin)
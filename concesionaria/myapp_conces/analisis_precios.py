@@ -0,0 +1,194 @@
+"""
+Análisis de precios
+====================
+Para quien gestiona precios (permiso manage_precio): cómo está cada auto
+respecto de los comparables del inventario, sin exportar y analizar a mano.
+
+- Percentiles de precio de todo el inventario.
+- Curva de precios por marca y año: cuartiles de cada (marca, año).
+- Atípicos: autos fuera de [Q1 - 1.5·IQR, Q3 + 1.5·IQR] de su (marca, año),
+  solo en grupos con al menos PRECIOS_MIN_COMPARABLES autos.
+- Banda sugerida por (marca, año): Q1, mediana y Q3 sin los atípicos.
+
+Las columnas (marca, modelo, anio, precio, cantidad) se leen con un solo
+values_list() y se pasan a arrays de NumPy; todo el cálculo es vectorial
+(un ordenamiento por grupo y precio, sin bucles por auto). El resultado se
+guarda en la caché por version_inventario(): mientras el inventario no
+cambie no se vuelve a leer la base.
+"""
+
+import numpy as np
+from django.core.cache import cache
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .cache_automoviles import version_inventario
+from .models import Automovil
+
+PERCENTILES = [5, 10, 25, 50, 75, 90, 95]
+CUARTILES = np.array([0.25, 0.5, 0.75])
+FACTOR_IQR = 1.5
+
+
+# ========================================================================
+# CÁLCULO VECTORIAL
+# ========================================================================
+def _codificar(valores):
+    """(códigos int32, nombres): un entero por valor distinto, sin distinguir mayúsculas."""
+    # Pocos valores distintos: se normalizan esos y no cada fila
+    codigos, nombres, por_valor = {}, [], {}
+    for valor in sorted(set(valores)):
+        clave = valor.strip().lower()
+        if clave not in codigos:
+            codigos[clave] = len(codigos)
+            nombres.append(valor.strip())
+        por_valor[valor] = codigos[clave]
+    return np.fromiter(map(por_valor.__getitem__, valores), dtype=np.int32, count=len(valores)), nombres
+
+
+def _ordenar(grupos, por_precio):
+    """Índices ordenados por grupo y, dentro de cada grupo, por precio (`por_precio` = argsort de precios)."""
+    # Orden estable sobre el orden por precio: el precio queda ordenado dentro
+    # de cada grupo. Con enteros de 16 bits NumPy usa radix sort (lineal).
+    tipo = np.uint16 if grupos.max() < 2 ** 16 else np.int64
+    return por_precio[np.argsort(grupos[por_precio].astype(tipo), kind='stable')]
+
+
+def _cuartiles_por_grupo(grupos, precios, orden):
+    """
+    Cuartiles (interpolación lineal, como np.percentile) de `precios` dentro
+    de cada grupo, con `orden` de _ordenar(). Devuelve (grupo de cada fila
+    de la salida, conteos, matriz grupos x 3 con Q1, mediana y Q3, índice
+    de grupo de cada fila de entrada).
+    """
+    grupos_ordenados = grupos[orden]
+    precios_ordenados = precios[orden]
+    inicios = np.flatnonzero(np.r_[True, grupos_ordenados[1:] != grupos_ordenados[:-1]])
+    conteos = np.diff(np.r_[inicios, len(grupos_ordenados)])
+    posiciones = inicios[:, None] + CUARTILES[None, :] * (conteos[:, None] - 1)
+    abajo = np.floor(posiciones).astype(np.int64)
+    arriba = np.ceil(posiciones).astype(np.int64)
+    cuartiles = precios_ordenados[abajo] + (precios_ordenados[arriba] - precios_ordenados[abajo]) * (posiciones - abajo)
+    indice = np.full(len(grupos), -1, dtype=np.int64)  # -1: filas que no están en `orden`
+    indice[orden] = np.repeat(np.arange(len(inicios)), conteos)
+    return grupos_ordenados[inicios], conteos, cuartiles, indice
+
+
+def _redondear(valores):
+    return [round(float(valor), 2) for valor in valores]
+
+
+def analizar(marcas, modelos, anios, precios, cantidades):
+    """
+    Análisis de las columnas dadas (listas o arrays de igual largo).
+    Devuelve un dict serializable a JSON.
+    """
+    total = len(precios)
+    if not total:
+        return {'autos': 0, 'unidades': 0, 'percentiles': {}, 'marcas': [], 'atipicos': [], 'total_atipicos': 0}
+    precios = np.asarray(precios, dtype=np.float64)
+    anios = np.asarray(anios, dtype=np.int64)
+    cantidades = np.asarray(cantidades, dtype=np.int64)
+    codigos_marca, nombres_marca = _codificar(marcas)
+
+    # Grupo (marca, año) como un solo entero
+    anio_minimo = anios.min()
+    ancho = int(anios.max() - anio_minimo) + 1
+    grupos = codigos_marca.astype(np.int64) * ancho + (anios - anio_minimo)
+    por_precio = np.argsort(precios)  # Un solo ordenamiento por precio para todos los cálculos
+    orden = _ordenar(grupos, por_precio)
+    claves, conteos, cuartiles, indice = _cuartiles_por_grupo(grupos, precios, orden)
+    unidades = np.bincount(indice, weights=cantidades, minlength=len(claves))
+
+    # Atípicos: regla de Tukey dentro de su grupo, si el grupo es comparable
+    q1, mediana, q3 = cuartiles[indice].T
+    iqr = q3 - q1
+    comparable = conteos[indice] >= settings.PRECIOS_MIN_COMPARABLES
+    atipico = comparable & ((precios < q1 - FACTOR_IQR * iqr) | (precios > q3 + FACTOR_IQR * iqr))
+
+    # Banda sugerida: cuartiles del grupo sin sus atípicos (ningún grupo queda
+    # vacío: por definición la mediana nunca es atípica)
+    claves_banda, _, banda, _ = _cuartiles_por_grupo(grupos, precios, orden[~atipico[orden]])
+    banda = banda[np.searchsorted(claves_banda, claves)]
+
+    # Mediana por marca (todas las filas)
+    marcas_con_autos, autos_por_marca, cuartiles_marca, _ = _cuartiles_por_grupo(
+        codigos_marca, precios, _ordenar(codigos_marca, por_precio),
+    )
+
+    curvas = {}
+    for i, clave in enumerate(claves.tolist()):
+        codigo, desplazamiento = divmod(clave, ancho)
+        p25, p50, p75 = _redondear(cuartiles[i])
+        minimo, objetivo, maximo = _redondear(banda[i])
+        curvas.setdefault(codigo, []).append({
+            'anio': int(anio_minimo) + desplazamiento,
+            'autos': int(conteos[i]),
+            'unidades': int(unidades[i]),
+            'p25': p25, 'mediana': p50, 'p75': p75,
+            'banda': {'minimo': minimo, 'objetivo': objetivo, 'maximo': maximo},
+            'confiable': bool(conteos[i] >= settings.PRECIOS_MIN_COMPARABLES),
+        })
+    resumen_marcas = [
+        {
+            'marca': nombres_marca[codigo],
+            'autos': int(autos_por_marca[i]),
+            'mediana': round(float(cuartiles_marca[i, 1]), 2),
+            'curva': curvas[codigo],
+        }
+        for i, codigo in enumerate(marcas_con_autos.tolist())
+    ]
+    resumen_marcas.sort(key=lambda marca: marca['marca'].lower())
+
+    # Los atípicos más alejados de la mediana de su grupo (en proporción)
+    posiciones = np.flatnonzero(atipico)
+    desvios = precios[posiciones] / np.where(mediana[posiciones] > 0, mediana[posiciones], np.nan) - 1
+    peores = posiciones[np.argsort(-np.abs(np.nan_to_num(desvios, nan=np.inf)))][:settings.PRECIOS_MAX_ATIPICOS]
+    atipicos = [
+        {
+            'marca': nombres_marca[codigos_marca[i]],
+            'modelo': modelos[i],
+            'anio': int(anios[i]),
+            'precio': round(float(precios[i]), 2),
+            'mediana': round(float(mediana[i]), 2),
+            'banda': _redondear(banda[indice[i]][[0, 2]]),
+            'desvio': round(float(precios[i] / mediana[i] - 1) * 100, 1) if mediana[i] > 0 else None,
+        }
+        for i in peores.tolist()
+    ]
+
+    return {
+        'autos': total,
+        'unidades': int(cantidades.sum()),
+        'percentiles': dict(zip((f'p{p}' for p in PERCENTILES), _redondear(np.percentile(precios, PERCENTILES)))),
+        'marcas': resumen_marcas,
+        'atipicos': atipicos,
+        'total_atipicos': int(atipico.sum()),
+    }
+
+
+# ========================================================================
+# LECTURA Y CACHÉ
+# ========================================================================
+def _columnas():
+    """Las cinco columnas en una consulta; el precio llega como float (sin crear Decimal por fila)."""
+    filas = list(
+        Automovil.objects.order_by()
+        .values_list('marca', 'modelo', 'anio', Cast('precio', FloatField()), 'cantidad')
+    )
+    if not filas:
+        return [], [], [], [], []
+    return [list(columna) for columna in zip(*filas)]
+
+
+def analisis():
+    """Análisis del inventario actual, calculado una vez por versión del inventario."""
+    version = version_inventario()
+    clave = f'precios:analisis:{version}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = analizar(*_columnas())
+        resultado['version'] = version
+        cache.set(clave, resultado, timeout=settings.PRECIOS_CACHE_SEGUNDOS)
+    return resultado
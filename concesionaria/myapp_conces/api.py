@@ -0,0 +1,276 @@
+"""
+API de catálogo (solo lectura) - v1
+====================================
+Para sitios asociados y apps móviles que sincronizan el inventario:
+
+    GET /api/v1/automoviles/?fields=marca,modelo,precio&disponible=true&limite=200
+    GET /api/v1/automoviles/<id>/?fields=precio,cantidad
+
+Parámetros del listado:
+- fields: columnas a devolver (el id va siempre); solo esas se consultan
+- marca, anio, anio_min, anio_max, precio_min, precio_max, disponible
+- orden: id (por defecto), precio, -precio, anio, -anio
+- limite: filas por página (máx. API_LIMITE_MAXIMO)
+- cursor: el valor de `siguiente` de la página anterior
+
+Paginación por cursor (keyset): cada página continúa con WHERE
+(orden, id) > (último visto), así la página 1000 cuesta lo mismo que la
+primera y no se saltan ni repiten filas si el inventario cambia entre páginas.
+
+Las filas salen de values_list() (tuplas, sin instanciar modelos) y se
+serializan con orjson si está instalado. Las respuestas llevan un ETag
+basado en version_inventario(): un cliente que repite la consulta sin
+cambios recibe 304 sin tocar la base. Se comprimen con brotli (si está
+instalado) o gzip según Accept-Encoding.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+from .cache_automoviles import version_inventario
+from .limites import limitar_peticiones
+from .models import Automovil
+
+try:
+    import orjson
+except ImportError:  # Sin orjson: json de la biblioteca estándar (más lento)
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Sin brotli: solo gzip
+    brotli = None
+
+CAMPOS = ['id', 'marca', 'modelo', 'anio', 'precio', 'disponible', 'cantidad', 'descripcion', 'imagen']
+ORDENES = {
+    'id': ('id', False),
+    'precio': ('precio', False),
+    '-precio': ('precio', True),
+    'anio': ('anio', False),
+    '-anio': ('anio', True),
+}
+MINIMO_PARA_COMPRIMIR = 860  # Bytes: por debajo la compresión no compensa
+
+
+class ErrorConsulta(ValueError):
+    pass
+
+
+# ========================================================================
+# SERIALIZACIÓN Y COMPRESIÓN
+# ========================================================================
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)  # Precio exacto, sin pasar por float
+    raise TypeError(f'No se puede serializar {type(valor).__name__}')
+
+
+def _a_json(datos):
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto)
+    return json.dumps(datos, default=_por_defecto, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _comprimir(request, response):
+    """Comprime según Accept-Encoding: br si hay brotli, si no gzip."""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if len(response.content) < MINIMO_PARA_COMPRIMIR:
+        return response
+    aceptadas = {
+        codificacion.split(';')[0].strip()
+        for codificacion in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    if brotli is not None and 'br' in aceptadas:
+        response.content = brotli.compress(response.content, quality=5)
+        response['Content-Encoding'] = 'br'
+    elif 'gzip' in aceptadas:
+        response.content = gzip.compress(response.content, compresslevel=6)
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _respuesta(request, datos, etag):
+    response = HttpResponse(_a_json(datos), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.API_CACHE_SEGUNDOS}'
+    return _comprimir(request, response)
+
+
+def _etag(request):
+    """
+    ETag de la consulta: cambia con el inventario o con los parámetros.
+    Débil (W/) porque vale para cualquier compresión de la misma respuesta.
+    """
+    huella = hashlib.sha256(f'{version_inventario()}|{request.get_full_path()}'.encode()).hexdigest()[:32]
+    return f'W/"{huella}"'
+
+
+def _no_modificado(request, etag):
+    if etag not in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def _error(mensaje, estado=400):
+    return HttpResponse(_a_json({'error': mensaje}), status=estado, content_type='application/json')
+
+
+# ========================================================================
+# PARÁMETROS
+# ========================================================================
+def _campos(request):
+    pedidos = request.GET.get('fields')
+    if not pedidos:
+        return CAMPOS
+    campos = [campo.strip() for campo in pedidos.split(',') if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in CAMPOS]
+    if desconocidos:
+        raise ErrorConsulta(f'Campos desconocidos: {", ".join(desconocidos)}')
+    return ['id'] + [campo for campo in campos if campo != 'id']
+
+
+def _numero(parametros, nombre, tipo):
+    valor = parametros.get(nombre)
+    if valor in (None, ''):
+        return None
+    try:
+        return tipo(valor)
+    except (ValueError, ArithmeticError):
+        raise ErrorConsulta(f'Valor inválido para {nombre}: {valor}')
+
+
+def filtrar(parametros, queryset):
+    """
+    Aplica los filtros del listado (marca, anio, anio_min, anio_max,
+    precio_min, precio_max, disponible) tomados de `parametros` (request.GET
+    o un dict). También los usa el reporte imprimible del panel.
+    """
+    if parametros.get('marca'):
+        queryset = queryset.filter(marca__iexact=parametros['marca'])
+    filtros = {
+        'anio': ('anio', int),
+        'anio_min': ('anio__gte', int),
+        'anio_max': ('anio__lte', int),
+        'precio_min': ('precio__gte', Decimal),
+        'precio_max': ('precio__lte', Decimal),
+    }
+    for parametro, (lookup, tipo) in filtros.items():
+        valor = _numero(parametros, parametro, tipo)
+        if valor is not None:
+            queryset = queryset.filter(**{lookup: valor})
+    disponible = parametros.get('disponible')
+    if disponible is not None:
+        if disponible.lower() not in ('true', 'false', '1', '0'):
+            raise ErrorConsulta('disponible debe ser true o false')
+        queryset = queryset.filter(disponible=disponible.lower() in ('true', '1'))
+    return queryset
+
+
+def _codificar_cursor(valores):
+    return base64.urlsafe_b64encode(_a_json(valores)).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ErrorConsulta('cursor inválido')
+
+
+def _paginar(queryset, orden, cursor):
+    campo, descendente = ORDENES[orden]
+    if cursor:
+        ultimo = _decodificar_cursor(cursor)
+        try:
+            if campo == 'id':
+                queryset = queryset.filter(id__gt=int(ultimo[0]))
+            else:
+                valor = Decimal(ultimo[0]) if campo == 'precio' else int(ultimo[0])
+                ultimo_id = int(ultimo[1])
+                # (campo, id) > (valor, ultimo_id) respetando la dirección del orden
+                despues = Q(**{f'{campo}__lt' if descendente else f'{campo}__gt': valor})
+                queryset = queryset.filter(despues | Q(**{campo: valor, 'id__gt': ultimo_id}))
+        except (TypeError, KeyError, IndexError, ValueError, ArithmeticError):
+            raise ErrorConsulta('cursor inválido')
+    if campo == 'id':
+        return queryset.order_by('id')
+    return queryset.order_by(f'-{campo}' if descendente else campo, 'id')
+
+
+def _filas(queryset, campos):
+    """Tuplas de values_list() → dicts, con la imagen como URL."""
+    url_media = settings.MEDIA_URL
+    indice_imagen = campos.index('imagen') if 'imagen' in campos else None
+    for fila in queryset.values_list(*campos):
+        if indice_imagen is not None:
+            fila = list(fila)
+            fila[indice_imagen] = url_media + fila[indice_imagen] if fila[indice_imagen] else None
+        yield dict(zip(campos, fila))
+
+
+# ========================================================================
+# VISTAS
+# ========================================================================
+@require_GET
+@limitar_peticiones('api')
+def lista_automoviles(request):
+    etag = _etag(request)
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    try:
+        campos = _campos(request)
+        orden = request.GET.get('orden', 'id')
+        if orden not in ORDENES:
+            raise ErrorConsulta(f'orden debe ser uno de: {", ".join(ORDENES)}')
+        limite = _numero(request.GET, 'limite', int) or settings.API_LIMITE_POR_DEFECTO
+        limite = max(1, min(limite, settings.API_LIMITE_MAXIMO))
+        queryset = _paginar(filtrar(request.GET, Automovil.objects.all()), orden, request.GET.get('cursor'))
+        campo_orden = ORDENES[orden][0]
+        columnas = campos if campo_orden in campos else campos + [campo_orden]
+        # Una fila de más para saber si hay página siguiente, sin COUNT(*)
+        filas = list(_filas(queryset[:limite + 1], columnas))
+    except ErrorConsulta as error:
+        return _error(str(error))
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        valores = [ultima['id']] if campo_orden == 'id' else [ultima[campo_orden], ultima['id']]
+        siguiente = _codificar_cursor(valores)
+    if columnas is not campos:
+        for fila in filas:
+            del fila[campo_orden]
+
+    return _respuesta(request, {'resultados': filas, 'siguiente': siguiente}, etag)
+
+
+@require_GET
+@limitar_peticiones('api')
+def detalle_automovil(request, automovil_id):
+    etag = _etag(request)
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
+    try:
+        campos = _campos(request)
+    except ErrorConsulta as error:
+        return _error(str(error))
+    fila = next(_filas(Automovil.objects.filter(id=automovil_id), campos), None)
+    if fila is None:
+        return _error('No existe el automóvil.', estado=404)
+    return _respuesta(request, fila, etag)
@@ -0,0 +1,21 @@
+"""
+URLs de la API - myapp_conces
+==============================
+API JSON de solo lectura del catálogo (ver api.py).
+Prefijo: /api/v1/
+
+Estructura:
+- /api/v1/automoviles/ → Listado con filtros, campos y cursor
+- /api/v1/automoviles/<id>/ → Un automóvil
+"""
+
+from django.urls import path
+from . import api
+
+# Namespace para la API
+app_name = 'api'
+
+urlpatterns = [
+    path('automoviles/', api.lista_automoviles, name='automoviles'),
+    path('automoviles/<int:automovil_id>/', api.detalle_automovil, name='automovil'),
+]
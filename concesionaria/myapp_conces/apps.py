@@ -1,7 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+MOTORES_SESION_EN_CACHE = ('django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db')
+
+
+def verificar_sesiones():
+    """Las sesiones en caché necesitan una caché que vean todos los procesos."""
+    if settings.SESSION_ENGINE not in MOTORES_SESION_EN_CACHE:
+        return
+    backend = settings.CACHES[settings.SESSION_CACHE_ALIAS]['BACKEND']
+    if backend in settings.CACHES_LOCALES:
+        raise ImproperlyConfigured(
+            f'SESSION_ENGINE={settings.SESSION_ENGINE} con la caché local {backend}: cada worker tendría '
+            'sus propias sesiones. Configurar SESSION_CACHE_BACKEND compartido (Redis o Memcached) '
+            'o usar django.contrib.sessions.backends.db.'
+        )
 
 
 class MyappConcesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp_conces'
     label = 'myapp_conces'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registra los receptores)
+        verificar_sesiones()
@@ -0,0 +1,159 @@
+"""
+Arranque de workers
+====================
+Un worker nuevo (gunicorn/uvicorn) empieza en frío: las plantillas se
+compilan, los resolvers de URL se arman y los índices en memoria se
+construyen en la primera petición que los necesita. Para que escalar no
+produzca picos de latencia, wsgi.py y asgi.py llaman a `al_iniciar()`:
+
+1. Ejecuta los pasos de ARRANQUE_PASOS (rutas a funciones sin argumentos)
+   y mide cuánto tarda cada uno. Para agregar un paso basta con sumarlo a
+   esa lista. Si un paso falla se registra y se sigue con el siguiente:
+   lo que no se precargó se hará en la primera petición, como antes.
+2. Mide el arranque completo (desde que se importó wsgi/asgi) y la
+   latencia de la primera petición que atiende el proceso.
+
+Los tiempos se registran en el log y se consultan en
+/panel/arranque/metricas/ (los del worker que responde).
+`manage.py warmup` es solo una sonda de latencia: corre los mismos pasos
+en su propio proceso y mide peticiones de prueba, pero no calienta a los
+workers (cada uno se calienta aquí, al cargar wsgi/asgi).
+
+Con gunicorn --preload los pasos corren una vez en el proceso maestro y
+cada worker hereda lo precargado; por eso al terminar se cierran las
+conexiones a la base (cada worker abre las suyas).
+"""
+
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+
+from .cache_automoviles import obtener_varios, version_inventario
+from .models import Automovil
+
+logger = logging.getLogger(__name__)
+
+_metricas = {
+    'arranque_segundos': None,
+    'django_segundos': None,
+    'pasos': {},
+    'primera_peticion_segundos': None,
+}
+_primera_peticion = {}
+
+
+# ========================================================================
+# PASOS
+# ========================================================================
+def compilar_plantillas():
+    """Compila (y deja en el cached.Loader) las plantillas del proyecto. Devuelve cuántas."""
+    compiladas = set()
+    for motor in engines.all():
+        if not isinstance(motor, DjangoTemplates):
+            continue
+        for loader in motor.engine.template_loaders:
+            for directorio in loader.get_dirs():
+                # Solo las de este proyecto (las dos apps y DIRS), no las de django.contrib
+                if not os.path.abspath(directorio).startswith(str(settings.BASE_DIR)):
+                    continue
+                for raiz, _, archivos in os.walk(directorio):
+                    for archivo in archivos:
+                        nombre = os.path.relpath(os.path.join(raiz, archivo), directorio).replace(os.sep, '/')
+                        if nombre in compiladas:
+                            continue  # Mismo nombre en otra app: se usa el primero
+                        try:
+                            motor.engine.get_template(nombre)
+                        except TemplateSyntaxError:
+                            logger.exception('No se pudo compilar la plantilla %s', nombre)
+                        compiladas.add(nombre)
+    return len(compiladas)
+
+
+def resolver_urls():
+    """Arma los resolvers (expresiones compiladas y tablas de reverse()) de todos los namespaces."""
+    pendientes = [get_resolver()]
+    armados = 0
+    while pendientes:
+        resolver = pendientes.pop()
+        resolver.reverse_dict  # noqa: B018  (se arma al leerlo)
+        armados += 1
+        pendientes.extend(subresolver for _, subresolver in resolver.namespace_dict.values())
+    return armados
+
+
+def cache_inventario():
+    """Fija version_inventario() y deja en caché los autos disponibles más recientes."""
+    version_inventario()
+    ids = list(
+        Automovil.objects.filter(disponible=True).order_by('-id')
+        .values_list('id', flat=True)[:settings.ARRANQUE_AUTOS_EN_CACHE]
+    )
+    return len(obtener_varios(ids))
+
+
+# ========================================================================
+# CALENTAMIENTO Y MEDICIÓN
+# ========================================================================
+def calentar(pasos=None):
+    """
+    Ejecuta los pasos (por defecto ARRANQUE_PASOS) y devuelve
+    [(paso, segundos, resultado o None, error o None)].
+    """
+    resultados = []
+    for ruta in pasos or settings.ARRANQUE_PASOS:
+        inicio = time.perf_counter()
+        resultado = error = None
+        try:
+            resultado = import_string(ruta)()
+        except Exception as excepcion:  # Un paso que falla no debe impedir que el worker arranque
+            logger.exception('Falló el paso de arranque %s', ruta)
+            error = f'{type(excepcion).__name__}: {excepcion}'
+        resultados.append((ruta, time.perf_counter() - inicio, resultado, error))
+    return resultados
+
+
+def _inicio_primera_peticion(**kwargs):
+    request_started.disconnect(_inicio_primera_peticion)
+    _primera_peticion['inicio'] = time.perf_counter()
+
+
+def _fin_primera_peticion(**kwargs):
+    inicio = _primera_peticion.pop('inicio', None)
+    if inicio is None:
+        return
+    request_finished.disconnect(_fin_primera_peticion)
+    _metricas['primera_peticion_segundos'] = round(time.perf_counter() - inicio, 4)
+    logger.info('Worker %s: primera petición en %.3fs', os.getpid(), _metricas['primera_peticion_segundos'])
+
+
+def al_iniciar(inicio, django_listo):
+    """
+    Llamado desde wsgi.py/asgi.py con los perf_counter() de cuando se
+    empezó a cargar el módulo y de cuando Django quedó configurado.
+    """
+    if settings.ARRANQUE_CALENTAR:
+        for ruta, segundos, _, error in calentar():
+            _metricas['pasos'][ruta] = {'segundos': round(segundos, 4), 'error': error}
+        connections.close_all()
+    _metricas['django_segundos'] = round(django_listo - inicio, 4)
+    _metricas['arranque_segundos'] = round(time.perf_counter() - inicio, 4)
+    logger.info(
+        'Worker %s listo en %.3fs (Django %.3fs, calentamiento %.3fs)',
+        os.getpid(), _metricas['arranque_segundos'], _metricas['django_segundos'],
+        _metricas['arranque_segundos'] - _metricas['django_segundos'],
+    )
+    request_started.connect(_inicio_primera_peticion)
+    request_finished.connect(_fin_primera_peticion)
+
+
+def metricas():
+    """Tiempos de arranque de este proceso (para el panel)."""
+    return dict(_metricas, pid=os.getpid())
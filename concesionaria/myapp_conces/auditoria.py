@@ -0,0 +1,243 @@
+"""
+Auditoría del inventario
+=========================
+Historial de cambios de Automovil campo por campo: quién, cuándo y
+{campo: [antes, después]}. Una fila de CambioAutomovil por cambio (no
+por campo) y sin FK al auto, para que el historial sobreviva al borrado.
+
+Las filas no se escriben en el momento:
+- En una petición (AuditoriaMiddleware) se juntan y se escriben con un
+  solo bulk_create al terminar, después de la respuesta de la vista.
+- En tareas (tareas.ejecutar) igual, al terminar cada tarea.
+- En otros procesos (comandos) se juntan por proceso y se escriben cada
+  AUDITORIA_LOTE cambios o AUDITORIA_MAX_SEGUNDOS, y al salir.
+
+Un cambio se anota al confirmarse su transacción: lo revertido no queda
+en el historial.
+
+Consultas: `historial(automovil_id)` y `cambios_de(usuario_id)` usan los
+índices (automovil_id, -fecha) y (usuario, -fecha).
+`manage.py compactar_auditoria` resume por auto y día lo anterior a
+AUDITORIA_DETALLE_DIAS (ResumenCambiosAutomovil) y borra el detalle.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from .models import CambioAutomovil, ResumenCambiosAutomovil
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_AUDITADOS = ['marca', 'modelo', 'anio', 'precio', 'cantidad', 'disponible', 'descripcion', 'imagen']
+
+_pendientes = ContextVar('auditoria_pendientes', default=None)
+_request = ContextVar('auditoria_request', default=None)
+
+
+class _BufferProceso:
+    """Cambios anotados fuera de una petición o tarea."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filas = []
+        self._desde = None
+
+    def agregar(self, fila):
+        with self._lock:
+            self._filas.append(fila)
+            self._desde = self._desde or time.monotonic()
+            lleno = (
+                len(self._filas) >= settings.AUDITORIA_LOTE
+                or time.monotonic() - self._desde >= settings.AUDITORIA_MAX_SEGUNDOS
+            )
+        if lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        with self._lock:
+            filas, self._filas, self._desde = self._filas, [], None
+        _escribir(filas)
+
+
+_proceso = _BufferProceso()
+atexit.register(_proceso.vaciar)
+
+
+def _escribir(filas):
+    if not filas:
+        return
+    try:
+        CambioAutomovil.objects.bulk_create(filas, batch_size=settings.AUDITORIA_LOTE)
+    except DatabaseError:
+        # El historial no debe tumbar la operación que lo originó
+        logger.exception('No se pudieron guardar %s cambios de auditoría', len(filas))
+
+
+# ========================================================================
+# ANOTAR CAMBIOS
+# ========================================================================
+def _valor(valor):
+    """Valor de un campo tal como se guarda en el JSON."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, FieldFile):
+        return valor.name or None
+    if valor == '':
+        return None  # Texto opcional: vacío y nulo son lo mismo para el historial
+    return valor
+
+
+def instantanea(automovil):
+    """Valores auditados de un auto, para comparar después de cambiarlo."""
+    return {campo: _valor(getattr(automovil, campo)) for campo in CAMPOS_AUDITADOS}
+
+
+def _usuario_actual():
+    request = _request.get()
+    usuario = getattr(request, 'user', None)
+    return usuario.id if usuario is not None and usuario.is_authenticated else None
+
+
+def registrar(automovil_id, accion, cambios, usuario_id=None):
+    """
+    Anota un cambio de `automovil_id` ({campo: [antes, después]}). Sin
+    `usuario_id` se usa el de la petición en curso, si la hay.
+    """
+    if not cambios:
+        return
+    fila = CambioAutomovil(
+        automovil_id=automovil_id, accion=accion, fecha=timezone.now(),
+        usuario_id=usuario_id if usuario_id is not None else _usuario_actual(),
+        cambios={campo: [_valor(antes), _valor(despues)] for campo, (antes, despues) in cambios.items()},
+    )
+    pendientes = _pendientes.get()
+    transaction.on_commit(lambda: pendientes.append(fila) if pendientes is not None else _proceso.agregar(fila))
+
+
+def registrar_diferencias(automovil_id, accion, antes, despues, usuario_id=None):
+    """Anota los campos que difieren entre dos instantáneas ({} para alta o baja)."""
+    cambios = {
+        campo: (_valor(antes.get(campo)), _valor(despues.get(campo)))
+        for campo in CAMPOS_AUDITADOS
+        if _valor(antes.get(campo)) != _valor(despues.get(campo))
+    }
+    registrar(automovil_id, accion, cambios, usuario_id)
+
+
+def actualizar_auditado(queryset, accion, **valores):
+    """
+    queryset.update(**valores) anotando el cambio de cada fila que cambió.
+    Lee los campos afectados antes y después (dos consultas).
+    """
+    campos = [campo for campo in valores if campo in CAMPOS_AUDITADOS]
+    with transaction.atomic():
+        antes = {fila[0]: fila[1:] for fila in queryset.values_list('id', *campos)}
+        actualizados = queryset.model.objects.filter(id__in=antes).update(**valores)
+        for fila in queryset.model.objects.filter(id__in=antes).values_list('id', *campos):
+            registrar(fila[0], accion, {
+                campo: (anterior, nuevo)
+                for campo, anterior, nuevo in zip(campos, antes[fila[0]], fila[1:])
+                if anterior != nuevo
+            })
+    return actualizados
+
+
+@contextmanager
+def en_lote(request=None):
+    """Junta los cambios anotados dentro del bloque y los escribe juntos al salir."""
+    token_pendientes = _pendientes.set([])
+    token_request = _request.set(request)
+    try:
+        yield
+    finally:
+        filas = _pendientes.get()
+        _pendientes.reset(token_pendientes)
+        _request.reset(token_request)
+        _escribir(filas)
+
+
+class AuditoriaMiddleware:
+    """Un bulk_create por petición con los cambios de inventario que hizo."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with en_lote(request):
+            return self.get_response(request)
+
+
+# ========================================================================
+# CONSULTAS
+# ========================================================================
+def historial(automovil_id, limite=50):
+    return list(
+        CambioAutomovil.objects.filter(automovil_id=automovil_id)
+        .select_related('usuario').order_by('-fecha')[:limite]
+    )
+
+
+def cambios_de(usuario_id, limite=50):
+    return list(CambioAutomovil.objects.filter(usuario_id=usuario_id).order_by('-fecha')[:limite])
+
+
+# ========================================================================
+# COMPACTACIÓN
+# ========================================================================
+def compactar(dias, tamano_lote=1000):
+    """
+    Resume por auto y día los cambios de hace más de `dias` (el cambio
+    neto de cada campo, cuántos hubo y quiénes) y borra el detalle.
+    Devuelve cuántos cambios compactó.
+    """
+    corte = timezone.now() - timedelta(days=dias)
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Del más viejo al más nuevo: el "antes" de cada campo es el primero
+            cambios = list(CambioAutomovil.objects.filter(fecha__lt=corte).order_by('fecha', 'id')[:tamano_lote])
+            if not cambios:
+                return total
+            grupos = {}
+            for cambio in cambios:
+                grupos.setdefault((cambio.automovil_id, timezone.localdate(cambio.fecha)), []).append(cambio)
+            existentes = {
+                (resumen.automovil_id, resumen.dia): resumen
+                for resumen in ResumenCambiosAutomovil.objects.filter(
+                    automovil_id__in={automovil_id for automovil_id, _ in grupos},
+                    dia__in={dia for _, dia in grupos},
+                )
+            }
+            resumenes = []
+            for (automovil_id, dia), del_dia in grupos.items():
+                anterior = existentes.get((automovil_id, dia))
+                resumen = ResumenCambiosAutomovil(
+                    automovil_id=automovil_id, dia=dia,
+                    registros=anterior.registros if anterior else 0,
+                    usuarios=anterior.usuarios if anterior else [],
+                    cambios=anterior.cambios if anterior else {},
+                )
+                for cambio in del_dia:
+                    resumen.registros += 1
+                    if cambio.usuario_id is not None and cambio.usuario_id not in resumen.usuarios:
+                        resumen.usuarios.append(cambio.usuario_id)
+                    for campo, (antes, despues) in cambio.cambios.items():
+                        resumen.cambios[campo] = [resumen.cambios.get(campo, [antes])[0], despues]
+                resumenes.append(resumen)
+            ResumenCambiosAutomovil.objects.bulk_create(
+                resumenes, update_conflicts=True,
+                unique_fields=['automovil_id', 'dia'], update_fields=['registros', 'usuarios', 'cambios'],
+            )
+            CambioAutomovil.objects.filter(id__in=[cambio.id for cambio in cambios]).delete()
+        total += len(cambios)
@@ -0,0 +1,254 @@
+"""
+Autocompletado de búsqueda
+===========================
+Índice de prefijos en memoria para sugerir mientras se escribe, sin tocar
+la base en cada tecla:
+
+- Claves normalizadas (minúsculas, sin acentos) en una lista ordenada:
+  un prefijo es un rango contiguo que se encuentra con bisect
+- Por cada auto disponible se indexan su marca, su modelo,
+  "marca modelo" y "marca modelo año"; el peso de una sugerencia es
+  cuántos autos disponibles la comparten
+- Los prefijos con muchas coincidencias ("t", "toy") tienen su top-N
+  precalculado al construir (con reserva: el doble de lo que se muestra),
+  y cada cambio lo corrige en el lugar: ninguna consulta recorre más de
+  UMBRAL_MEMO claves y casi ningún cambio obliga a recorrerlas
+
+Se construye con una consulta al primer uso (o al arrancar el worker,
+ver `precargar`) y se actualiza de a un auto con las señales de Automovil.
+Los cambios hechos por otros procesos se detectan comparando
+`version_inventario()` (revisada como mucho cada
+AUTOCOMPLETADO_REVISION_SEGUNDOS): si no coincide, se reconstruye en un
+hilo aparte, uno a la vez, mientras las búsquedas siguen respondiendo con
+el índice anterior. Solo el primer uso espera a que se construya.
+"""
+
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .cache_automoviles import version_inventario
+from .models import Automovil
+
+logger = logging.getLogger(__name__)
+
+FIN_DE_RANGO = '\U0010ffff'
+UMBRAL_MEMO = 256  # Coincidencias a partir de las cuales se memoriza el top-N
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _aportes(marca, modelo, anio):
+    """Pares (clave normalizada, texto sugerido) que aporta un auto."""
+    marca_modelo = f'{marca} {modelo}'
+    completo = f'{marca_modelo} {anio}'
+    return (
+        (normalizar(marca), marca),
+        (normalizar(modelo), marca_modelo),  # "cor" → "Toyota Corolla"
+        (normalizar(marca_modelo), marca_modelo),
+        (normalizar(completo), completo),
+    )
+
+
+def _capacidad_memo():
+    return settings.AUTOCOMPLETADO_MAX_SUGERENCIAS * 2
+
+
+def _mejores(claves, pesos, inicio, fin, limite):
+    """Top `limite` textos del rango claves[inicio:fin], por autos y luego alfabético."""
+    mejores = {}
+    for par in claves[inicio:fin]:
+        texto = par[1]
+        mejores[texto] = max(mejores.get(texto, 0), pesos[par])
+    return heapq.nsmallest(limite, mejores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class IndicePrefijos:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claves = []      # Lista ordenada de (clave, texto)
+        self._pesos = {}       # (clave, texto) → autos que la aportan
+        self._por_auto = {}    # id → aportes actuales, para poder restarlos
+        self._memo = {}        # prefijo frecuente → top-N precalculado
+        self.version = None    # version_inventario() con la que está al día (None: sin construir)
+        self._obsoleto = False  # Se perdió un cambio de otro proceso: hay que reconstruir
+        self._reconstruyendo = False
+        self._primera_construccion = threading.Lock()
+        self._revisado = 0.0
+
+    # ---------------------------------------------------------------- carga
+    def construir(self):
+        version = version_inventario()
+        filas = Automovil.objects.filter(disponible=True).values_list('id', 'marca', 'modelo', 'anio')
+        pesos, por_auto = {}, {}
+        for automovil_id, marca, modelo, anio in filas.iterator():
+            aportes = _aportes(marca, modelo, anio)
+            por_auto[automovil_id] = aportes
+            for par in aportes:
+                pesos[par] = pesos.get(par, 0) + 1
+        claves = sorted(pesos)
+        memo = self._precalcular(claves, pesos)
+        with self._lock:
+            self._pesos, self._por_auto, self._claves, self._memo = pesos, por_auto, claves, memo
+            self.version = version
+            self._obsoleto = False
+            self._revisado = time.monotonic()
+
+    def _reconstruir(self):
+        try:
+            self.construir()
+        except Exception:
+            logger.exception('No se pudo reconstruir el índice de autocompletado')
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+
+    def _precalcular(self, claves, pesos):
+        """Top-N de cada prefijo con UMBRAL_MEMO claves o más (recorriendo el orden por niveles)."""
+        memo = {}
+        pendientes = [('', 0, len(claves))]
+        while pendientes:
+            prefijo, inicio, fin = pendientes.pop()
+            i = inicio
+            while i < fin:
+                clave = claves[i][0]
+                if len(clave) <= len(prefijo):
+                    i += 1
+                    continue
+                siguiente = clave[:len(prefijo) + 1]
+                j = bisect_left(claves, (siguiente + FIN_DE_RANGO,), i, fin)
+                if j - i >= UMBRAL_MEMO:
+                    memo[siguiente] = _mejores(claves, pesos, i, j, _capacidad_memo())
+                    pendientes.append((siguiente, i, j))
+                i = j
+        return memo
+
+    def _asegurar_vigente(self):
+        if self.version is None:
+            # Sin índice no hay nada que servir: se construye ahora, una sola vez
+            with self._primera_construccion:
+                if self.version is None:
+                    self.construir()
+            return
+        ahora = time.monotonic()
+        if not self._obsoleto and ahora - self._revisado < settings.AUTOCOMPLETADO_REVISION_SEGUNDOS:
+            return
+        self._revisado = ahora
+        if self._obsoleto or version_inventario() != self.version:
+            with self._lock:
+                if self._reconstruyendo:
+                    return
+                self._reconstruyendo = True
+            _en_segundo_plano(self._reconstruir)
+
+    # ------------------------------------------------- cambios incrementales
+    def _sumar(self, par, delta):
+        peso = self._pesos.get(par, 0) + delta
+        if peso > 0:
+            if par not in self._pesos:
+                insort(self._claves, par)
+            self._pesos[par] = peso
+        elif par in self._pesos:
+            del self._pesos[par]
+            del self._claves[bisect_left(self._claves, par)]
+
+    def actualizar(self, version, automovil_id, automovil=None):
+        """
+        Aplica el cambio de un auto (`automovil=None` si se eliminó).
+        `version` es la versión del inventario que produjo el cambio: si el
+        índice no estaba justo en la anterior, se perdió algún cambio de otro
+        proceso y la próxima búsqueda lanza la reconstrucción.
+        """
+        with self._lock:
+            if self.version is None:
+                return
+            if self.version != version - 1:
+                self._obsoleto = True
+                return
+            cambiadas = set()
+            for par in self._por_auto.pop(automovil_id, ()):
+                self._sumar(par, -1)
+                cambiadas.add(par)
+            if automovil is not None and automovil.disponible:
+                aportes = _aportes(automovil.marca, automovil.modelo, automovil.anio)
+                self._por_auto[automovil_id] = aportes
+                for par in aportes:
+                    self._sumar(par, +1)
+                    cambiadas.add(par)
+            for clave, texto in cambiadas:
+                peso = self._pesos.get((clave, texto), 0)
+                for largo in range(1, len(clave) + 1):
+                    if clave[:largo] in self._memo:
+                        self._corregir_memo(clave[:largo], texto, peso)
+            self.version = version
+
+    def _corregir_memo(self, prefijo, texto, peso):
+        """
+        Pone `texto` con su nuevo peso en el top precalculado de `prefijo`.
+        Si la lista estaba llena, lo que quedó fuera pesa como mucho lo que
+        su último: se puede insertar o descartar sin recorrer el rango. Solo
+        si la lista queda por debajo de lo que se muestra se recalcula.
+        """
+        capacidad = _capacidad_memo()
+        anterior = self._memo[prefijo]
+        llena = len(anterior) >= capacidad
+        lista = [item for item in anterior if item[0] != texto]
+        if peso > 0:
+            ultimo = anterior[-1] if anterior else None
+            if not llena or (-peso, texto) < (-ultimo[1], ultimo[0]):
+                lista.append((texto, peso))
+                lista.sort(key=lambda item: (-item[1], item[0]))
+                del lista[capacidad:]
+        if llena and len(lista) < settings.AUTOCOMPLETADO_MAX_SUGERENCIAS:
+            lista = self._buscar(prefijo, capacidad)
+        self._memo[prefijo] = lista
+
+    # ------------------------------------------------------------- consulta
+    def sugerir(self, texto, limite):
+        """Top `limite` sugerencias [(texto, autos)] para lo escrito hasta ahora."""
+        prefijo = normalizar(texto)
+        if not prefijo:
+            return []
+        self._asegurar_vigente()
+        with self._lock:
+            memo = self._memo.get(prefijo)
+            if memo is not None and limite <= settings.AUTOCOMPLETADO_MAX_SUGERENCIAS:
+                return memo[:limite]
+            return self._buscar(prefijo, limite)
+
+    def _buscar(self, prefijo, limite):
+        inicio = bisect_left(self._claves, (prefijo,))
+        fin = bisect_left(self._claves, (prefijo + FIN_DE_RANGO,), inicio)
+        return _mejores(self._claves, self._pesos, inicio, fin, limite)
+
+
+def _en_segundo_plano(funcion):
+    """Corre `funcion` en un hilo propio, que cierra su conexión a la base al terminar."""
+    def correr():
+        try:
+            funcion()
+        finally:
+            connections.close_all()
+    threading.Thread(target=correr, name='autocompletado', daemon=True).start()
+
+
+indice = IndicePrefijos()
+
+
+def precargar():
+    """Construye el índice al arrancar el worker (wsgi/asgi); si la base no está lista, se hará al primer uso."""
+    try:
+        indice.construir()
+    except DatabaseError:
+        logger.warning('No se pudo precargar el índice de autocompletado', exc_info=True)
@@ -0,0 +1,253 @@
+"""
+Caché de automóviles por id (cache-aside en dos niveles)
+=========================================================
+El mismo Automovil se pide por id una y otra vez (detalle, carrito, panel).
+Antes de ir a la base se busca en:
+
+1. L1: un LRU acotado en memoria del proceso, con TTL corto
+   (AUTOMOVIL_CACHE_L1_MAX entradas, AUTOMOVIL_CACHE_L1_SEGUNDOS)
+2. L2: la caché de Django compartida (AUTOMOVIL_CACHE_SEGUNDOS)
+
+Invalidación con sellos de versión: cada auto tiene una clave
+`automovil:v:<id>` con un sello, y el objeto se guarda bajo
+`automovil:<generación>:<id>:<sello>`. Invalidar es cambiar el sello:
+lo guardado bajo el sello anterior deja de ser alcanzable, incluso si un
+lector lento lo escribe después de la invalidación (leyó el sello antes
+de consultar la base). `invalidar_todo()` cambia la generación y descarta
+todos los autos de una vez (importación masiva).
+
+Las señales de Automovil invalidan tras cada save()/delete(); quien use
+update() o bulk_create() debe llamar a invalidar()/invalidar_todo().
+
+El L1 de otros procesos no se entera de la invalidación: puede servir
+un dato viejo hasta AUTOMOVIL_CACHE_L1_SEGUNDOS. Para decisiones de stock
+(finalizar compra) se consulta siempre la base.
+
+Cada invalidación también avanza `version_inventario()`, un contador
+global: los índices en memoria de cada proceso (p. ej. autocompletado.py),
+el ETag de la API, los reportes y el análisis de precios lo comparan para
+saber si quedaron viejos.
+
+Con una caché local por proceso (LocMem, settings.CACHE_COMPARTIDA falso)
+ni los sellos ni el contador serían vistos por los demás workers:
+
+- Se usa solo el L1. Cada proceso descarta sus entradas al invalidar; los
+  demás pueden servir un dato viejo hasta AUTOMOVIL_CACHE_L1_SEGUNDOS,
+  lo mismo que con caché compartida. No hay L2: una LocMem con
+  AUTOMOVIL_CACHE_SEGUNDOS estiraría ese plazo a minutos.
+- El contador vive en la base (fila única de VersionInventario). Costo:
+  cada cambio confirmado hace un UPDATE más sobre esa misma fila, y los
+  cambios concurrentes se esperan entre sí en ella. Con un inventario que
+  edita el personal es despreciable; con muchas escrituras por segundo
+  conviene una caché compartida, donde el contador es un incr en la caché.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Automovil, VersionInventario
+
+CLAVE_GENERACION = 'automovil:gen'
+CLAVE_VERSION_INVENTARIO = 'inventario:version'
+
+
+class LRUConTTL:
+    """Diccionario acotado: descarta el menos usado y las entradas vencidas."""
+
+    def __init__(self, maximo, segundos):
+        self.maximo = maximo
+        self.segundos = segundos
+        self.epoca = 0  # Avanza con cada descarte (ver guardar)
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, vence = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor, epoca=None):
+        """Con `epoca`, no guarda si hubo un descarte desde entonces (el valor puede ser viejo)."""
+        with self._lock:
+            if epoca is not None and epoca != self.epoca:
+                return
+            self._datos[clave] = (valor, time.monotonic() + self.segundos)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def descartar(self, clave):
+        with self._lock:
+            self.epoca += 1
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self.epoca += 1
+            self._datos.clear()
+
+
+_l1 = LRUConTTL(settings.AUTOMOVIL_CACHE_L1_MAX, settings.AUTOMOVIL_CACHE_L1_SEGUNDOS)
+
+
+def _clave_version(automovil_id):
+    return f'automovil:v:{automovil_id}'
+
+
+def _sello():
+    return time.time_ns()
+
+
+def _copia(automovil):
+    # Cada llamador recibe su propia instancia: nadie modifica la del L1
+    return copy.copy(automovil)
+
+
+def obtener_varios(ids):
+    """
+    {id: Automovil} para los ids dados (get_many). Los que no existen no aparecen.
+    Como mucho: dos viajes a la caché compartida y una consulta a la base.
+    """
+    ids = {int(automovil_id) for automovil_id in ids}
+    encontrados = {}
+
+    # Nivel 1: memoria del proceso
+    for automovil_id in ids:
+        automovil = _l1.obtener(automovil_id)
+        if automovil is not None:
+            encontrados[automovil_id] = automovil
+    faltan = ids - encontrados.keys()
+    if not faltan:
+        return {automovil_id: _copia(automovil) for automovil_id, automovil in encontrados.items()}
+
+    if not settings.CACHE_COMPARTIDA:
+        # Solo L1: lo leído no se guarda si este proceso invalidó algo mientras tanto
+        epoca = _l1.epoca
+        for automovil_id, automovil in Automovil.objects.in_bulk(faltan).items():
+            encontrados[automovil_id] = automovil
+            _l1.guardar(automovil_id, automovil, epoca)
+        return {automovil_id: _copia(automovil) for automovil_id, automovil in encontrados.items()}
+
+    # Nivel 2: caché compartida (primero sellos y generación, luego los objetos)
+    claves_version = {_clave_version(automovil_id): automovil_id for automovil_id in faltan}
+    sellos = cache.get_many([CLAVE_GENERACION, *claves_version])
+    generacion = sellos.get(CLAVE_GENERACION)
+    if generacion is None:
+        generacion = _sello()
+        if not cache.add(CLAVE_GENERACION, generacion, timeout=None):
+            generacion = cache.get(CLAVE_GENERACION, generacion)
+
+    versiones = {}
+    nuevos_sellos = {}
+    for clave, automovil_id in claves_version.items():
+        if clave in sellos:
+            versiones[automovil_id] = sellos[clave]
+        else:
+            # Sin sello (nuevo o desalojado): no puede haber un objeto válido en L2
+            versiones[automovil_id] = nuevos_sellos[clave] = _sello()
+    for clave, sello in nuevos_sellos.items():
+        if not cache.add(clave, sello, timeout=None):
+            versiones[claves_version[clave]] = None  # Otro proceso lo acaba de fijar: no guardar
+
+    claves_datos = {
+        f'automovil:{generacion}:{automovil_id}:{version}': automovil_id
+        for automovil_id, version in versiones.items()
+        if version is not None and _clave_version(automovil_id) not in nuevos_sellos
+    }
+    for clave, automovil in cache.get_many(list(claves_datos)).items():
+        automovil_id = claves_datos[clave]
+        encontrados[automovil_id] = automovil
+        _l1.guardar(automovil_id, automovil)
+    faltan = ids - encontrados.keys()
+
+    # Base de datos: una sola consulta para todos los que faltan
+    if faltan:
+        desde_base = Automovil.objects.in_bulk(faltan)
+        para_l2 = {}
+        for automovil_id, automovil in desde_base.items():
+            encontrados[automovil_id] = automovil
+            version = versiones.get(automovil_id)
+            if version is not None:
+                para_l2[f'automovil:{generacion}:{automovil_id}:{version}'] = automovil
+                _l1.guardar(automovil_id, automovil)
+        if para_l2:
+            cache.set_many(para_l2, timeout=settings.AUTOMOVIL_CACHE_SEGUNDOS)
+
+    return {automovil_id: _copia(automovil) for automovil_id, automovil in encontrados.items()}
+
+
+def obtener(automovil_id):
+    """Automovil por id, o None si no existe."""
+    return obtener_varios([automovil_id]).get(int(automovil_id))
+
+
+def version_inventario():
+    """Contador que cambia con cada modificación de automóviles (en cualquier proceso)."""
+    if not settings.CACHE_COMPARTIDA:
+        version = VersionInventario.objects.filter(id=1).values_list('version', flat=True).first()
+        return 0 if version is None else version
+    version = cache.get(CLAVE_VERSION_INVENTARIO)
+    if version is None:
+        cache.add(CLAVE_VERSION_INVENTARIO, _sello(), timeout=None)
+        version = cache.get(CLAVE_VERSION_INVENTARIO)
+    return version
+
+
+def _avanzar_version_inventario():
+    if not settings.CACHE_COMPARTIDA:
+        if not VersionInventario.objects.filter(id=1).update(version=F('version') + 1):
+            VersionInventario.objects.get_or_create(id=1)
+            VersionInventario.objects.filter(id=1).update(version=F('version') + 1)
+        return version_inventario()
+    try:
+        return cache.incr(CLAVE_VERSION_INVENTARIO)
+    except ValueError:  # Desalojada: reiniciar desde un sello nuevo, distinto de cualquier versión vieja
+        cache.add(CLAVE_VERSION_INVENTARIO, _sello(), timeout=None)
+        return cache.incr(CLAVE_VERSION_INVENTARIO)
+
+
+def descartar_local(ids):
+    """Saca los autos del L1 de este proceso ya, sin esperar a que se confirme la transacción."""
+    for automovil_id in ids:
+        _l1.descartar(automovil_id)
+
+
+def invalidar_ahora(ids):
+    """Invalida ya (sin esperar transacción). Devuelve la nueva versión del inventario."""
+    descartar_local(ids)
+    if settings.CACHE_COMPARTIDA:
+        cache.set_many({_clave_version(automovil_id): _sello() for automovil_id in ids}, timeout=None)
+    return _avanzar_version_inventario()
+
+
+def invalidar(*ids):
+    """Descarta los autos dados cuando se confirme la transacción en curso."""
+    ids = [int(automovil_id) for automovil_id in ids]
+    if ids:
+        transaction.on_commit(lambda: invalidar_ahora(ids))
+
+
+def _invalidar_todo_ahora():
+    _l1.limpiar()
+    if settings.CACHE_COMPARTIDA:
+        cache.set(CLAVE_GENERACION, _sello(), timeout=None)
+    _avanzar_version_inventario()
+
+
+def invalidar_todo():
+    """Descarta todos los autos (tras cambios masivos) al confirmar la transacción."""
+    transaction.on_commit(_invalidar_todo_ahora)
@@ -0,0 +1,216 @@
+"""
+Carritos
+=========
+Agregar al carrito (`agregar`): cada petición son dos sentencias, sin
+leer antes ni escribir después en Python:
+
+- INSERT ... ON CONFLICT sobre el índice único parcial (usuario) WHERE
+  activo: devuelve el carrito activo (o lo crea) y marca su actividad
+- INSERT ... ON CONFLICT (carrito, automovil) DO UPDATE SET cantidad =
+  cantidad + n, para todos los autos de la petición a la vez
+
+Dos pestañas o un doble clic no duplican carritos ni items y ningún
+incremento se pierde. Con una clave de idempotencia (header
+Idempotency-Key o campo `clave`), la repetición de una petición devuelve
+la respuesta guardada de la primera en vez de volver a sumar. Junto a la
+clave se guarda la huella de la petición (`huella_de`): si la misma clave
+llega con otro contenido se lanza ClaveReutilizada (422) en vez de
+devolver una respuesta que no le corresponde.
+
+Retención: la tabla de carritos solo crecía: cada compra deja un carrito
+cerrado y los carritos abandonados quedaban activos para siempre. El
+comando `limpiar_carritos` mantiene acotado su tamaño:
+
+1. Expira los carritos activos sin actividad en CARRITO_ABANDONO_DIAS
+   (pasan a activo=False y liberan lo que tuvieran reservado; el
+   usuario empieza uno nuevo al volver)
+2. Borra, por lotes, los carritos cerrados hace más de
+   CARRITO_RETENCION_DIAS que NO tienen una Compra asociada.
+   Los de una compra se conservan: son el detalle de lo vendido.
+   Opcionalmente se archivan antes en un archivo JSON Lines (.gz)
+3. Borra las claves de idempotencia de más de CARRITO_IDEMPOTENCIA_HORAS
+
+La búsqueda del carrito activo usa el índice único parcial
+(usuario) WHERE activo, y la limpieza el índice (activo, actualizado).
+"""
+
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import reservas
+from .models import Carrito, ClaveIdempotencia, ItemCarrito, Reserva
+
+# Motores con INSERT ... ON CONFLICT ... RETURNING; en los demás se usa el ORM
+MOTORES_UPSERT = ('postgresql', 'sqlite')
+
+
+class ClaveReutilizada(Exception):
+    """La clave de idempotencia ya se usó con una petición distinta."""
+
+
+def huella_de(request):
+    """sha256 del método, la ruta y el cuerpo de la petición."""
+    return hashlib.sha256(f'{request.method} {request.path}\n'.encode() + request.body).hexdigest()
+
+
+# ========================================================================
+# AGREGAR AL CARRITO
+# ========================================================================
+def _carrito_activo(connection, usuario_id, ahora):
+    if connection.vendor not in MOTORES_UPSERT:
+        carrito, creado = Carrito.objects.get_or_create(usuario_id=usuario_id, activo=True)
+        if not creado:
+            Carrito.objects.filter(id=carrito.id).update(actualizado=ahora)
+        return carrito.id
+    tabla = connection.ops.quote_name(Carrito._meta.db_table)
+    fecha = connection.ops.adapt_datetimefield_value(ahora)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tabla} (usuario_id, creado, actualizado, activo) VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (usuario_id) WHERE activo DO UPDATE SET actualizado = EXCLUDED.actualizado '
+            'RETURNING id',
+            [usuario_id, fecha, fecha, True],
+        )
+        return cursor.fetchone()[0]
+
+
+def _sumar_items(connection, carrito_id, cantidades):
+    """Suma las cantidades y devuelve [(automovil_id, cantidad resultante)]."""
+    if connection.vendor not in MOTORES_UPSERT:
+        for automovil_id, cantidad in cantidades.items():
+            if not ItemCarrito.objects.filter(carrito_id=carrito_id, automovil_id=automovil_id).update(cantidad=F('cantidad') + cantidad):
+                ItemCarrito.objects.create(carrito_id=carrito_id, automovil_id=automovil_id, cantidad=cantidad)
+        return list(
+            ItemCarrito.objects.filter(carrito_id=carrito_id, automovil_id__in=cantidades)
+            .values_list('automovil_id', 'cantidad')
+        )
+    tabla = connection.ops.quote_name(ItemCarrito._meta.db_table)
+    valores = ', '.join(['(%s, %s, %s)'] * len(cantidades))
+    parametros = [valor for automovil_id, cantidad in cantidades.items() for valor in (carrito_id, automovil_id, cantidad)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tabla} (carrito_id, automovil_id, cantidad) VALUES {valores} '
+            f'ON CONFLICT (carrito_id, automovil_id) DO UPDATE SET cantidad = {tabla}.cantidad + EXCLUDED.cantidad '
+            'RETURNING automovil_id, cantidad',
+            parametros,
+        )
+        return cursor.fetchall()
+
+
+def agregar(usuario, cantidades, clave=None, huella=''):
+    """
+    Suma {automovil_id: unidades} al carrito activo de `usuario` y las
+    aparta (ver reservas.py). Lanza StockInsuficiente si no hay unidades
+    libres; entonces no se agrega nada.
+    Devuelve (respuesta, repetida): `repetida` es True si `clave` ya se
+    había usado y `respuesta` es entonces la de aquella petición. Si
+    aquella tenía otra `huella` lanza ClaveReutilizada.
+    """
+    connection = connections[router.db_for_write(ItemCarrito)]
+    try:
+        with transaction.atomic(using=connection.alias):
+            carrito_id = _carrito_activo(connection, usuario.id, timezone.now())
+            items = sorted(_sumar_items(connection, carrito_id, cantidades))
+            reservas.reservar(carrito_id, cantidades, connection)
+            respuesta = {
+                'carrito': carrito_id,
+                'items': [{'automovil_id': automovil_id, 'cantidad': cantidad} for automovil_id, cantidad in items],
+            }
+            if clave:
+                # Al final: si otra petición con la misma clave se adelantó, esta
+                # espera a que confirme, choca con el índice único y se deshace entera
+                ClaveIdempotencia.objects.using(connection.alias).create(
+                    usuario=usuario, clave=clave, huella=huella, respuesta=respuesta,
+                )
+    except IntegrityError:
+        anterior = None
+        if clave:
+            anterior = (
+                ClaveIdempotencia.objects.using(connection.alias)
+                .filter(usuario=usuario, clave=clave).values_list('respuesta', 'huella').first()
+            )
+        if anterior is None:
+            raise
+        respuesta_anterior, huella_anterior = anterior
+        # Sin huella: clave guardada antes de que existiera la columna
+        if huella_anterior and huella and huella_anterior != huella:
+            raise ClaveReutilizada(clave)
+        return respuesta_anterior, True
+    return respuesta, False
+
+
+# ========================================================================
+# RETENCIÓN
+# ========================================================================
+
+
+def expirar_abandonados(dias, tamano_lote=1000):
+    """Cierra los carritos activos sin actividad en `dias`. Devuelve cuántos."""
+    corte = timezone.now() - timedelta(days=dias)
+    total = 0
+    while True:
+        ids = list(
+            Carrito.objects.filter(activo=True, actualizado__lt=corte)
+            .values_list('id', flat=True)[:tamano_lote]
+        )
+        if not ids:
+            return total
+        # update() conserva `actualizado`: la retención cuenta desde la última actividad
+        total += Carrito.objects.filter(id__in=ids, activo=True).update(activo=False)
+        reservas.liberar(Reserva.objects.filter(carrito_id__in=ids))
+
+
+def _archivar(salida, ids):
+    items = {}
+    for item in ItemCarrito.objects.filter(carrito_id__in=ids).values('carrito_id', 'automovil_id', 'cantidad'):
+        items.setdefault(item.pop('carrito_id'), []).append(item)
+    for carrito in Carrito.objects.filter(id__in=ids).values('id', 'usuario_id', 'creado', 'actualizado'):
+        carrito['items'] = items.get(carrito['id'], [])
+        salida.write(json.dumps(carrito, default=str) + '\n')
+
+
+def purgar_cerrados(dias, tamano_lote=1000, archivo=None):
+    """
+    Borra por lotes los carritos cerrados hace más de `dias` que no
+    pertenecen a una compra. Si se indica `archivo`, antes los agrega
+    ahí en JSON Lines (comprimido si termina en .gz). Devuelve cuántos.
+    """
+    corte = timezone.now() - timedelta(days=dias)
+    candidatos = Carrito.objects.filter(activo=False, actualizado__lt=corte, compra__isnull=True)
+    salida = None
+    if archivo:
+        salida = gzip.open(archivo, 'at', encoding='utf-8') if archivo.endswith('.gz') else open(archivo, 'a', encoding='utf-8')
+    total = 0
+    try:
+        while True:
+            ids = list(candidatos.order_by('id').values_list('id', flat=True)[:tamano_lote])
+            if not ids:
+                return total
+            with transaction.atomic():
+                if salida:
+                    _archivar(salida, ids)
+                    salida.flush()
+                reservas.liberar(Reserva.objects.filter(carrito_id__in=ids))
+                ItemCarrito.objects.filter(carrito_id__in=ids).delete()
+                Carrito.objects.filter(id__in=ids, compra__isnull=True).delete()
+            total += len(ids)
+    finally:
+        if salida:
+            salida.close()
+
+
+def purgar_claves_idempotencia(horas, tamano_lote=1000):
+    """Borra por lotes las claves de idempotencia de más de `horas`. Devuelve cuántas."""
+    corte = timezone.now() - timedelta(hours=horas)
+    total = 0
+    while True:
+        ids = list(ClaveIdempotencia.objects.filter(creado__lt=corte).values_list('id', flat=True)[:tamano_lote])
+        if not ids:
+            return total
+        total += ClaveIdempotencia.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def eventos(request):
+    """Las plantillas cargan stock.js solo si el canal SSE está activo (ver views.stream_stock)."""
+    return {'eventos_sse_activo': settings.EVENTOS_SSE_ACTIVO}
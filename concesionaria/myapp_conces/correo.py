@@ -0,0 +1,106 @@
+"""
+Entrega de mensajes de contacto
+================================
+La vista `contacto` solo inserta un MensajeContacto (bandeja de salida).
+El comando `enviar_contactos` los entrega en segundo plano:
+
+1. Reclama un lote de pendientes (nadie más los toma mientras tanto)
+2. Los envía todos por UNA sola conexión SMTP
+3. Los fallidos se reintentan con espera exponencial; tras
+   CONTACTO_MAX_INTENTOS quedan como 'fallido'
+
+Prueba local con un SMTP de mentira:
+    python -m aiosmtpd -n -l localhost:1025
+    EMAIL_PORT=1025 python manage.py enviar_contactos
+"""
+
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import MensajeContacto
+from .tareas import reclamar_filas
+
+logger = logging.getLogger(__name__)
+
+
+def reclamar_lote(tamano):
+    """
+    Toma hasta `tamano` mensajes vencidos y los "alquila" moviendo su
+    proximo_intento al futuro, para que otro worker no los envíe a la vez.
+    """
+    ahora = timezone.now()
+    vencidos = MensajeContacto.objects.filter(
+        estado=MensajeContacto.PENDIENTE, proximo_intento__lte=ahora,
+    ).order_by('proximo_intento')
+    ids = reclamar_filas(
+        vencidos, tamano,
+        proximo_intento=ahora + timedelta(seconds=settings.CONTACTO_ALQUILER_SEGUNDOS),
+    )
+    return list(MensajeContacto.objects.filter(id__in=ids).order_by('id'))
+
+
+def _construir_email(mensaje):
+    return EmailMessage(
+        subject=f'Nuevo mensaje de contacto: {mensaje.nombre}',
+        body=f'Nombre: {mensaje.nombre}\nCorreo: {mensaje.correo}\n\n{mensaje.mensaje}',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=settings.CONTACTO_DESTINATARIOS,
+        reply_to=[mensaje.correo],
+    )
+
+
+def _espera_reintento(intentos):
+    """Espera exponencial: base, 2*base, 4*base... con tope."""
+    segundos = settings.CONTACTO_REINTENTO_BASE_SEGUNDOS * (2 ** (intentos - 1))
+    return timedelta(seconds=min(segundos, settings.CONTACTO_REINTENTO_MAX_SEGUNDOS))
+
+
+def enviar_lote(mensajes):
+    """Envía los mensajes por una sola conexión. Devuelve (enviados, fallidos)."""
+    if not mensajes:
+        return 0, 0
+
+    ahora = timezone.now()
+    enviados = fallidos = 0
+    conexion = get_connection(fail_silently=False)
+    abierta = False
+    try:
+        for mensaje in mensajes:
+            try:
+                # Abierta de antemano: send_messages no la cierra entre mensajes
+                if not abierta:
+                    conexion.open()
+                    abierta = True
+                conexion.send_messages([_construir_email(mensaje)])
+            except Exception as error:
+                if isinstance(error, (smtplib.SMTPException, OSError)):
+                    # La sesión SMTP puede haber quedado inservible: se reabre
+                    # para el siguiente mensaje
+                    conexion.close()
+                    abierta = False
+                mensaje.intentos += 1
+                mensaje.ultimo_error = str(error)[:1000]
+                if mensaje.intentos >= settings.CONTACTO_MAX_INTENTOS:
+                    mensaje.estado = MensajeContacto.FALLIDO
+                    logger.error('Mensaje de contacto %s descartado: %s', mensaje.id, error)
+                else:
+                    mensaje.proximo_intento = ahora + _espera_reintento(mensaje.intentos)
+                fallidos += 1
+            else:
+                mensaje.estado = MensajeContacto.ENVIADO
+                mensaje.enviado = ahora
+                mensaje.intentos += 1
+                mensaje.ultimo_error = ''
+                enviados += 1
+    finally:
+        conexion.close()
+
+    MensajeContacto.objects.bulk_update(
+        mensajes, ['estado', 'intentos', 'proximo_intento', 'enviado', 'ultimo_error'],
+    )
+    return enviados, fallidos
@@ -0,0 +1,117 @@
+"""
+Eventos de stock en vivo
+=========================
+Cuando cambia el stock de un Automovil (compra, edición, eliminación) se
+publica un delta pequeño en un canal de pub/sub:
+
+    {"id": 7, "cantidad": 2, "disponible": true}
+    {"id": 9, "eliminado": true}
+
+La vista `stream_stock` (Server-Sent Events, requiere ASGI) reenvía esos
+deltas a las páginas de catálogo e inventario abiertas. Miles de pestañas
+escuchando no hacen ninguna consulta a la base de datos.
+
+Backend configurable con EVENTOS_BROKER. MemoriaBroker solo reparte dentro
+del proceso: con varios workers ASGI hace falta un backend compartido
+(p. ej. Redis pub/sub) que implemente la misma interfaz de Broker.
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+CANAL_STOCK = 'stock'
+
+
+class Broker:
+    """Interfaz de pub/sub. `publicar` es síncrono; `suscribir` devuelve una Suscripcion."""
+
+    def publicar(self, canal, datos):
+        raise NotImplementedError
+
+    def suscribir(self, canal):
+        raise NotImplementedError
+
+    def cancelar(self, suscripcion):
+        raise NotImplementedError
+
+
+class Suscripcion:
+    """
+    Buzón de un cliente. Los deltas se agrupan por id: si un auto cambia
+    varias veces antes de que el cliente lea, solo se envía el último estado.
+    """
+
+    def __init__(self, canal, loop):
+        self.canal = canal
+        self._loop = loop
+        self._evento = asyncio.Event()
+        self._pendientes = {}
+        self._lock = threading.Lock()
+
+    def entregar(self, datos):
+        with self._lock:
+            self._pendientes[datos['id']] = datos
+        # publicar() se llama desde hilos de vistas síncronas
+        self._loop.call_soon_threadsafe(self._evento.set)
+
+    async def recibir(self, timeout):
+        """Espera deltas hasta `timeout` segundos. Devuelve una lista (vacía si no hubo)."""
+        try:
+            await asyncio.wait_for(self._evento.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            self._evento.clear()
+            deltas = list(self._pendientes.values())
+            self._pendientes.clear()
+        return deltas
+
+
+class MemoriaBroker(Broker):
+    """Pub/sub dentro del proceso."""
+
+    def __init__(self):
+        self._suscripciones = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, canal, datos):
+        with self._lock:
+            destinatarios = list(self._suscripciones.get(canal, ()))
+        for suscripcion in destinatarios:
+            suscripcion.entregar(datos)
+
+    def suscribir(self, canal):
+        suscripcion = Suscripcion(canal, asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.setdefault(canal, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.get(suscripcion.canal, set()).discard(suscripcion)
+
+
+_broker = None
+
+
+def obtener_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTOS_BROKER)()
+    return _broker
+
+
+def publicar_stock(automovil):
+    obtener_broker().publicar(CANAL_STOCK, {
+        'id': automovil.id,
+        'cantidad': automovil.cantidad,
+        'libres': automovil.libres,
+        'disponible': automovil.disponible,
+    })
+
+
+def publicar_eliminado(automovil_id):
+    obtener_broker().publicar(CANAL_STOCK, {'id': automovil_id, 'eliminado': True})
@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from .models import Automovil
 
 class ContactoForm(forms.Form):
@@ -67,3 +68,35 @@ class AutomovilForm(forms.ModelForm):
             'imagen': 'Imagen del vehículo',
             'descripcion': 'Descripción'
         }
+
+    def clean_imagen(self):
+        imagen = self.cleaned_data.get('imagen')
+        # Solo validar archivos nuevos (no la imagen ya guardada)
+        if not imagen or not hasattr(imagen, 'content_type'):
+            return imagen
+        if imagen.size > settings.IMAGEN_MAX_BYTES:
+            raise forms.ValidationError(
+                f"La imagen no puede superar {settings.IMAGEN_MAX_BYTES // (1024 * 1024)} MB."
+            )
+        # forms.ImageField ya abrió la cabecera con Pillow: tamaño sin decodificar píxeles
+        ancho, alto = imagen.image.size
+        if max(ancho, alto) > settings.IMAGEN_MAX_LADO:
+            raise forms.ValidationError(
+                f"La imagen no puede superar {settings.IMAGEN_MAX_LADO} px por lado."
+            )
+        return imagen
+
+
+class ImportarInventarioForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo de inventario',
+        help_text='CSV, JSON o JSON Lines con columnas marca, modelo, anio, precio, cantidad, descripcion',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.json,.jsonl'}),
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        extension = archivo.name.rsplit('.', 1)[-1].lower() if '.' in archivo.name else ''
+        if extension not in ('csv', 'json', 'jsonl'):
+            raise forms.ValidationError('El archivo debe ser CSV, JSON o JSON Lines.')
+        return archivo
@@ -0,0 +1,116 @@
+"""
+Procesamiento de imágenes fuera de la petición
+===============================================
+La vista solo guarda el archivo subido (ver storage.py), marca el auto con
+imagen_procesada=False y encola una tarea. Después, en `manage.py worker`:
+
+1. Se decodifica la imagen original
+2. Se corrige la orientación EXIF y se reduce a IMAGEN_LADO_NORMALIZADO
+3. Se vuelve a codificar como WebP y se guarda (también por hash)
+4. Se apunta el auto a la nueva imagen
+
+Si algo queda a medias, `manage.py procesar_imagenes` retoma los pendientes.
+
+El original no se borra al procesar: con nombres por hash, una subida en
+curso puede estar recibiendo ese mismo nombre (deduplicado) antes de guardar
+su fila, y ninguna comprobación en la base lo ve. Los archivos sin referencia
+los borra `purgar_huerfanas` (`manage.py purgar_imagenes`, por cron una vez al
+día) solo cuando llevan más de IMAGENES_HUERFANAS_HORAS sin tocarse.
+"""
+
+import os
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .cache_automoviles import invalidar
+from .models import Automovil
+from .tareas import encolar
+
+
+def programar_procesamiento(automovil):
+    """Marca la imagen del auto como pendiente y encola su normalización."""
+    Automovil.objects.filter(id=automovil.id).update(imagen_procesada=False)
+    invalidar(automovil.id)
+    automovil.imagen_procesada = False
+    if settings.IMAGENES_EN_SEGUNDO_PLANO:
+        encolar(procesar_imagen, cola='imagenes', automovil_id=automovil.id)
+
+
+def procesar_imagen(automovil_id):
+    """Normaliza la imagen de un auto. Devuelve True si se reemplazó."""
+    nombre_original = (
+        Automovil.objects.filter(id=automovil_id, imagen_procesada=False)
+        .values_list('imagen', flat=True).first()
+    )
+    if not nombre_original:
+        Automovil.objects.filter(id=automovil_id).update(imagen_procesada=True)
+        return False
+
+    campo = Automovil._meta.get_field('imagen')
+    storage = campo.storage
+    lado = settings.IMAGEN_LADO_NORMALIZADO
+
+    with storage.open(nombre_original, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.thumbnail((lado, lado))
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB')
+        salida = BytesIO()
+        imagen.save(salida, format='WEBP', quality=settings.IMAGEN_CALIDAD_WEBP, method=4)
+
+    base = os.path.splitext(os.path.basename(nombre_original))[0]
+    nombre_nuevo = storage.save(f'{campo.upload_to}{base}.webp', ContentFile(salida.getvalue()))
+
+    # Solo si nadie cambió la imagen mientras tanto
+    actualizados = Automovil.objects.filter(id=automovil_id, imagen=nombre_original).update(
+        imagen=nombre_nuevo, imagen_procesada=True,
+    )
+    invalidar(automovil_id)
+    return bool(actualizados)
+
+
+def purgar_huerfanas(horas=None):
+    """Borra las imágenes sin auto que las use y sin cambios en `horas`. Devuelve cuántas."""
+    horas = settings.IMAGENES_HUERFANAS_HORAS if horas is None else horas
+    campo = Automovil._meta.get_field('imagen')
+    storage = campo.storage
+    raiz = campo.upload_to.rstrip('/')
+    limite = time.time() - horas * 3600
+
+    # Solo archivos sin tocar en `horas`: el storage renueva la fecha de un
+    # archivo cuando una subida lo reutiliza por deduplicado (ver storage.py)
+    candidatos = []
+    pendientes = [raiz]
+    while pendientes:
+        directorio = pendientes.pop()
+        if not storage.exists(directorio):
+            continue
+        subdirectorios, archivos = storage.listdir(directorio)
+        pendientes.extend(f'{directorio}/{nombre}' for nombre in subdirectorios)
+        candidatos.extend(
+            ruta for ruta in (f'{directorio}/{nombre}' for nombre in archivos)
+            if _modificado(storage, ruta) < limite
+        )
+
+    borradas = 0
+    for inicio in range(0, len(candidatos), 500):
+        lote = candidatos[inicio:inicio + 500]
+        referenciadas = set(Automovil.objects.filter(imagen__in=lote).values_list('imagen', flat=True))
+        for ruta in lote:
+            # Se vuelve a mirar la fecha: una subida pudo reutilizarlo recién
+            if ruta not in referenciadas and _modificado(storage, ruta) < limite:
+                storage.delete(ruta)
+                borradas += 1
+    return borradas
+
+
+def _modificado(storage, nombre):
+    try:
+        return os.path.getmtime(storage.path(nombre))
+    except FileNotFoundError:
+        return time.time()
@@ -0,0 +1,265 @@
+"""
+Importación masiva de inventario
+=================================
+Carga archivos CSV, JSON (lista de objetos) o JSON Lines de cualquier tamaño:
+
+- Se leen fila por fila (nunca el archivo entero en memoria)
+- Cada fila se valida con las mismas reglas que AutomovilForm
+- Se insertan/actualizan por lotes con un solo INSERT ... ON CONFLICT
+  sobre la clave natural (marca, modelo, anio), un lote por transacción
+- Al final, la cantidad importada (total) se reparte en la sucursal
+  principal (ver sucursales.conciliar_principal)
+
+Columnas: marca, modelo, anio, precio, cantidad, descripcion
+(`disponible` se deduce de la cantidad, igual que en el panel).
+
+Lo usan `manage.py import_inventario` y la carga desde el panel (en
+segundo plano; el avance y el resultado quedan en ImportacionInventario).
+"""
+
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_automoviles import invalidar_todo
+from .forms import AutomovilForm
+from .models import Automovil, ImportacionInventario
+from .sucursales import conciliar_principal
+from .tareas import ultimo_intento
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_ACTUALIZABLES = ['precio', 'cantidad', 'disponible', 'descripcion']
+CLAVE_NATURAL = ['marca', 'modelo', 'anio']
+MAX_ERRORES_GUARDADOS = 100
+ESPACIOS = re.compile(r'[\s,]*')
+
+
+class AutomovilImportForm(AutomovilForm):
+    """AutomovilForm sin imagen y sin consultar la base por cada fila."""
+
+    class Meta(AutomovilForm.Meta):
+        fields = ['marca', 'modelo', 'anio', 'precio', 'disponible', 'cantidad', 'descripcion']
+
+    def _get_validation_exclusions(self):
+        # La unicidad de la clave natural la resuelve el upsert:
+        # validarla aquí sería un SELECT por fila
+        return super()._get_validation_exclusions() | set(CLAVE_NATURAL)
+
+
+@dataclass
+class ResultadoImportacion:
+    procesadas: int = 0
+    importadas: int = 0
+    total_errores: int = 0
+    errores: list = field(default_factory=list)  # (número de fila, mensaje)
+
+
+# ========================================================================
+# LECTURA EN STREAMING
+# ========================================================================
+def _leer_csv(archivo):
+    yield from csv.DictReader(archivo)
+
+
+def _leer_json(archivo, tamano_bloque=1 << 16):
+    """
+    Lista JSON de objetos ([{...}, {...}]) leída por bloques con raw_decode,
+    o JSON Lines (un objeto por línea) si el archivo no empieza con '['.
+    """
+    decoder = json.JSONDecoder()
+    buffer = archivo.read(tamano_bloque)
+    pos = ESPACIOS.match(buffer).end()
+    if not buffer[pos:pos + 1] == '[':
+        # JSON Lines
+        for linea in _lineas(buffer, archivo):
+            if linea.strip():
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError:
+                    yield linea  # Línea rota: _validar la informa como fila inválida
+        return
+
+    pos += 1
+    while True:
+        pos = ESPACIOS.match(buffer, pos).end()
+        if pos >= len(buffer):
+            bloque = archivo.read(tamano_bloque)
+            if not bloque:
+                raise ValueError('El archivo JSON termina sin cerrar la lista.')
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            objeto, pos_fin = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Objeto cortado a mitad de bloque: leer más y reintentar
+            bloque = archivo.read(tamano_bloque)
+            if not bloque:
+                raise
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+        yield objeto
+        pos = pos_fin
+
+
+def _lineas(inicio, archivo):
+    """Líneas del archivo, empezando por el bloque ya leído `inicio`."""
+    pendiente = ''
+    for trozo in itertools.chain([inicio], archivo):
+        pendiente += trozo
+        *completas, pendiente = pendiente.split('\n')
+        yield from completas
+    if pendiente:
+        yield pendiente
+
+
+def leer_filas(archivo, formato):
+    """Itera las filas (dicts) de un archivo de texto ya abierto."""
+    if formato == 'csv':
+        return _leer_csv(archivo)
+    if formato in ('json', 'jsonl', 'ndjson'):
+        return _leer_json(archivo)
+    raise ValueError(f'Formato no soportado: {formato}')
+
+
+def formato_de(nombre):
+    return nombre.rsplit('.', 1)[-1].lower() if '.' in nombre else ''
+
+
+# ========================================================================
+# VALIDACIÓN Y UPSERT POR LOTES
+# ========================================================================
+def _validar(fila):
+    """Devuelve (Automovil sin guardar, None) o (None, mensaje de error)."""
+    if not isinstance(fila, dict):
+        return None, f'La fila no es un objeto JSON: {str(fila)[:80]}'
+    datos = {clave: fila.get(clave) for clave in AutomovilImportForm.Meta.fields}
+    datos = {clave: valor for clave, valor in datos.items() if valor is not None}
+    form = AutomovilImportForm(data=datos)
+    if not form.is_valid():
+        mensaje = '; '.join(f'{campo}: {" ".join(errores)}' for campo, errores in form.errors.items())
+        return None, mensaje
+    automovil = form.save(commit=False)
+    automovil.marca = automovil.marca.strip()
+    automovil.modelo = automovil.modelo.strip()
+    automovil.disponible = automovil.cantidad > 0  # Misma regla que Crear/Editar
+    return automovil, None
+
+
+def _guardar_lote(lote):
+    with transaction.atomic():
+        Automovil.objects.bulk_create(
+            list(lote.values()),
+            update_conflicts=True,
+            unique_fields=CLAVE_NATURAL,
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+        # bulk_create no dispara señales y en SQLite no devuelve los ids actualizados
+        invalidar_todo()
+
+
+def importar(filas, tamano_lote=5000, progreso=None):
+    """
+    Valida e inserta/actualiza las filas por lotes.
+    `progreso(resultado)` se llama después de cada lote.
+    """
+    resultado = ResultadoImportacion()
+    lote = {}
+
+    for numero, fila in enumerate(filas, start=1):
+        resultado.procesadas += 1
+        automovil, error = _validar(fila)
+        if error:
+            resultado.total_errores += 1
+            if len(resultado.errores) < MAX_ERRORES_GUARDADOS:
+                resultado.errores.append((numero, error))
+            continue
+
+        # Si la clave se repite dentro del lote, gana la última fila
+        lote[(automovil.marca, automovil.modelo, automovil.anio)] = automovil
+        if len(lote) >= tamano_lote:
+            _guardar_lote(lote)
+            resultado.importadas += len(lote)
+            lote = {}
+            if progreso:
+                progreso(resultado)
+
+    if lote:
+        _guardar_lote(lote)
+        resultado.importadas += len(lote)
+    # Las cantidades importadas son totales: la diferencia va a la sucursal principal
+    conciliar_principal()
+    if progreso:
+        progreso(resultado)
+    return resultado
+
+
+def importar_archivo(ruta, formato=None, tamano_lote=5000, progreso=None):
+    """Abre `ruta` y la importa. El formato se deduce de la extensión si no se indica."""
+    formato = formato or formato_de(str(ruta))
+    with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+        return importar(leer_filas(archivo, formato), tamano_lote=tamano_lote, progreso=progreso)
+
+
+def _guardar_resultado(importacion_id, resultado, **campos):
+    ImportacionInventario.objects.filter(id=importacion_id).update(
+        procesadas=resultado.procesadas,
+        importadas=resultado.importadas,
+        total_errores=resultado.total_errores,
+        errores=[list(error) for error in resultado.errores],
+        **campos,
+    )
+
+
+def _borrar_subido(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def importar_archivo_en_segundo_plano(importacion_id):
+    """
+    Tarea encolada por la carga del panel. Importa el archivo subido y deja
+    el avance y el resultado en la ImportacionInventario. El archivo se
+    borra al terminar bien o tras el último intento; si la tarea se va a
+    reintentar, se conserva.
+    """
+    importacion = ImportacionInventario.objects.get(id=importacion_id)
+    ImportacionInventario.objects.filter(id=importacion_id).update(
+        estado=ImportacionInventario.EN_PROCESO, ultimo_error='',
+    )
+    try:
+        resultado = importar_archivo(
+            importacion.ruta, importacion.formato,
+            progreso=lambda resultado: _guardar_resultado(importacion_id, resultado),
+        )
+    except Exception as error:
+        if ultimo_intento():
+            estado = ImportacionInventario.FALLIDA
+            _borrar_subido(importacion.ruta)
+        else:
+            estado = ImportacionInventario.PENDIENTE
+        ImportacionInventario.objects.filter(id=importacion_id).update(
+            estado=estado, ultimo_error=str(error)[:2000],
+            terminada=timezone.now() if estado == ImportacionInventario.FALLIDA else None,
+        )
+        raise
+
+    _guardar_resultado(
+        importacion_id, resultado, estado=ImportacionInventario.COMPLETADA, terminada=timezone.now(),
+    )
+    _borrar_subido(importacion.ruta)
+    logger.info(
+        'Importación #%s de %s: %s filas, %s importadas, %s con error',
+        importacion_id, importacion.nombre_archivo, resultado.procesadas, resultado.importadas, resultado.total_errores,
+    )
@@ -0,0 +1,143 @@
+"""
+Límite de peticiones (throttling)
+==================================
+Corta el tráfico abusivo ANTES de llegar al ORM: búsquedas, carrito y
+contacto tienen un presupuesto de peticiones por usuario (o por IP para
+anónimos), definido en settings.THROTTLE_LIMITES:
+
+    THROTTLE_LIMITES = {
+        'busqueda': {'anonimo': '30/m', 'autenticado': '120/m'},
+    }
+
+Algoritmo: ventana deslizante aproximada con dos contadores fijos en la
+caché de Django (solo `add` + `incr`, atómicos en memcached/redis):
+
+    estimado = anterior * (1 - fracción transcurrida) + actual
+
+Con LocMemCache cada proceso cuenta por separado; para varios nodos hay que
+configurar una caché compartida (CACHE_BACKEND / CACHE_LOCATION).
+
+IP de los anónimos: detrás de un proxy REMOTE_ADDR es la del proxy y todos
+los clientes compartirían un mismo presupuesto. Con
+THROTTLE_PROXIES_CONFIABLES = N se toma la entrada N-ésima desde la derecha
+de X-Forwarded-For (la que agregó el primero de nuestros proxies); las de
+más a la izquierda las escribe el cliente y no se usan. En Render (variable
+RENDER) el valor por defecto es 1; sin proxy debe quedar en 0.
+
+Uso:
+    @limitar_peticiones('busqueda')
+    def buscar_automovil(request): ...
+"""
+
+import math
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+UNIDADES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _parsear_limite(regla):
+    """'30/m' → (30, 60)"""
+    cantidad, unidad = regla.split('/')
+    return int(cantidad), UNIDADES[unidad]
+
+
+def _identidad(request):
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    ip = request.META.get('REMOTE_ADDR', '')
+    proxies = settings.THROTTLE_PROXIES_CONFIABLES
+    if proxies:
+        reenviada = [parte.strip() for parte in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if parte.strip()]
+        if len(reenviada) >= proxies:
+            ip = reenviada[-proxies]
+    return f'ip{ip}'
+
+
+def _espera(anterior, actual, fraccion, ventana, limite):
+    """
+    Segundos hasta que una petición más quede dentro del límite, es decir
+    hasta que anterior * (1 - fracción) + actual + 1 <= limite.
+    """
+    margen = limite - 1
+    if anterior and actual <= margen:
+        # Alcanza con que se desgaste el peso de la ventana anterior
+        necesaria = 1 - (margen - actual) / anterior
+        if necesaria < 1:
+            return (necesaria - fraccion) * ventana
+    # En la ventana siguiente la actual pasa a ser la anterior y también pesa
+    necesaria = max(0.0, 1 - margen / actual)
+    return (1 - fraccion + necesaria) * ventana
+
+
+def verificar_limite(request, ambito):
+    """
+    Cuenta la petición en el ámbito dado.
+    Devuelve None si está dentro del límite, o los segundos a esperar.
+    """
+    reglas = settings.THROTTLE_LIMITES[ambito]
+    regla = reglas['autenticado' if request.user.is_authenticated else 'anonimo']
+    limite, ventana = _parsear_limite(regla)
+
+    ahora = time.time()
+    numero_ventana = int(ahora // ventana)
+    fraccion = (ahora % ventana) / ventana
+    base = f'throttle:{ambito}:{_identidad(request)}'
+    clave_actual = f'{base}:{numero_ventana}'
+
+    cache.add(clave_actual, 0, timeout=ventana * 2)
+    try:
+        actual = cache.incr(clave_actual)
+    except ValueError:  # La clave expiró justo entre add e incr
+        cache.set(clave_actual, 1, timeout=ventana * 2)
+        actual = 1
+    anterior = cache.get(f'{base}:{numero_ventana - 1}', 0)
+
+    estimado = anterior * (1 - fraccion) + actual
+    if estimado <= limite:
+        return None
+    return max(1, math.ceil(_espera(anterior, actual, fraccion, ventana, limite)))
+
+
+def respuesta_limite(segundos):
+    response = HttpResponse(
+        'Demasiadas solicitudes. Intenta de nuevo en unos segundos.',
+        status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(segundos)
+    return response
+
+
+def limitar_peticiones(ambito, metodos=None):
+    """
+    Decorador para vistas (también async). `metodos` restringe qué métodos
+    cuentan, p. ej. ('POST',) para limitar envíos de formulario pero no su lectura.
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                if settings.THROTTLE_ACTIVO and not (metodos and request.method not in metodos):
+                    # La caché y request.user (sesión) son síncronos
+                    espera = await sync_to_async(verificar_limite)(request, ambito)
+                    if espera is not None:
+                        return respuesta_limite(espera)
+                return await vista(request, *args, **kwargs)
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not settings.THROTTLE_ACTIVO or (metodos and request.method not in metodos):
+                return vista(request, *args, **kwargs)
+            espera = verificar_limite(request, ambito)
+            if espera is not None:
+                return respuesta_limite(espera)
+            return vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp_conces.recomendaciones import recalcular_similares
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de vehículos similares que muestra el detalle del catálogo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vecinos', type=int, default=6, help='Similares a guardar por automóvil (por defecto 6)')
+        parser.add_argument('--lote', type=int, default=5000, help='Tamaño de lote para bulk_create')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = recalcular_similares(k=options['vecinos'], tamano_lote=options['lote'])
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{total} recomendaciones guardadas en {segundos:.2f}s.'))
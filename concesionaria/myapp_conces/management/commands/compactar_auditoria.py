@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp_conces.auditoria import compactar
+
+
+class Command(BaseCommand):
+    help = 'Resume por auto y día el historial de cambios antiguo y borra el detalle. Pensado para cron, una vez al día.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.AUDITORIA_DETALLE_DIAS,
+                            help='Días que se conserva el detalle de cada cambio')
+        parser.add_argument('--lote', type=int, default=1000, help='Cambios por transacción')
+
+    def handle(self, *args, **options):
+        compactados = compactar(options['dias'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{compactados} cambios compactados en resúmenes diarios.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp_conces.reservas import conciliar_reservado
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las unidades apartadas de cada automóvil desde sus reservas donde no coincidan. Pensado para cron, cada hora.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Automóviles por transacción')
+
+    def handle(self, *args, **options):
+        corregidos = conciliar_reservado(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{corregidos} automóviles con reservas corregidas.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp_conces.correo import enviar_lote, reclamar_lote
+
+
+class Command(BaseCommand):
+    help = 'Envía por correo los mensajes de contacto pendientes de la bandeja de salida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help='Mensajes por conexión SMTP')
+        parser.add_argument('--loop', action='store_true', help='Seguir ejecutándose y revisar la bandeja periódicamente')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos entre revisiones con --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            total_enviados = total_fallidos = 0
+            while True:
+                mensajes = reclamar_lote(options['lote'])
+                if not mensajes:
+                    break
+                enviados, fallidos = enviar_lote(mensajes)
+                total_enviados += enviados
+                total_fallidos += fallidos
+
+            if total_enviados or total_fallidos or not options['loop']:
+                self.stdout.write(f'{total_enviados} mensajes enviados, {total_fallidos} con error.')
+            if not options['loop']:
+                return
+            time.sleep(options['intervalo'])
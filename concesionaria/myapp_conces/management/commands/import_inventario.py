@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp_conces.importacion import formato_de, importar_archivo
+
+
+class Command(BaseCommand):
+    help = 'Importa automóviles desde un archivo CSV, JSON o JSON Lines (inserta o actualiza por marca, modelo y año).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument('--formato', choices=['csv', 'json', 'jsonl'], help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por transacción (por defecto 5000)')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de(options['archivo'])
+        if formato not in ('csv', 'json', 'jsonl', 'ndjson'):
+            raise CommandError('No se reconoce el formato del archivo; usa --formato.')
+
+        inicio = time.perf_counter()
+
+        def progreso(resultado):
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(
+                f'{resultado.procesadas} filas leídas, {resultado.importadas} importadas, '
+                f'{resultado.total_errores} con error ({resultado.procesadas / max(segundos, 0.001):.0f} filas/s)'
+            )
+
+        try:
+            resultado = importar_archivo(options['archivo'], formato, options['lote'], progreso)
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for numero, mensaje in resultado.errores:
+            self.stderr.write(f'Fila {numero}: {mensaje}')
+        if resultado.total_errores > len(resultado.errores):
+            self.stderr.write(f'... y {resultado.total_errores - len(resultado.errores)} errores más.')
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Importación terminada en {segundos:.1f}s.'))
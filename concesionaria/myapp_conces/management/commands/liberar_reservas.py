@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp_conces.reservas import liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al stock libre las unidades de las reservas de carrito vencidas. Pensado para cron, cada minuto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas por transacción')
+
+    def handle(self, *args, **options):
+        liberadas = liberar_vencidas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas vencidas liberadas.'))
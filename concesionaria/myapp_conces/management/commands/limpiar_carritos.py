@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp_conces.carritos import expirar_abandonados, purgar_cerrados, purgar_claves_idempotencia
+
+
+class Command(BaseCommand):
+    help = 'Expira los carritos abandonados, borra (o archiva) los carritos cerrados antiguos sin compra y las claves de idempotencia vencidas. Pensado para cron, una vez al día.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--abandono-dias', type=int, default=settings.CARRITO_ABANDONO_DIAS,
+                            help='Días sin actividad para expirar un carrito activo')
+        parser.add_argument('--retencion-dias', type=int, default=settings.CARRITO_RETENCION_DIAS,
+                            help='Días que se conserva un carrito cerrado sin compra')
+        parser.add_argument('--idempotencia-horas', type=int, default=settings.CARRITO_IDEMPOTENCIA_HORAS,
+                            help='Horas que se recuerda una clave de idempotencia')
+        parser.add_argument('--lote', type=int, default=1000, help='Carritos por transacción')
+        parser.add_argument('--archivo', help='Archivar los carritos borrados en este archivo JSON Lines (.gz para comprimir)')
+
+    def handle(self, *args, **options):
+        expirados = expirar_abandonados(options['abandono_dias'], options['lote'])
+        self.stdout.write(f'{expirados} carritos abandonados expirados.')
+
+        purgados = purgar_cerrados(options['retencion_dias'], options['lote'], options['archivo'])
+        destino = f' (archivados en {options["archivo"]})' if options['archivo'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{purgados} carritos cerrados borrados{destino}.'))
+
+        claves = purgar_claves_idempotencia(options['idempotencia_horas'], options['lote'])
+        self.stdout.write(f'{claves} claves de idempotencia vencidas borradas.')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes las sesiones vencidas de la base (índice expire_date). '
+        'A diferencia de clearsessions no hace un único DELETE sobre toda la tabla. Pensado para cron, una vez al día.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.SESIONES_LIMPIEZA_LOTE, help='Sesiones por DELETE')
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        total = 0
+        while True:
+            claves = list(
+                Session.objects.filter(expire_date__lt=ahora)
+                .values_list('session_key', flat=True)[:options['lote']]
+            )
+            if not claves:
+                break
+            # Las entradas de la caché vencen solas con la misma fecha
+            total += Session.objects.filter(session_key__in=claves, expire_date__lt=ahora).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{total} sesiones vencidas borradas.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from myapp_conces.imagenes import procesar_imagen
+from myapp_conces.models import Automovil
+
+
+class Command(BaseCommand):
+    help = 'Normaliza las imágenes de automóviles que quedaron pendientes de procesar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None, help='Máximo de imágenes a procesar')
+        parser.add_argument(
+            '--legado', action='store_true',
+            help='Marcar también las imágenes antiguas (sin nombre de hash) para pasarlas a URLs inmutables',
+        )
+
+    def handle(self, *args, **options):
+        if options['legado']:
+            marcadas = (
+                Automovil.objects.exclude(imagen='').exclude(imagen__isnull=True)
+                .exclude(imagen__regex=r'/[0-9a-f]{2}/[0-9a-f]{32}\.[a-z0-9]+$')
+                .update(imagen_procesada=False)
+            )
+            self.stdout.write(f'{marcadas} imágenes antiguas marcadas para procesar.')
+
+        pendientes = Automovil.objects.filter(imagen_procesada=False).order_by('id').values_list('id', flat=True)
+        if options['limite']:
+            pendientes = pendientes[:options['limite']]
+
+        procesadas = errores = 0
+        for automovil_id in pendientes.iterator():
+            try:
+                if procesar_imagen(automovil_id):
+                    procesadas += 1
+            except Exception as error:
+                errores += 1
+                self.stderr.write(f'Automóvil {automovil_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'{procesadas} imágenes procesadas, {errores} con error.'))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp_conces.imagenes import purgar_huerfanas
+
+
+class Command(BaseCommand):
+    help = 'Borra las imágenes que ya no usa ningún automóvil (originales ya procesados, reemplazadas). Pensado para cron, una vez al día.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=settings.IMAGENES_HUERFANAS_HORAS,
+                            help='Horas sin cambios antes de borrar un archivo sin referencia')
+
+    def handle(self, *args, **options):
+        borradas = purgar_huerfanas(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'{borradas} imágenes huérfanas borradas.'))
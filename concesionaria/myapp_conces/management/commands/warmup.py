@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from myapp_conces.arranque import calentar
+
+
+class Command(BaseCommand):
+    help = (
+        'Sonda de latencia: en este mismo proceso ejecuta los pasos de arranque (ARRANQUE_PASOS: '
+        'plantillas, URLs, índices, caché) midiendo cada uno y, con --url, la primera y la segunda '
+        'petición a esas páginas. Sirve para ver cuánto ahorra cada paso; no calienta los workers de '
+        'gunicorn/uvicorn (son otros procesos: cada uno se calienta solo al cargar wsgi/asgi).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', default=[], help='Página a pedir después de calentar (repetible)')
+        parser.add_argument('--sin-calentar', action='store_true', help='Mide las peticiones en frío, sin ejecutar los pasos')
+
+    def handle(self, *args, **options):
+        fallidos = 0
+        if not options['sin_calentar']:
+            total = 0
+            for ruta, segundos, resultado, error in calentar():
+                total += segundos
+                if error:
+                    fallidos += 1
+                    self.stdout.write(self.style.ERROR(f'{ruta}: {error} ({segundos:.3f}s)'))
+                else:
+                    detalle = f' → {resultado}' if resultado is not None else ''
+                    self.stdout.write(f'{ruta}: {segundos:.3f}s{detalle}')
+            self.stdout.write(f'Calentamiento: {total:.3f}s')
+
+        cliente = Client(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'testserver')
+        for url in options['url']:
+            tiempos = []
+            for _ in range(2):
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+            self.stdout.write(
+                f'{url}: {respuesta.status_code}, primera {tiempos[0] * 1000:.1f} ms, segunda {tiempos[1] * 1000:.1f} ms'
+            )
+
+        if fallidos:
+            self.stdout.write(self.style.WARNING(f'{fallidos} paso(s) fallaron: en un worker se harían en la primera petición.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Listo.'))
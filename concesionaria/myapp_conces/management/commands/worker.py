@@ -0,0 +1,118 @@
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from myapp_conces import tareas
+
+logger = logging.getLogger('myapp_conces.tareas')
+
+
+def _ejecutar_en_hilo(tarea, en_curso):
+    try:
+        tareas.ejecutar(tarea)
+    finally:
+        en_curso.discard(tarea.id)
+        close_old_connections()
+
+
+def bucle_worker(colas, hilos, intervalo, una_vez, detener):
+    """
+    Bucle de un proceso: reclama tantas tareas como hilos libres y las
+    reparte en el pool, y renueva el latido de las que están corriendo.
+    Termina cuando `detener` se activa (SIGTERM/SIGINT).
+    """
+    nombre = f'{socket.gethostname()}:{os.getpid()}'
+    ocupados = threading.Semaphore(hilos)
+    en_curso = set()
+    ultima_revision = ultimo_latido = 0.0
+
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='tarea') as pool:
+        while not detener.is_set():
+            if time.monotonic() - ultima_revision > settings.TAREAS_REVISION_SEGUNDOS:
+                devueltas, fallidas = tareas.recuperar_abandonadas()
+                if devueltas or fallidas:
+                    logger.warning('Tareas abandonadas: %s devueltas a la cola, %s fallidas', devueltas, fallidas)
+                ultima_revision = time.monotonic()
+            if time.monotonic() - ultimo_latido > settings.TAREAS_LATIDO_SEGUNDOS:
+                tareas.latir(list(en_curso))
+                ultimo_latido = time.monotonic()
+
+            # Cuántos hilos libres hay ahora mismo
+            libres = 0
+            while libres < hilos and ocupados.acquire(blocking=False):
+                libres += 1
+            lote = tareas.reclamar(colas, libres, trabajador=nombre) if libres else []
+            for _ in range(libres - len(lote)):
+                ocupados.release()
+
+            for tarea in lote:
+                en_curso.add(tarea.id)
+                futuro = pool.submit(_ejecutar_en_hilo, tarea, en_curso)
+                futuro.add_done_callback(lambda _: ocupados.release())
+
+            if una_vez and not lote:
+                break
+            if not lote:
+                detener.wait(intervalo)
+            close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano encoladas en la base de datos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--colas', default=','.join(settings.TAREAS_COLAS),
+            help='Colas a atender, separadas por comas (por defecto TAREAS_COLAS)',
+        )
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos worker (por defecto 1)')
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos por proceso (por defecto 4)')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Vaciar la cola y terminar')
+        parser.add_argument('--metricas', action='store_true', help='Mostrar profundidad y latencia de las colas y salir')
+        parser.add_argument('--purgar', action='store_true', help='Borrar tareas completadas antiguas y salir')
+
+    def handle(self, *args, **options):
+        if options['metricas']:
+            self.stdout.write(json.dumps(tareas.metricas(), indent=2))
+            return
+        if options['purgar']:
+            self.stdout.write(f'{tareas.purgar_completadas()} tareas completadas borradas.')
+            return
+
+        colas = [cola.strip() for cola in options['colas'].split(',') if cola.strip()]
+        argumentos = (colas, options['hilos'], options['intervalo'], options['una_vez'])
+
+        if options['procesos'] <= 1:
+            detener = threading.Event()
+            self._manejar_senales(detener)
+            bucle_worker(*argumentos, detener)
+            return
+
+        # Varios procesos: cada hijo abre sus propias conexiones
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        detener = contexto.Event()
+        self._manejar_senales(detener)
+        hijos = [contexto.Process(target=bucle_worker, args=(*argumentos, detener)) for _ in range(options['procesos'])]
+        for hijo in hijos:
+            hijo.start()
+        self.stdout.write(f'{len(hijos)} procesos x {options["hilos"]} hilos atendiendo {", ".join(colas)}')
+        for hijo in hijos:
+            hijo.join()
+
+    def _manejar_senales(self, detener):
+        def parar(signum, frame):
+            detener.set()
+        signal.signal(signal.SIGTERM, parar)
+        signal.signal(signal.SIGINT, parar)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0006_automovil_cantidad'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='automovil',
+            index=models.Index(fields=['anio'], name='automovil_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='automovil',
+            index=models.Index(fields=['precio'], name='automovil_precio_idx'),
+        ),
+    ]
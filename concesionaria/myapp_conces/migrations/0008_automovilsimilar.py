@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0007_automovil_indices_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutomovilSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('distancia', models.FloatField()),
+                ('automovil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='myapp_conces.automovil')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myapp_conces.automovil')),
+            ],
+            options={
+                'ordering': ['automovil', 'posicion'],
+                'constraints': [models.UniqueConstraint(fields=('automovil', 'posicion'), name='similar_automovil_posicion_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:13
+
+import myapp_conces.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0008_automovilsimilar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='automovil',
+            name='imagen_procesada',
+            field=models.BooleanField(default=True, help_text='False mientras la imagen espera ser normalizada'),
+        ),
+        migrations.AlterField(
+            model_name='automovil',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, storage=myapp_conces.storage.obtener_storage_imagenes, upload_to='autos/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0009_automovil_imagen_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensajeContacto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('correo', models.EmailField(max_length=254)),
+                ('mensaje', models.TextField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(auto_now_add=True)),
+                ('enviado', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='contacto_pendientes_idx')],
+            },
+        ),
+    ]
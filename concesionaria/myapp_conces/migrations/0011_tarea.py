@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0010_mensajecontacto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('funcion', models.CharField(help_text='Ruta de la función, p. ej. myapp_conces.imagenes.procesar_imagen', max_length=200)),
+                ('argumentos', models.JSONField(blank=True, default=dict)),
+                ('cola', models.CharField(default='default', max_length=50)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=12)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('disponible_en', models.DateTimeField()),
+                ('iniciada', models.DateTimeField(blank=True, null=True)),
+                ('terminada', models.DateTimeField(blank=True, null=True)),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['cola', 'disponible_en'], name='tarea_pendientes_idx'), models.Index(fields=['estado', 'iniciada'], name='tarea_estado_iniciada_idx')],
+            },
+        ),
+    ]
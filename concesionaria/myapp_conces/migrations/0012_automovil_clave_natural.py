@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+MAX_CONFLICTOS_LISTADOS = 50
+
+
+def verificar_duplicados(apps, schema_editor):
+    """
+    Antes de exigir (marca, modelo, anio) único: si hay autos repetidos la
+    migración se detiene y los lista. No se fusionan ni borran filas
+    automáticamente (stock, precios y carritos de cada uno pueden diferir):
+    hay que unificarlos o corregir el año/modelo desde el admin y volver a
+    ejecutar migrate.
+    """
+    Automovil = apps.get_model('myapp_conces', 'Automovil')
+    grupos = list(
+        Automovil.objects.values('marca', 'modelo', 'anio')
+        .annotate(total=Count('id')).filter(total__gt=1)
+        .order_by('marca', 'modelo', 'anio')
+    )
+    if not grupos:
+        return
+    lineas = []
+    for grupo in grupos[:MAX_CONFLICTOS_LISTADOS]:
+        ids = list(
+            Automovil.objects.filter(marca=grupo['marca'], modelo=grupo['modelo'], anio=grupo['anio'])
+            .order_by('id').values_list('id', flat=True)
+        )
+        lineas.append(f"  {grupo['marca']} {grupo['modelo']} ({grupo['anio']}): ids {', '.join(map(str, ids))}")
+    if len(grupos) > MAX_CONFLICTOS_LISTADOS:
+        lineas.append(f'  ... y {len(grupos) - MAX_CONFLICTOS_LISTADOS} grupos más.')
+    raise RuntimeError(
+        f'Hay {len(grupos)} combinaciones de marca, modelo y año repetidas; '
+        'unifíquelas antes de migrar:\n' + '\n'.join(lineas)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0011_tarea'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='automovil',
+            constraint=models.UniqueConstraint(fields=('marca', 'modelo', 'anio'), name='automovil_clave_natural_uniq'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def cerrar_carritos_duplicados(apps, schema_editor):
+    """
+    Antes de exigir un carrito activo por usuario: conserva el más reciente,
+    le pasa los items de los demás (sumando cantidades) y cierra el resto.
+    """
+    Carrito = apps.get_model('myapp_conces', 'Carrito')
+    ItemCarrito = apps.get_model('myapp_conces', 'ItemCarrito')
+    usuarios = (
+        Carrito.objects.filter(activo=True).values('usuario')
+        .annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('usuario', flat=True)
+    )
+    for usuario_id in usuarios:
+        activos = list(Carrito.objects.filter(usuario_id=usuario_id, activo=True).order_by('-actualizado', '-id'))
+        conservar, sobrantes = activos[0], activos[1:]
+        for item in ItemCarrito.objects.filter(carrito__in=sobrantes):
+            existente = ItemCarrito.objects.filter(carrito=conservar, automovil_id=item.automovil_id).first()
+            if existente:
+                ItemCarrito.objects.filter(id=existente.id).update(cantidad=F('cantidad') + item.cantidad)
+                item.delete()
+            else:
+                ItemCarrito.objects.filter(id=item.id).update(carrito=conservar)
+        Carrito.objects.filter(id__in=[carrito.id for carrito in sobrantes]).update(activo=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0012_automovil_clave_natural'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_carritos_duplicados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='carrito',
+            index=models.Index(fields=['activo', 'actualizado'], name='carrito_activo_actualizado_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='carrito',
+            constraint=models.UniqueConstraint(condition=models.Q(('activo', True)), fields=('usuario',), name='carrito_activo_por_usuario_uniq'),
+        ),
+    ]
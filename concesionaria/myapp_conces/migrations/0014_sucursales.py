@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def crear_sucursal_principal(apps, schema_editor):
+    """El stock que había (un solo contador global) pasa a la sucursal principal."""
+    Automovil = apps.get_model('myapp_conces', 'Automovil')
+    Sucursal = apps.get_model('myapp_conces', 'Sucursal')
+    StockSucursal = apps.get_model('myapp_conces', 'StockSucursal')
+    principal, _ = Sucursal.objects.get_or_create(nombre=settings.SUCURSAL_PRINCIPAL)
+    lote = []
+    for automovil_id, cantidad in Automovil.objects.filter(cantidad__gt=0).values_list('id', 'cantidad').iterator():
+        lote.append(StockSucursal(sucursal=principal, automovil_id=automovil_id, cantidad=cantidad))
+        if len(lote) >= 5000:
+            StockSucursal.objects.bulk_create(lote)
+            lote = []
+    StockSucursal.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0013_carrito_retencion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('ciudad', models.CharField(blank=True, max_length=100)),
+                ('direccion', models.CharField(blank=True, max_length=200)),
+                ('latitud', models.FloatField(blank=True, null=True)),
+                ('longitud', models.FloatField(blank=True, null=True)),
+                ('activa', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name_plural': 'sucursales',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('automovil', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='myapp_conces.automovil')),
+                ('sucursal', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='myapp_conces.sucursal')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['sucursal', 'automovil'], name='stock_con_existencias_idx'), models.Index(fields=['automovil', 'sucursal'], name='stock_automovil_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sucursal', 'automovil'), name='stock_sucursal_automovil_uniq')],
+            },
+        ),
+        migrations.RunPython(crear_sucursal_principal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def unir_items_duplicados(apps, schema_editor):
+    """
+    Antes de exigir un item por (carrito, automovil): deja el de menor id
+    con la suma de las cantidades y borra los demás.
+    """
+    ItemCarrito = apps.get_model('myapp_conces', 'ItemCarrito')
+    duplicados = (
+        ItemCarrito.objects.values('carrito', 'automovil')
+        .annotate(total=Count('id'), conservar=Min('id'), cantidad=Sum('cantidad'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicados:
+        ItemCarrito.objects.filter(id=grupo['conservar']).update(cantidad=grupo['cantidad'])
+        ItemCarrito.objects.filter(carrito=grupo['carrito'], automovil=grupo['automovil']).exclude(id=grupo['conservar']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0014_sucursales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(unir_items_duplicados, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('respuesta', models.JSONField()),
+                ('creado', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='itemcarrito',
+            constraint=models.UniqueConstraint(fields=('carrito', 'automovil'), name='item_carrito_automovil_uniq'),
+        ),
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('usuario', 'clave'), name='clave_idempotencia_uniq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0015_carrito_upserts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='automovil',
+            name='reservado',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Unidades apartadas en carritos (ver reservas.py)'),
+        ),
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('vence', models.DateTimeField(db_index=True)),
+                ('automovil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='myapp_conces.automovil')),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='myapp_conces.carrito')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('carrito', 'automovil'), name='reserva_carrito_automovil_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0016_reservas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCambiosAutomovil',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('automovil_id', models.BigIntegerField()),
+                ('dia', models.DateField()),
+                ('registros', models.PositiveIntegerField(help_text='Cambios que se resumieron')),
+                ('usuarios', models.JSONField(default=list)),
+                ('cambios', models.JSONField(help_text='{campo: [primer antes, último después]}')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('automovil_id', 'dia'), name='resumen_cambios_automovil_dia_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CambioAutomovil',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('automovil_id', models.BigIntegerField()),
+                ('accion', models.PositiveSmallIntegerField(choices=[(1, 'Creado'), (2, 'Editado'), (3, 'Eliminado'), (4, 'Cambio de precio'), (5, 'Venta')])),
+                ('fecha', models.DateTimeField()),
+                ('cambios', models.JSONField(help_text='{campo: [antes, después]}')),
+                ('usuario', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['automovil_id', '-fecha'], name='cambio_automovil_fecha_idx'), models.Index(fields=['usuario', '-fecha'], name='cambio_usuario_fecha_idx'), models.Index(fields=['fecha'], name='cambio_fecha_idx')],
+            },
+        ),
+    ]
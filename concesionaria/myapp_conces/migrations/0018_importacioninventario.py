@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0017_auditoria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_archivo', models.CharField(help_text='Nombre del archivo subido', max_length=255)),
+                ('ruta', models.CharField(help_text='Copia en IMPORTACIONES_DIR; se borra al terminar', max_length=500)),
+                ('formato', models.CharField(max_length=10)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=12)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('terminada', models.DateTimeField(blank=True, null=True)),
+                ('procesadas', models.PositiveIntegerField(default=0)),
+                ('importadas', models.PositiveIntegerField(default=0)),
+                ('total_errores', models.PositiveIntegerField(default=0)),
+                ('errores', models.JSONField(blank=True, default=list, help_text='[[fila, mensaje]] de las primeras filas con error')),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creada'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+def crear_fila(apps, schema_editor):
+    apps.get_model('myapp_conces', 'VersionInventario').objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0018_importacioninventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_fila, migrations.RunPython.noop),
+    ]
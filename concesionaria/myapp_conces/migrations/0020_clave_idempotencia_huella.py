@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0019_version_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='huella',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
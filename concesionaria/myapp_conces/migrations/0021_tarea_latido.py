@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def latido_desde_iniciada(apps, schema_editor):
+    # Las tareas en proceso al migrar conservan el plazo que tenían
+    apps.get_model('myapp_conces', 'Tarea').objects.filter(estado='en_proceso').update(latido=F('iniciada'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0020_clave_idempotencia_huella'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tarea',
+            name='tarea_estado_iniciada_idx',
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='latido',
+            field=models.DateTimeField(blank=True, help_text='Última señal de vida del worker que la ejecuta', null=True),
+        ),
+        migrations.RunPython(latido_desde_iniciada, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['estado', 'latido'], name='tarea_estado_latido_idx'),
+        ),
+    ]
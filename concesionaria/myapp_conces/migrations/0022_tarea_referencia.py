@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+def referenciar_reportes(apps, schema_editor):
+    # Los reportes ya pedidos se siguen encontrando por su clave
+    Tarea = apps.get_model('myapp_conces', 'Tarea')
+    for tarea in Tarea.objects.filter(funcion='myapp_conces.reportes.generar').only('id', 'argumentos').iterator():
+        clave = (tarea.argumentos or {}).get('clave')
+        if clave:
+            Tarea.objects.filter(id=tarea.id).update(referencia=f'reporte:{clave}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp_conces', '0021_tarea_latido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='referencia',
+            field=models.CharField(blank=True, help_text='Para buscar la tarea por lo que produce, p. ej. reporte:<clave>', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(condition=models.Q(('referencia', ''), _negated=True), fields=['referencia'], name='tarea_referencia_idx'),
+        ),
+        migrations.RunPython(referenciar_reportes, migrations.RunPython.noop),
+    ]
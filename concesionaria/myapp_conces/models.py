@@ -2,6 +2,8 @@
 from django.conf import settings
 from django.db import models
 
+from .storage import obtener_storage_imagenes
+
 # Create your models here.
 class Automovil(models.Model):
     marca = models.CharField(max_length=50)
@@ -10,14 +12,40 @@ class Automovil(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     disponible = models.BooleanField(default=True)
     descripcion = models.TextField(blank=True, null=True)
-    imagen = models.ImageField(upload_to='autos/', blank=True, null=True)
+    imagen = models.ImageField(upload_to='autos/', storage=obtener_storage_imagenes, blank=True, null=True)
+    imagen_procesada = models.BooleanField(default=True, help_text="False mientras la imagen espera ser normalizada")
     cantidad = models.PositiveIntegerField(default=1, help_text="Cantidad disponible en stock")
+    reservado = models.PositiveIntegerField(default=0, editable=False, help_text="Unidades apartadas en carritos (ver reservas.py)")
 
     def __str__(self):
         return f"{self.marca} {self.modelo} ({self.anio})"
 
+    @property
+    def libres(self):
+        """Unidades que todavía se pueden agregar a un carrito."""
+        return max(self.cantidad - self.reservado, 0)
+
+    def save(self, *args, **kwargs):
+        # `reservado` solo lo cambian los UPDATE de reservas.py: guardar un
+        # auto leído hace un rato (panel, admin) no debe pisar ese contador
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'reservado'
+            ]
+        super().save(*args, **kwargs)
+
 
     class Meta:
+        indexes = [
+            # Filtros por rango y ordenamiento del admin
+            models.Index(fields=['anio'], name='automovil_anio_idx'),
+            models.Index(fields=['precio'], name='automovil_precio_idx'),
+        ]
+        constraints = [
+            # Clave natural usada por la importación masiva (upsert)
+            models.UniqueConstraint(fields=['marca', 'modelo', 'anio'], name='automovil_clave_natural_uniq'),
+        ]
         permissions = [
             ("add_auto", "Puede agregar automóviles"),
             ("change_auto", "Puede modificar automóviles"),
@@ -27,6 +55,66 @@ class Automovil(models.Model):
         ]
 
 
+
+# Sucursales de la concesionaria y su stock por automóvil (ver sucursales.py).
+# Automovil.cantidad es la suma de todas las sucursales.
+class Sucursal(models.Model):
+    nombre = models.CharField(max_length=100, unique=True)
+    ciudad = models.CharField(max_length=100, blank=True)
+    direccion = models.CharField(max_length=200, blank=True)
+    latitud = models.FloatField(blank=True, null=True)
+    longitud = models.FloatField(blank=True, null=True)
+    activa = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name_plural = 'sucursales'
+
+    def __str__(self):
+        return self.nombre
+
+
+class StockSucursal(models.Model):
+    # Sin índices sueltos en las FK: los compuestos de abajo ya empiezan por cada una
+    sucursal = models.ForeignKey(Sucursal, related_name='stocks', on_delete=models.CASCADE, db_index=False)
+    automovil = models.ForeignKey(Automovil, related_name='stocks', on_delete=models.CASCADE, db_index=False)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'automovil'], name='stock_sucursal_automovil_uniq'),
+        ]
+        indexes = [
+            # "Disponible cerca de mí": autos con stock en ciertas sucursales
+            models.Index(
+                fields=['sucursal', 'automovil'], name='stock_con_existencias_idx',
+                condition=models.Q(cantidad__gt=0),
+            ),
+            # Checkout y totales: todas las sucursales de un auto
+            models.Index(fields=['automovil', 'sucursal'], name='stock_automovil_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.automovil} en {self.sucursal}: {self.cantidad}"
+
+
+# Tabla precalculada de vehículos similares (ver recomendaciones.py)
+class AutomovilSimilar(models.Model):
+    automovil = models.ForeignKey(Automovil, related_name='similares', on_delete=models.CASCADE)
+    similar = models.ForeignKey(Automovil, related_name='+', on_delete=models.CASCADE)
+    posicion = models.PositiveSmallIntegerField()
+    distancia = models.FloatField()
+
+    class Meta:
+        ordering = ['automovil', 'posicion']
+        constraints = [
+            # También es el índice de lectura: (automovil_id, posicion)
+            models.UniqueConstraint(fields=['automovil', 'posicion'], name='similar_automovil_posicion_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.automovil} ~ {self.similar} (#{self.posicion})"
+
 # Modelo para el carrito de compras
 class Carrito(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -34,6 +122,20 @@ class Carrito(models.Model):
     actualizado = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Un solo carrito activo por usuario; también es el índice de
+            # get_or_create(usuario=..., activo=True)
+            models.UniqueConstraint(
+                fields=['usuario'], condition=models.Q(activo=True),
+                name='carrito_activo_por_usuario_uniq',
+            ),
+        ]
+        indexes = [
+            # Limpieza por antigüedad (ver carritos.py)
+            models.Index(fields=['activo', 'actualizado'], name='carrito_activo_actualizado_idx'),
+        ]
+
     def __str__(self):
         return f"Carrito de {self.usuario.username} ({'Activo' if self.activo else 'Cerrado'})"
 
@@ -43,10 +145,50 @@ class ItemCarrito(models.Model):
     automovil = models.ForeignKey(Automovil, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # Destino del INSERT ... ON CONFLICT de carritos.agregar_items
+            models.UniqueConstraint(fields=['carrito', 'automovil'], name='item_carrito_automovil_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.cantidad} x {self.automovil}"
 
 
+# Unidades apartadas por un carrito hasta `vence` (ver reservas.py)
+class Reserva(models.Model):
+    carrito = models.ForeignKey(Carrito, related_name='reservas', on_delete=models.CASCADE)
+    automovil = models.ForeignKey(Automovil, related_name='reservas', on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField()
+    vence = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'automovil'], name='reserva_carrito_automovil_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.automovil_id} hasta {self.vence:%H:%M}"
+
+
+# Respuestas ya dadas a mutaciones del carrito, por clave de idempotencia
+class ClaveIdempotencia(models.Model):
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    clave = models.CharField(max_length=64)
+    # sha256 de método, ruta y cuerpo: la misma clave con otra petición no se repite
+    huella = models.CharField(max_length=64, blank=True, default='')
+    respuesta = models.JSONField()
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='clave_idempotencia_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.usuario_id})"
+
+
 # Modelo para la compra finalizada
 class Compra(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -60,3 +202,174 @@ class Compra(models.Model):
     def __str__(self):
         return f"{self.marca} {self.modelo} ({self.anio})"
 
+
+# Bandeja de salida de mensajes de contacto (ver correo.py)
+class MensajeContacto(models.Model):
+    PENDIENTE = 'pendiente'
+    ENVIADO = 'enviado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (ENVIADO, 'Enviado'),
+        (FALLIDO, 'Fallido'),
+    ]
+
+    nombre = models.CharField(max_length=100)
+    correo = models.EmailField()
+    mensaje = models.TextField()
+    creado = models.DateTimeField(auto_now_add=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(auto_now_add=True)
+    enviado = models.DateTimeField(blank=True, null=True)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # El worker busca: estado pendiente y proximo_intento vencido
+            models.Index(fields=['estado', 'proximo_intento'], name='contacto_pendientes_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mensaje de {self.nombre} <{self.correo}> ({self.estado})"
+
+
+# Cola de tareas en segundo plano (ver tareas.py y `manage.py worker`)
+class Tarea(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    ]
+
+    funcion = models.CharField(max_length=200, help_text="Ruta de la función, p. ej. myapp_conces.imagenes.procesar_imagen")
+    argumentos = models.JSONField(default=dict, blank=True)
+    referencia = models.CharField(max_length=100, blank=True, help_text="Para buscar la tarea por lo que produce, p. ej. reporte:<clave>")
+    cola = models.CharField(max_length=50, default='default')
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    creada = models.DateTimeField(auto_now_add=True)
+    disponible_en = models.DateTimeField()
+    iniciada = models.DateTimeField(blank=True, null=True)
+    terminada = models.DateTimeField(blank=True, null=True)
+    latido = models.DateTimeField(blank=True, null=True, help_text="Última señal de vida del worker que la ejecuta")
+    trabajador = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Índice parcial: solo las pendientes, que son las que se reclaman
+            models.Index(
+                fields=['cola', 'disponible_en'], name='tarea_pendientes_idx',
+                condition=models.Q(estado='pendiente'),
+            ),
+            models.Index(fields=['estado', 'latido'], name='tarea_estado_latido_idx'),
+            models.Index(fields=['referencia'], name='tarea_referencia_idx', condition=~models.Q(referencia='')),
+        ]
+
+    def __str__(self):
+        return f"{self.funcion} #{self.id} ({self.estado})"
+
+
+# Versión del inventario en la base: una sola fila (id=1) que avanza con cada
+# cambio de automóviles. Se usa cuando la caché no es compartida entre
+# procesos (ver cache_automoviles.version_inventario)
+class VersionInventario(models.Model):
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Inventario v{self.version}"
+
+
+# Cargas de inventario desde el panel (ver importacion.py): estado y resultado
+# para consultarlos después, mientras la importación corre en segundo plano
+class ImportacionInventario(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    ]
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    nombre_archivo = models.CharField(max_length=255, help_text="Nombre del archivo subido")
+    ruta = models.CharField(max_length=500, help_text="Copia en IMPORTACIONES_DIR; se borra al terminar")
+    formato = models.CharField(max_length=10)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE)
+    creada = models.DateTimeField(auto_now_add=True)
+    terminada = models.DateTimeField(blank=True, null=True)
+    procesadas = models.PositiveIntegerField(default=0)
+    importadas = models.PositiveIntegerField(default=0)
+    total_errores = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True, help_text="[[fila, mensaje]] de las primeras filas con error")
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-creada']
+
+    def __str__(self):
+        return f"Importación de {self.nombre_archivo} #{self.id} ({self.estado})"
+
+
+# Historial de cambios de Automovil (ver auditoria.py). Solo se agregan filas.
+class CambioAutomovil(models.Model):
+    CREADO = 1
+    EDITADO = 2
+    ELIMINADO = 3
+    PRECIO = 4
+    VENTA = 5
+    ACCIONES = [
+        (CREADO, 'Creado'),
+        (EDITADO, 'Editado'),
+        (ELIMINADO, 'Eliminado'),
+        (PRECIO, 'Cambio de precio'),
+        (VENTA, 'Venta'),
+    ]
+
+    automovil_id = models.BigIntegerField()  # Sin FK: el historial sobrevive al auto
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, related_name='+',
+        on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+    )
+    accion = models.PositiveSmallIntegerField(choices=ACCIONES)
+    fecha = models.DateTimeField()
+    cambios = models.JSONField(help_text="{campo: [antes, después]}")
+
+    class Meta:
+        indexes = [
+            # "Historial del auto X" y "cambios del usuario Y", de lo más nuevo a lo más viejo
+            models.Index(fields=['automovil_id', '-fecha'], name='cambio_automovil_fecha_idx'),
+            models.Index(fields=['usuario', '-fecha'], name='cambio_usuario_fecha_idx'),
+            # Compactación por antigüedad (ver `manage.py compactar_auditoria`)
+            models.Index(fields=['fecha'], name='cambio_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_accion_display()} auto #{self.automovil_id} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+# Un día de historial compactado: el cambio neto de cada campo
+class ResumenCambiosAutomovil(models.Model):
+    automovil_id = models.BigIntegerField()
+    dia = models.DateField()
+    registros = models.PositiveIntegerField(help_text="Cambios que se resumieron")
+    usuarios = models.JSONField(default=list)
+    cambios = models.JSONField(help_text="{campo: [primer antes, último después]}")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['automovil_id', 'dia'], name='resumen_cambios_automovil_dia_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Auto #{self.automovil_id} el {self.dia}: {self.registros} cambios"
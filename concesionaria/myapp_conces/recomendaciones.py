@@ -0,0 +1,205 @@
+"""
+Vehículos similares
+====================
+Cálculo por lotes de los vecinos más cercanos de cada automóvil disponible.
+Se ejecuta fuera de la petición (comando `calcular_similares`) y guarda el
+resultado en AutomovilSimilar; la vista de detalle solo lee esa tabla.
+
+Distancia entre dos autos:
+    peso_precio * (Δ log(precio) normalizado)²
+  + peso_anio   * (Δ año normalizado)²
+  + peso_marca  * (1 si la marca es distinta, 0 si es la misma)
+"""
+
+import itertools
+
+import numpy as np
+from django.db import transaction
+
+from .models import Automovil, AutomovilSimilar
+
+PESO_PRECIO = 1.0
+PESO_ANIO = 1.0
+PESO_MARCA = 0.75
+
+# Elementos máximos de la matriz de distancias por bloque (~32 MB en float64)
+ELEMENTOS_POR_BLOQUE = 4_000_000
+# Autos (consecutivos por precio) que se resuelven juntos, y autos que se
+# miran a cada lado del bloque antes de ampliar la banda de precio
+FILAS_POR_BANDA = 128
+MARGEN_BANDA = 128
+
+
+def _normalizar(valores):
+    """Escala a media 0 y desviación 1 (columna constante → ceros)."""
+    desviacion = valores.std()
+    if desviacion == 0:
+        return np.zeros_like(valores)
+    return (valores - valores.mean()) / desviacion
+
+
+def _k_menores(precio_n, anio_n, marcas, filas, desde, hasta, k):
+    """
+    Los k vecinos de las posiciones `filas` entre las columnas [desde, hasta).
+    Parte las filas para que cada matriz de distancias tenga a lo sumo
+    ELEMENTOS_POR_BLOQUE elementos.
+    """
+    indices = np.empty((len(filas), k), dtype=np.int64)
+    distancias = np.empty((len(filas), k))
+    paso = max(1, ELEMENTOS_POR_BLOQUE // (hasta - desde))
+
+    for a in range(0, len(filas), paso):
+        parte = filas[a:a + paso]
+        d = (precio_n[parte, None] - precio_n[None, desde:hasta]) ** 2
+        d += (anio_n[parte, None] - anio_n[None, desde:hasta]) ** 2
+        d += PESO_MARCA * (marcas[parte, None] != marcas[None, desde:hasta])
+        d[np.arange(len(parte)), parte - desde] = np.inf  # Un auto no es similar a sí mismo
+
+        # k menores sin ordenar toda la fila, luego se ordenan solo esos k
+        candidatos = np.argpartition(d, k - 1, axis=1)[:, :k]
+        dist_candidatos = np.take_along_axis(d, candidatos, axis=1)
+        orden = np.argsort(dist_candidatos, axis=1)
+        indices[a:a + paso] = np.take_along_axis(candidatos, orden, axis=1) + desde
+        distancias[a:a + paso] = np.take_along_axis(dist_candidatos, orden, axis=1)
+
+    return indices, distancias
+
+
+def _por_bandas(precio_n, anio_n, marcas, filas, k):
+    """
+    k vecinos exactos de las posiciones `filas` (columnas ya ordenadas por
+    precio). Cada bloque de FILAS_POR_BANDA filas se compara solo con los
+    autos de su banda de precio: MARGEN_BANDA a cada lado y, si no alcanza,
+    hasta √(k-ésima distancia) del bloque. Como la distancia nunca es menor
+    que el término de precio, fuera de ese radio no puede haber un vecino.
+    """
+    n = len(precio_n)
+    indices = np.empty((len(filas), k), dtype=np.int64)
+    distancias = np.empty((len(filas), k))
+    margen = max(MARGEN_BANDA, k)
+
+    for inicio in range(0, len(filas), FILAS_POR_BANDA):
+        bloque = filas[inicio:inicio + FILAS_POR_BANDA]
+        desde, hasta = max(0, bloque[0] - margen), min(n, bloque[-1] + 1 + margen)
+        vecinos, dist = _k_menores(precio_n, anio_n, marcas, bloque, desde, hasta, k)
+
+        radio = np.sqrt(dist[:, -1].max())
+        necesario_desde = np.searchsorted(precio_n, precio_n[bloque[0]] - radio, side='left')
+        necesario_hasta = np.searchsorted(precio_n, precio_n[bloque[-1]] + radio, side='right')
+        if necesario_desde < desde or necesario_hasta > hasta:
+            vecinos, dist = _k_menores(
+                precio_n, anio_n, marcas, bloque, min(desde, necesario_desde), max(hasta, necesario_hasta), k,
+            )
+        indices[inicio:inicio + len(bloque)] = vecinos
+        distancias[inicio:inicio + len(bloque)] = dist
+
+    return indices, distancias
+
+
+def vecinos_mas_cercanos(precios, anios, marcas, k):
+    """
+    Devuelve (indices, distancias), dos matrices n x k con los k vecinos
+    de cada fila ordenados de más a menos parecido. La fila propia se excluye.
+
+    Resultado exacto sin comparar todos contra todos:
+    1. Se busca dentro de cada marca, por bandas de precio (_por_bandas).
+    2. Un auto de otra marca está a PESO_MARCA o más: si el k-ésimo vecino
+       de la misma marca está más cerca, el resultado ya es definitivo.
+       Solo los autos de marcas chicas o aisladas se buscan en todo el
+       inventario (también por bandas).
+    Con inventario grande el costo es ~n·(FILAS_POR_BANDA + 2·MARGEN_BANDA)
+    en lugar de n².
+    """
+    n = len(precios)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0))
+
+    # Todo se trabaja en orden de precio; al final se vuelve al orden original
+    log_precios = np.log1p(np.asarray(precios, dtype=np.float64))
+    por_precio = np.argsort(log_precios, kind='stable')
+    precio_n = (_normalizar(log_precios) * np.sqrt(PESO_PRECIO))[por_precio]
+    anio_n = (_normalizar(np.asarray(anios, dtype=np.float64)) * np.sqrt(PESO_ANIO))[por_precio]
+    marcas = np.asarray(marcas)[por_precio]
+
+    indices = np.empty((n, k), dtype=np.int64)
+    distancias = np.empty((n, k))
+    pendientes = []
+
+    # 1. Dentro de cada marca (cada grupo sigue ordenado por precio)
+    por_marca = np.argsort(marcas, kind='stable')
+    limites = np.flatnonzero(np.r_[True, marcas[por_marca][1:] != marcas[por_marca][:-1], True])
+    for inicio, fin in zip(limites[:-1], limites[1:]):
+        grupo = por_marca[inicio:fin]
+        k_grupo = min(k, len(grupo) - 1)
+        if k_grupo < k:
+            pendientes.append(grupo)
+            continue
+        vecinos, dist = _por_bandas(precio_n[grupo], anio_n[grupo], marcas[grupo], np.arange(len(grupo)), k)
+        indices[grupo] = grupo[vecinos]
+        distancias[grupo] = dist
+        pendientes.append(grupo[dist[:, -1] > PESO_MARCA])
+
+    # 2. Los que pueden tener vecinos más cercanos en otra marca
+    pendientes = np.sort(np.concatenate(pendientes))
+    if len(pendientes):
+        indices[pendientes], distancias[pendientes] = _por_bandas(precio_n, anio_n, marcas, pendientes, k)
+
+    resultado = np.empty_like(indices)
+    resultado[por_precio] = por_precio[indices]
+    distancias_originales = np.empty_like(distancias)
+    distancias_originales[por_precio] = distancias
+    return resultado, distancias_originales
+
+
+def _lotes(objetos, tamano):
+    """Agrupa un iterable en listas de `tamano` elementos."""
+    objetos = iter(objetos)
+    while lote := list(itertools.islice(objetos, tamano)):
+        yield lote
+
+
+def recalcular_similares(k=6, tamano_lote=5000):
+    """
+    Recalcula la tabla completa de similares para los autos disponibles.
+    Devuelve el número de filas escritas.
+    """
+    filas = list(
+        Automovil.objects.filter(disponible=True)
+        .order_by('id')
+        .values_list('id', 'precio', 'anio', 'marca')
+    )
+    if not filas:
+        AutomovilSimilar.objects.all().delete()
+        return 0
+
+    ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+    precios = np.array([float(fila[1]) for fila in filas])
+    anios = np.array([fila[2] for fila in filas], dtype=np.int64)
+    # Codificación de marca: un entero por marca (sin distinguir mayúsculas)
+    _, marcas = np.unique([fila[3].strip().lower() for fila in filas], return_inverse=True)
+
+    indices, distancias = vecinos_mas_cercanos(precios, anios, marcas, k)
+
+    # Generador: los objetos se crean lote a lote, no todos en una lista
+    vecinos = (
+        AutomovilSimilar(
+            automovil_id=automovil_id,
+            similar_id=similar_id,
+            posicion=posicion,
+            distancia=distancia,
+        )
+        for automovil_id, fila_ids, fila_distancias in zip(
+            ids.tolist(), ids[indices].tolist(), distancias.tolist(),
+        )
+        for posicion, (similar_id, distancia) in enumerate(zip(fila_ids, fila_distancias))
+    )
+
+    # Reemplazo atómico: la vista nunca ve la tabla a medio escribir
+    total = 0
+    with transaction.atomic():
+        AutomovilSimilar.objects.all().delete()
+        for lote in _lotes(vecinos, tamano_lote):
+            AutomovilSimilar.objects.bulk_create(lote)
+            total += len(lote)
+    return total
@@ -0,0 +1,217 @@
+"""
+Reporte imprimible del inventario
+==================================
+El panel (Imprimir en /panel/inventario/) pide un reporte con los mismos
+filtros que la API (marca, anio, anio_min, anio_max, precio_min,
+precio_max, disponible): autos agrupados por marca, con miniatura de la
+imagen, listo para imprimir o guardar como PDF desde el navegador.
+
+- Se arma en segundo plano (cola 'reportes' de `manage.py worker`): los
+  autos se leen con iterator() por lotes de REPORTES_LOTE y cada lote se
+  renderiza y se escribe al archivo, sin tener el inventario en memoria.
+- La clave del reporte es un hash de version_inventario() y los filtros:
+  mientras el inventario no cambie, pedirlo de nuevo devuelve el archivo
+  ya generado sin encolar nada.
+- `estado(clave)` dice si está listo, en proceso o falló (lo consulta el
+  panel hasta que está listo y entonces lo descarga). Se lee de la base
+  (la Tarea con referencia `reporte:<clave>`, por índice) y del storage,
+  no de la caché: así lo ve cualquier proceso web aunque la caché sea local.
+- Los archivos van a REPORTES_STORAGE, que deben compartir los procesos
+  web y el worker (por defecto MEDIA_ROOT/.reportes; no se sirve como
+  media pública, se descarga desde el panel).
+- El archivo es HTML autocontenido (miniaturas embebidas): se puede
+  descargar y abrir sin el sitio. Los de más de REPORTES_RETENCION_HORAS
+  se borran al generar uno nuevo.
+"""
+
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from .api import filtrar
+from .cache_automoviles import version_inventario
+from .models import Automovil, Tarea
+from .tareas import encolar
+
+logger = logging.getLogger(__name__)
+
+FILTROS = ['marca', 'anio', 'anio_min', 'anio_max', 'precio_min', 'precio_max', 'disponible']
+COLUMNAS = ['id', 'marca', 'modelo', 'anio', 'precio', 'cantidad', 'disponible', 'imagen']
+
+LISTO = 'listo'
+EN_PROCESO = 'en_proceso'
+ERROR = 'error'
+
+
+def filtros_de(parametros):
+    """Los filtros del reporte presentes en `parametros` (request.GET o dict)."""
+    filtros = {nombre: parametros.get(nombre, '').strip() for nombre in FILTROS}
+    filtros = {nombre: valor for nombre, valor in filtros.items() if valor}
+    # Valida ahora (lanza api.ErrorConsulta): filtrar() no consulta la base
+    filtrar(filtros, Automovil.objects.none())
+    return filtros
+
+
+def clave_de(filtros):
+    huella = f'{version_inventario()}|{json.dumps(filtros, sort_keys=True)}'
+    return hashlib.sha256(huella.encode()).hexdigest()[:32]
+
+
+def nombre_archivo(clave):
+    return f'inventario-{clave}.html'
+
+
+def almacenamiento():
+    """El storage de REPORTES_STORAGE (el mismo para web y worker)."""
+    return import_string(settings.REPORTES_STORAGE['BACKEND'])(**settings.REPORTES_STORAGE.get('OPTIONS', {}))
+
+
+def abrir(clave):
+    """El reporte generado, abierto para leer."""
+    return almacenamiento().open(nombre_archivo(clave), 'rb')
+
+
+# ========================================================================
+# PEDIDO Y ESTADO
+# ========================================================================
+def solicitar(filtros):
+    """
+    Devuelve la clave del reporte para `filtros` y, si no está generado ni
+    en proceso, encola su generación (también si falló o se borró).
+    """
+    clave = clave_de(filtros)
+    if estado(clave) not in (LISTO, EN_PROCESO):
+        # Dos pedidos simultáneos pueden encolar dos tareas: la segunda
+        # encuentra el archivo ya generado y termina sin hacer nada
+        encolar(generar, cola='reportes', referencia=_referencia(clave), clave=clave, filtros=filtros)
+    return clave
+
+
+def _referencia(clave):
+    return f'reporte:{clave}'
+
+
+def _estado_tarea(clave):
+    """Estado de la última Tarea que generó (o genera) el reporte `clave`, o None."""
+    return (
+        Tarea.objects.filter(referencia=_referencia(clave))
+        .order_by('-id').values_list('estado', flat=True).first()
+    )
+
+
+def estado(clave):
+    """LISTO, EN_PROCESO, ERROR, o None si nunca se pidió (o ya se borró)."""
+    estado_tarea = _estado_tarea(clave)
+    # Mientras la tarea corre el archivo puede estar escribiéndose
+    if estado_tarea in (Tarea.PENDIENTE, Tarea.EN_PROCESO):
+        return EN_PROCESO
+    if almacenamiento().exists(nombre_archivo(clave)):
+        return LISTO
+    if estado_tarea is None:
+        return None
+    # Fallida, o completada sin archivo (se borró por antigüedad)
+    return ERROR
+
+
+# ========================================================================
+# GENERACIÓN (tarea en segundo plano)
+# ========================================================================
+def _miniatura(nombre, storage):
+    """Imagen reducida a REPORTES_MINIATURA_LADO como data URI JPEG, o None."""
+    lado = settings.REPORTES_MINIATURA_LADO
+    try:
+        with storage.open(nombre, 'rb') as archivo:
+            imagen = ImageOps.exif_transpose(Image.open(archivo))
+            imagen.thumbnail((lado, lado))
+            salida = BytesIO()
+            imagen.convert('RGB').save(salida, format='JPEG', quality=70)
+    except (OSError, ValueError):
+        logger.warning('Reporte: no se pudo leer la imagen %s', nombre)
+        return None
+    return 'data:image/jpeg;base64,' + base64.b64encode(salida.getvalue()).decode()
+
+
+def _trozos(filtros):
+    """El reporte en trozos de HTML: encabezado, un trozo por lote de cada marca, cierre."""
+    autos = filtrar(filtros, Automovil.objects.all())
+    por_marca = list(
+        autos.values('marca').annotate(modelos=Count('id'), unidades=Sum('cantidad')).order_by('marca')
+    )
+    yield render_to_string('reporte_inventario_inicio.html', {
+        'filtros': filtros,
+        'generado': timezone.now(),
+        'por_marca': por_marca,
+        'total_modelos': sum(grupo['modelos'] for grupo in por_marca),
+        'total_unidades': sum(grupo['unidades'] or 0 for grupo in por_marca),
+    })
+
+    storage = Automovil._meta.get_field('imagen').storage
+    lote = settings.REPORTES_LOTE
+    filas = autos.order_by('marca', 'modelo', 'anio', 'id').only(*COLUMNAS).iterator(chunk_size=lote)
+    for marca, del_grupo in itertools.groupby(filas, key=lambda automovil: automovil.marca):
+        for numero in itertools.count():
+            bloque = list(itertools.islice(del_grupo, lote))
+            if not bloque:
+                break
+            # Deduplicadas dentro del lote (los autos que comparten imagen quedan
+            # juntos al ordenar por modelo): a lo sumo REPORTES_LOTE en memoria
+            miniaturas = {}
+            for automovil in bloque:
+                nombre = automovil.imagen.name
+                if nombre and nombre not in miniaturas:
+                    miniaturas[nombre] = _miniatura(nombre, storage)
+                automovil.miniatura = miniaturas.get(nombre)
+            yield render_to_string('reporte_inventario_marca.html', {
+                'marca': marca, 'automoviles': bloque, 'continua': numero > 0,
+            })
+    yield render_to_string('reporte_inventario_fin.html')
+
+
+def generar(clave, filtros):
+    """Tarea encolada por `solicitar`: guarda el reporte en REPORTES_STORAGE."""
+    storage = almacenamiento()
+    destino = nombre_archivo(clave)
+    if storage.exists(destino):
+        return
+    # Se arma completo en un temporal local y recién entonces se sube
+    with tempfile.TemporaryFile() as temporal:
+        for trozo in _trozos(filtros):
+            temporal.write(trozo.encode())
+        temporal.seek(0)
+        guardado = storage.save(destino, File(temporal, name=destino))
+    if guardado != destino:
+        # Otra tarea lo guardó mientras tanto y el storage eligió otro nombre
+        storage.delete(guardado)
+    purgar_viejos()
+
+
+def purgar_viejos():
+    """Borra los reportes generados hace más de REPORTES_RETENCION_HORAS."""
+    storage = almacenamiento()
+    limite = timezone.now() - timedelta(hours=settings.REPORTES_RETENCION_HORAS)
+    try:
+        _, archivos = storage.listdir('')
+    except FileNotFoundError:  # Todavía no se generó ninguno
+        return 0
+    borrados = 0
+    for archivo in archivos:
+        try:
+            if storage.get_modified_time(archivo) < limite:
+                storage.delete(archivo)
+                borrados += 1
+        except FileNotFoundError:  # Lo borró otro worker
+            continue
+    return borrados
@@ -0,0 +1,212 @@
+"""
+Reservas de stock
+==================
+Agregar un auto al carrito lo aparta por RESERVA_MINUTOS: nadie más
+puede llevarse esas unidades mientras tanto, y quien agrega se entera en
+ese momento (no al pagar) de que no quedan.
+
+- Automovil.reservado es el contador de unidades apartadas; lo libre es
+  cantidad - reservado (`Automovil.libres`). El catálogo lo lee de esas
+  dos columnas, sin sumar reservas en cada petición.
+- Reservar es un UPDATE condicional (... WHERE cantidad - reservado >= n)
+  para todos los autos de la petición: si alguno no alcanza no se aparta
+  nada. No hay lectura previa que pueda quedar vieja.
+- Cada reserva (carrito, automovil) es una fila de Reserva con su
+  vencimiento; volver a agregar suma y renueva el plazo (ON CONFLICT).
+- Al finalizar la compra (`confirmar`) se borran las reservas del
+  carrito, se devuelve su `reservado` (el mismo UPDATE por conjunto que
+  `liberar`) y se descuenta el stock de las sucursales (ver
+  sucursales.py); lo apartado por otros carritos no se puede vender.
+  Todo en la transacción de la venta: o se confirma entero o no pasa
+  nada. `cantidad` la recalcula después sucursales.sincronizar_totales.
+- `liberar_vencidas` (`manage.py liberar_reservas`, por cron cada
+  minuto) devuelve por lotes lo apartado por reservas vencidas.
+- `conciliar_reservado` (`manage.py conciliar_reservas`, por cron cada
+  hora) recalcula `reservado` desde las filas de Reserva donde no
+  coincida, por si algún UPDATE se perdió o alguien editó la base a mano.
+
+Orden de bloqueo en todas las operaciones: Reserva, Automovil y por
+último StockSucursal (el mismo que el panel: guardar el auto y después
+`conciliar_principal`).
+
+Los cambios de `reservado` no invalidan la caché de autos ni avanzan
+version_inventario(): lo que decide si hay stock es siempre el UPDATE.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection as conexion_por_defecto, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .eventos import publicar_stock
+from .models import Automovil, Reserva
+from .sucursales import StockInsuficiente, asignar_stock
+
+MOTORES_UPSERT = ('postgresql', 'sqlite')
+
+
+def _por_auto(cantidades):
+    """Expresión SQL que vale cantidades[id] en la fila de cada auto."""
+    return Case(
+        *[When(id=automovil_id, then=Value(cantidad)) for automovil_id, cantidad in cantidades.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _stock_insuficiente(pedidos):
+    """El primer auto de `pedidos` cuyo stock libre no alcanza."""
+    autos = Automovil.objects.in_bulk(list(pedidos))
+    for automovil_id in sorted(pedidos):
+        automovil = autos.get(automovil_id)
+        if automovil is None:  # Se eliminó mientras tanto
+            return StockInsuficiente(f'el auto #{automovil_id}', pedidos[automovil_id], 0)
+        disponibles = automovil.libres
+        if disponibles < pedidos[automovil_id]:
+            return StockInsuficiente(automovil, pedidos[automovil_id], disponibles)
+    return StockInsuficiente('el carrito', sum(pedidos.values()), 0)
+
+
+def _publicar(ids):
+    for automovil in Automovil.objects.filter(id__in=ids).only('id', 'cantidad', 'reservado', 'disponible'):
+        publicar_stock(automovil)
+
+
+def _devolver(devueltas):
+    """Resta {automovil_id: unidades} de Automovil.reservado con un solo UPDATE."""
+    Automovil.objects.filter(id__in=devueltas).update(reservado=F('reservado') - _por_auto(devueltas))
+
+
+# ========================================================================
+# APARTAR (al agregar al carrito)
+# ========================================================================
+def _guardar_reservas(connection, carrito_id, cantidades, vence):
+    if connection.vendor not in MOTORES_UPSERT:
+        for automovil_id, cantidad in cantidades.items():
+            actualizadas = Reserva.objects.filter(carrito_id=carrito_id, automovil_id=automovil_id).update(
+                cantidad=F('cantidad') + cantidad, vence=vence,
+            )
+            if not actualizadas:
+                Reserva.objects.create(carrito_id=carrito_id, automovil_id=automovil_id, cantidad=cantidad, vence=vence)
+        return
+    tabla = connection.ops.quote_name(Reserva._meta.db_table)
+    fecha = connection.ops.adapt_datetimefield_value(vence)
+    valores = ', '.join(['(%s, %s, %s, %s)'] * len(cantidades))
+    parametros = [
+        valor for automovil_id, cantidad in cantidades.items()
+        for valor in (carrito_id, automovil_id, cantidad, fecha)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tabla} (carrito_id, automovil_id, cantidad, vence) VALUES {valores} '
+            f'ON CONFLICT (carrito_id, automovil_id) DO UPDATE SET '
+            f'cantidad = {tabla}.cantidad + EXCLUDED.cantidad, vence = EXCLUDED.vence',
+            parametros,
+        )
+
+
+def reservar(carrito_id, cantidades, connection=conexion_por_defecto):
+    """
+    Aparta {automovil_id: unidades} para el carrito. Debe llamarse dentro
+    de transaction.atomic(). Lanza StockInsuficiente si algún auto no tiene
+    suficientes unidades libres (y la transacción no debe confirmarse).
+    """
+    # Primero las filas de Reserva y después las de Automovil, el mismo
+    # orden de bloqueo que `liberar` (`confirmar` no bloquea autos)
+    vence = timezone.now() + timedelta(minutes=settings.RESERVA_MINUTOS)
+    _guardar_reservas(connection, carrito_id, cantidades, vence)
+    apartados = (
+        Automovil.objects.using(connection.alias)
+        .filter(id__in=cantidades, cantidad__gte=F('reservado') + _por_auto(cantidades))
+        .update(reservado=F('reservado') + _por_auto(cantidades))
+    )
+    if apartados < len(cantidades):
+        raise _stock_insuficiente(cantidades)
+
+
+# ========================================================================
+# VENDER (al finalizar la compra)
+# ========================================================================
+def confirmar(carrito_id, pedidos, preferida_id=None):
+    """
+    Convierte las reservas del carrito en la venta de {automovil_id: unidades}:
+    borra sus filas de Reserva y descuenta StockSucursal (sucursales.asignar_stock,
+    con `preferida_id` primero). Debe llamarse dentro de transaction.atomic().
+    Lo que no estaba reservado (o cuya reserva se liberó) necesita stock
+    libre; si no hay, lanza StockInsuficiente. Devuelve las asignaciones.
+    """
+    retenidas = dict(
+        Reserva.objects.select_for_update().filter(carrito_id=carrito_id)
+        .values_list('automovil_id', 'cantidad')
+    )
+    if retenidas:
+        # Dentro de la venta: si la transacción se revierte, las reservas siguen en pie
+        Reserva.objects.filter(carrito_id=carrito_id).delete()
+        _devolver(retenidas)
+    # Lo que queda en `reservado` es de otros carritos
+    apartadas = dict(Automovil.objects.filter(id__in=pedidos).values_list('id', 'reservado'))
+    return asignar_stock(pedidos, preferida_id, apartadas)
+
+
+# ========================================================================
+# LIBERAR
+# ========================================================================
+def liberar(reservas, tamano_lote=None):
+    """
+    Borra las reservas de `reservas` (un queryset) y devuelve sus unidades
+    al stock libre. Las filas bloqueadas por otra transacción se saltan
+    (SKIP LOCKED donde se puede). Devuelve cuántas reservas liberó.
+    """
+    with transaction.atomic():
+        bloqueadas = reservas.select_for_update(
+            skip_locked=conexion_por_defecto.features.has_select_for_update_skip_locked,
+        ).order_by('id').values_list('id', 'automovil_id', 'cantidad')
+        filas = list(bloqueadas[:tamano_lote] if tamano_lote else bloqueadas)
+        if not filas:
+            return 0
+        devueltas = {}
+        for _, automovil_id, cantidad in filas:
+            devueltas[automovil_id] = devueltas.get(automovil_id, 0) + cantidad
+        Reserva.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+        _devolver(devueltas)
+        transaction.on_commit(lambda: _publicar(devueltas))
+    return len(filas)
+
+
+def liberar_vencidas(tamano_lote=1000):
+    """Libera por lotes las reservas vencidas. Devuelve cuántas."""
+    ahora = timezone.now()
+    total = 0
+    while True:
+        liberadas = liberar(Reserva.objects.filter(vence__lt=ahora), tamano_lote)
+        total += liberadas
+        if liberadas < tamano_lote:
+            return total
+
+
+# ========================================================================
+# CONCILIAR
+# ========================================================================
+def conciliar_reservado(tamano_lote=1000):
+    """
+    Pone Automovil.reservado igual a la suma de sus filas de Reserva en los
+    autos donde no coincide. Devuelve cuántos autos corrigió.
+    """
+    sumas = Reserva.objects.values('automovil_id').annotate(total=Sum('cantidad')).values_list('automovil_id', 'total')
+    en_reservas = dict(sumas)
+    descuadrados = [
+        automovil_id for automovil_id, reservado in Automovil.objects.order_by('id').values_list('id', 'reservado')
+        if reservado != en_reservas.get(automovil_id, 0)
+    ]
+    corregidos = 0
+    for inicio in range(0, len(descuadrados), tamano_lote):
+        lote = descuadrados[inicio:inicio + tamano_lote]
+        with transaction.atomic():
+            # Primero la fila del auto: quien esté cambiando sus reservas aplica
+            # su delta sobre lo que se escriba aquí, no al revés
+            list(Automovil.objects.select_for_update().filter(id__in=lote).order_by('id').values_list('id', flat=True))
+            correctos = dict(sumas.filter(automovil_id__in=lote))
+            corregidos += Automovil.objects.filter(id__in=lote).update(reservado=_por_auto(correctos))
+            transaction.on_commit(lambda lote=lote: _publicar(lote))
+    return corregidos
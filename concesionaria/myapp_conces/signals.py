@@ -0,0 +1,45 @@
+"""
+Señales de Automovil
+=====================
+Al confirmar la transacción (nunca un cambio que luego se revierte):
+
+- invalidan la caché por id (ver cache_automoviles.py)
+- actualizan el índice de autocompletado (ver autocompletado.py)
+- avisan de los cambios de stock a los suscriptores en vivo (ver eventos.py)
+
+Lo único inmediato es sacar el auto del L1 de este proceso: si la
+transacción se revierte solo se pierde una entrada, y un id reutilizado
+(SQLite tras un rollback) nunca encuentra el auto anterior en memoria.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocompletado import indice
+from .cache_automoviles import descartar_local, invalidar_ahora
+from .eventos import publicar_eliminado, publicar_stock
+from .models import Automovil
+
+
+@receiver(post_save, sender=Automovil)
+def automovil_guardado(sender, instance, **kwargs):
+    descartar_local([instance.id])
+
+    def al_confirmar():
+        version = invalidar_ahora([instance.id])
+        indice.actualizar(version, instance.id, instance)
+        publicar_stock(instance)
+    transaction.on_commit(al_confirmar)
+
+
+@receiver(post_delete, sender=Automovil)
+def automovil_eliminado(sender, instance, **kwargs):
+    automovil_id = instance.id
+    descartar_local([automovil_id])
+
+    def al_confirmar():
+        version = invalidar_ahora([automovil_id])
+        indice.actualizar(version, automovil_id)
+        publicar_eliminado(automovil_id)
+    transaction.on_commit(al_confirmar)
@@ -0,0 +1,83 @@
+"""
+Almacenamiento de imágenes direccionado por contenido
+======================================================
+Cada imagen se guarda con el SHA-256 de sus bytes como nombre:
+
+    autos/camaro.jfif  →  autos/3f/3fa9...c1.jfif
+
+- Dos subidas idénticas terminan en el mismo archivo (se guarda una vez)
+- El archivo se copia por bloques, nunca entero en memoria
+- Un archivo con nombre de hash nunca cambia: se puede cachear para siempre
+- Los archivos que ningún auto usa los borra `manage.py purgar_imagenes`
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ImagenHashStorage(FileSystemStorage):
+    """FileSystemStorage que nombra los archivos por el hash de su contenido."""
+
+    def _save(self, name, content):
+        directorio, nombre = os.path.split(name)
+        extension = os.path.splitext(nombre)[1].lower()
+        directorio_tmp = os.path.join(self.location, '.tmp')
+        os.makedirs(directorio_tmp, exist_ok=True)
+
+        hasher = hashlib.sha256()
+        tamano = 0
+        fd, ruta_tmp = tempfile.mkstemp(dir=directorio_tmp)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # Subida grande ya volcada a disco por Django: solo leer para el hash
+                os.close(fd)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tamano += len(chunk)
+                    self._validar_tamano(tamano)
+                file_move_safe(content.temporary_file_path(), ruta_tmp, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, 'wb') as destino:
+                    for chunk in content.chunks():
+                        hasher.update(chunk)
+                        tamano += len(chunk)
+                        self._validar_tamano(tamano)
+                        destino.write(chunk)
+
+            digest = hasher.hexdigest()
+            nombre_final = os.path.join(directorio, digest[:2], f'{digest[:32]}{extension}')
+            ruta_final = self.path(nombre_final)
+
+            if os.path.exists(ruta_final):
+                # Duplicado: ya está guardado. Se renueva su fecha para que
+                # imagenes.purgar_huerfanas no lo tome por huérfano
+                os.utime(ruta_final)
+                return nombre_final
+
+            os.makedirs(os.path.dirname(ruta_final), exist_ok=True)
+            os.replace(ruta_tmp, ruta_final)
+            if self.file_permissions_mode is not None:
+                os.chmod(ruta_final, self.file_permissions_mode)
+            return nombre_final
+        finally:
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+
+    def _validar_tamano(self, tamano):
+        if tamano > settings.IMAGEN_MAX_BYTES:
+            raise SuspiciousFileOperation(
+                f'La imagen supera el tamaño máximo de {settings.IMAGEN_MAX_BYTES} bytes.'
+            )
+
+
+def obtener_storage_imagenes():
+    """Storage del campo Automovil.imagen (callable para no fijar rutas en migraciones)."""
+    return ImagenHashStorage()
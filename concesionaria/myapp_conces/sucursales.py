@@ -0,0 +1,177 @@
+"""
+Stock por sucursal
+===================
+Cada sucursal tiene su propio stock de cada auto (StockSucursal).
+Automovil.cantidad queda como el total de todas las sucursales, para que
+catálogo, panel, API y eventos en vivo lo sigan leyendo de una columna.
+
+- Checkout (`asignar_stock`): bloquea con SELECT ... FOR UPDATE solo las
+  filas de stock de los autos comprados, y descuenta de la sucursal
+  preferida primero y luego de las que más tienen. Dos ventas del mismo
+  modelo en sucursales distintas ya no esperan por la misma fila.
+- El total se recalcula al confirmar (`sincronizar_totales`), fuera de
+  la transacción de la venta.
+- Panel e importación siguen editando el total: `conciliar_principal`
+  ajusta la sucursal principal (SUCURSAL_PRINCIPAL) por la diferencia.
+"""
+
+import math
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .auditoria import registrar
+from .cache_automoviles import invalidar
+from .eventos import publicar_stock
+from .models import Automovil, CambioAutomovil, StockSucursal, Sucursal
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, automovil, pedidos, disponibles):
+        self.automovil = automovil
+        self.pedidos = pedidos
+        self.disponibles = disponibles
+        super().__init__(f'{automovil}: se pidieron {pedidos}, hay {disponibles}')
+
+
+def sucursal_principal():
+    sucursal, _ = Sucursal.objects.get_or_create(nombre=settings.SUCURSAL_PRINCIPAL)
+    return sucursal
+
+
+# ========================================================================
+# "DISPONIBLE CERCA DE MÍ"
+# ========================================================================
+def _distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia haversine entre dos puntos (km)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def sucursales_cercanas(latitud, longitud, radio_km=None):
+    """Sucursales activas a menos de `radio_km`, de la más cercana a la más lejana."""
+    radio_km = radio_km or settings.SUCURSAL_RADIO_KM
+    # Pocas sucursales: se calcula en Python, sin extensiones geográficas en la base
+    con_distancia = [
+        (_distancia_km(latitud, longitud, sucursal.latitud, sucursal.longitud), sucursal)
+        for sucursal in Sucursal.objects.filter(activa=True, latitud__isnull=False, longitud__isnull=False)
+    ]
+    return [sucursal for distancia, sucursal in sorted(con_distancia, key=lambda par: par[0]) if distancia <= radio_km]
+
+
+def con_stock_en(queryset, sucursales_ids):
+    """Filtra autos con existencias en alguna de las sucursales (índice stock_con_existencias_idx)."""
+    return queryset.filter(Exists(StockSucursal.objects.filter(
+        automovil=OuterRef('pk'), sucursal_id__in=sucursales_ids, cantidad__gt=0,
+    )))
+
+
+# ========================================================================
+# CHECKOUT
+# ========================================================================
+def asignar_stock(pedidos, preferida_id=None, apartadas=None):
+    """
+    Descuenta stock para {automovil_id: cantidad}. Debe llamarse dentro de
+    transaction.atomic(). `apartadas` son las unidades de cada auto
+    reservadas por otros carritos, que no se pueden vender. Lanza
+    StockInsuficiente sin descontar nada si algún auto no alcanza o ya no
+    existe.
+    Devuelve [(sucursal_id, automovil_id, cantidad)].
+    """
+    # Orden fijo (automovil, sucursal) al bloquear: dos compras con los mismos
+    # autos toman las filas en el mismo orden y no se bloquean mutuamente
+    filas = list(
+        StockSucursal.objects.select_for_update()
+        .filter(automovil_id__in=pedidos, cantidad__gt=0)
+        .order_by('automovil_id', 'sucursal_id')
+        .values_list('id', 'sucursal_id', 'automovil_id', 'cantidad')
+    )
+    por_auto = {}
+    for fila in filas:
+        por_auto.setdefault(fila[2], []).append(fila)
+
+    apartadas = apartadas or {}
+    asignaciones = []
+    for automovil_id, cantidad in pedidos.items():
+        stocks = por_auto.get(automovil_id, [])
+        existencias_totales = sum(fila[3] for fila in stocks)
+        disponibles = max(existencias_totales - apartadas.get(automovil_id, 0), 0)
+        if disponibles < cantidad:
+            # Si se eliminó mientras tanto no hay fila que nombrar (ni stock)
+            automovil = Automovil.objects.filter(id=automovil_id).first() or f'el auto #{automovil_id}'
+            raise StockInsuficiente(automovil, cantidad, disponibles)
+        registrar(automovil_id, CambioAutomovil.VENTA, {'cantidad': (existencias_totales, existencias_totales - cantidad)})
+        stocks.sort(key=lambda fila: (fila[1] != preferida_id, -fila[3]))
+        restante = cantidad
+        for stock_id, sucursal_id, _, existencias in stocks:
+            tomar = min(restante, existencias)
+            asignaciones.append((stock_id, sucursal_id, automovil_id, tomar))
+            restante -= tomar
+            if not restante:
+                break
+
+    for stock_id, _, _, tomar in asignaciones:
+        StockSucursal.objects.filter(id=stock_id).update(cantidad=F('cantidad') - tomar)
+    return [(sucursal_id, automovil_id, tomar) for _, sucursal_id, automovil_id, tomar in asignaciones]
+
+
+# ========================================================================
+# TOTALES
+# ========================================================================
+def sincronizar_totales(ids):
+    """Automovil.cantidad = suma de sus sucursales (y disponible si hay stock)."""
+    ids = list(ids)
+    if not ids:
+        return
+    suma = (
+        StockSucursal.objects.filter(automovil=OuterRef('pk'))
+        .values('automovil').annotate(total=Sum('cantidad')).values('total')
+    )
+    hay_stock = StockSucursal.objects.filter(automovil=OuterRef('pk'), cantidad__gt=0)
+    Automovil.objects.filter(id__in=ids).update(
+        cantidad=Coalesce(Subquery(suma), 0), disponible=Exists(hay_stock),
+    )
+    # update() no dispara señales
+    invalidar(*ids)
+    for automovil in Automovil.objects.filter(id__in=ids).only('id', 'cantidad', 'reservado', 'disponible'):
+        publicar_stock(automovil)
+
+
+def conciliar_principal(ids=None):
+    """
+    Donde Automovil.cantidad (editada en el panel o importada) no coincide
+    con la suma de sucursales, la diferencia va a la sucursal principal.
+    Sin `ids` revisa todo el inventario con una sola consulta agregada.
+    """
+    principal = sucursal_principal()
+    autos = Automovil.objects.all() if ids is None else Automovil.objects.filter(id__in=ids)
+    diferencias = {
+        automovil_id: cantidad - en_sucursales
+        for automovil_id, cantidad, en_sucursales in (
+            autos.annotate(en_sucursales=Coalesce(Sum('stocks__cantidad'), 0))
+            .exclude(cantidad=F('en_sucursales'))
+            .values_list('id', 'cantidad', 'en_sucursales')
+        )
+    }
+    if not diferencias:
+        return 0
+    actuales = dict(
+        StockSucursal.objects.filter(sucursal=principal, automovil_id__in=diferencias)
+        .values_list('automovil_id', 'cantidad')
+    )
+    nuevos, recortados = [], []
+    for automovil_id, diferencia in diferencias.items():
+        cantidad = actuales.get(automovil_id, 0) + diferencia
+        if cantidad < 0:
+            # Se bajó el total por debajo de lo que tienen las otras sucursales
+            recortados.append(automovil_id)
+            cantidad = 0
+        nuevos.append(StockSucursal(sucursal=principal, automovil_id=automovil_id, cantidad=cantidad))
+    StockSucursal.objects.bulk_create(
+        nuevos, batch_size=1000, update_conflicts=True,
+        unique_fields=['sucursal', 'automovil'], update_fields=['cantidad'],
+    )
+    sincronizar_totales(recortados)
+    return len(nuevos)
@@ -0,0 +1,196 @@
+"""
+Cola de tareas en la base de datos
+===================================
+Trabajo que no necesita hacerse dentro de la petición (procesar imágenes,
+notificaciones...) se encola como una fila de Tarea y lo ejecuta
+`manage.py worker`. No hace falta Redis ni otro broker.
+
+Uso:
+    from myapp_conces.tareas import encolar
+    encolar(procesar_imagen, automovil_id=auto.id)
+
+- La tarea se inserta en la misma transacción que la petición: si la
+  petición hace rollback, la tarea tampoco existe.
+- Los argumentos deben ser serializables a JSON.
+- `referencia` (opcional, indexada) permite encontrar después la tarea
+  por lo que produce, sin buscar dentro del JSON de los argumentos.
+- Reclamo: SELECT ... FOR UPDATE SKIP LOCKED donde el motor lo soporta
+  (PostgreSQL, MySQL 8); en SQLite, un UPDATE condicional por fila.
+- Una tarea que falla se reintenta hasta max_intentos; `ultimo_intento()`
+  le dice si ya no habrá otro (p. ej. para limpiar lo que dejaría para el
+  reintento).
+- Mientras ejecuta, el worker renueva el `latido` de sus tareas cada
+  TAREAS_LATIDO_SEGUNDOS. Una tarea en proceso sin latido en
+  TAREAS_TIMEOUT_SEGUNDOS es de un worker caído: `recuperar_abandonadas` la
+  devuelve a la cola, o la da por fallida si ya agotó sus intentos. Una
+  tarea larga con su worker vivo nunca se recupera.
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .auditoria import en_lote
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Tarea que se está ejecutando (ver ultimo_intento)
+_tarea_actual = ContextVar('tarea_actual', default=None)
+
+
+def encolar(funcion, cola='default', retraso=0, max_intentos=None, referencia='', **argumentos):
+    """Encola `funcion(**argumentos)`. `funcion` puede ser la función o su ruta."""
+    if callable(funcion):
+        funcion = f'{funcion.__module__}.{funcion.__qualname__}'
+    return Tarea.objects.create(
+        funcion=funcion,
+        argumentos=argumentos,
+        referencia=referencia,
+        cola=cola,
+        disponible_en=timezone.now() + timedelta(seconds=retraso),
+        max_intentos=max_intentos or settings.TAREAS_MAX_INTENTOS,
+    )
+
+
+def reclamar_filas(queryset, cantidad, **cambios):
+    """
+    Reclama hasta `cantidad` filas de `queryset` aplicándoles `cambios`,
+    de forma que dos workers nunca reclamen la misma fila.
+    Devuelve la lista de ids reclamados.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(queryset.select_for_update(skip_locked=True).values_list('id', flat=True)[:cantidad])
+            queryset.model.objects.filter(id__in=ids).update(**cambios)
+        return ids
+    # Sin SKIP LOCKED: el UPDATE repite los filtros, solo un worker gana cada fila
+    return [
+        fila_id for fila_id in queryset.values_list('id', flat=True)[:cantidad]
+        if queryset.filter(id=fila_id).update(**cambios)
+    ]
+
+
+def reclamar(colas, cantidad, trabajador=''):
+    """Reclama tareas vencidas de las colas indicadas, por orden de llegada."""
+    ahora = timezone.now()
+    pendientes = Tarea.objects.filter(
+        cola__in=colas, estado=Tarea.PENDIENTE, disponible_en__lte=ahora,
+    ).order_by('disponible_en')
+    ids = reclamar_filas(
+        pendientes, cantidad,
+        estado=Tarea.EN_PROCESO, iniciada=ahora, latido=ahora, trabajador=trabajador[:100],
+        intentos=F('intentos') + 1,
+    )
+    return list(Tarea.objects.filter(id__in=ids).order_by('disponible_en'))
+
+
+def _espera_reintento(intentos):
+    segundos = settings.TAREAS_REINTENTO_BASE_SEGUNDOS * (2 ** (intentos - 1))
+    return timedelta(seconds=min(segundos, settings.TAREAS_REINTENTO_MAX_SEGUNDOS))
+
+
+def ultimo_intento():
+    """¿Si la tarea en ejecución falla, ya no se reintenta? Fuera de una tarea, True."""
+    tarea = _tarea_actual.get()
+    return tarea is None or tarea.intentos >= tarea.max_intentos
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya reclamada y guarda el resultado. Devuelve True si terminó bien."""
+    token = _tarea_actual.set(tarea)
+    try:
+        with en_lote():  # Los cambios de inventario de la tarea, en un solo bulk_create
+            import_string(tarea.funcion)(**tarea.argumentos)
+    except Exception as error:
+        ahora = timezone.now()
+        if tarea.intentos >= tarea.max_intentos:
+            logger.exception('Tarea %s (%s) fallida definitivamente', tarea.id, tarea.funcion)
+            Tarea.objects.filter(id=tarea.id).update(
+                estado=Tarea.FALLIDA, terminada=ahora, ultimo_error=str(error)[:2000],
+            )
+        else:
+            logger.warning('Tarea %s (%s) falló, se reintentará: %s', tarea.id, tarea.funcion, error)
+            Tarea.objects.filter(id=tarea.id).update(
+                estado=Tarea.PENDIENTE, disponible_en=ahora + _espera_reintento(tarea.intentos),
+                ultimo_error=str(error)[:2000],
+            )
+        return False
+    finally:
+        _tarea_actual.reset(token)
+
+    Tarea.objects.filter(id=tarea.id).update(estado=Tarea.COMPLETADA, terminada=timezone.now(), ultimo_error='')
+    return True
+
+
+def latir(ids):
+    """Renueva el latido de las tareas en proceso `ids` (las que ejecuta este worker)."""
+    if not ids:
+        return 0
+    return Tarea.objects.filter(id__in=ids, estado=Tarea.EN_PROCESO).update(latido=timezone.now())
+
+
+def recuperar_abandonadas():
+    """
+    Tareas en proceso cuyo worker dejó de latir: vuelven a la cola, o quedan
+    fallidas si ya agotaron sus intentos. Devuelve (devueltas, fallidas).
+    """
+    ahora = timezone.now()
+    abandonadas = Tarea.objects.filter(
+        estado=Tarea.EN_PROCESO, latido__lt=ahora - timedelta(seconds=settings.TAREAS_TIMEOUT_SEGUNDOS),
+    )
+    fallidas = abandonadas.filter(intentos__gte=F('max_intentos')).update(
+        estado=Tarea.FALLIDA, terminada=ahora, ultimo_error='El worker dejó de responder durante la ejecución.',
+    )
+    devueltas = abandonadas.update(estado=Tarea.PENDIENTE, disponible_en=ahora)
+    return devueltas, fallidas
+
+
+def purgar_completadas():
+    """Borra las tareas completadas más antiguas que TAREAS_RETENCION_DIAS."""
+    limite = timezone.now() - timedelta(days=settings.TAREAS_RETENCION_DIAS)
+    return Tarea.objects.filter(estado=Tarea.COMPLETADA, terminada__lt=limite).delete()[0]
+
+
+def metricas(ventana_segundos=300):
+    """
+    Profundidad de cada cola y latencias recientes:
+    - espera: desde disponible_en hasta que un worker la tomó
+    - ejecucion: desde que se tomó hasta que terminó
+    """
+    ahora = timezone.now()
+    colas = {}
+    for fila in Tarea.objects.filter(estado__in=[Tarea.PENDIENTE, Tarea.EN_PROCESO, Tarea.FALLIDA]).values(
+        'cola', 'estado',
+    ).annotate(total=Count('id'), mas_antigua=Min('disponible_en')):
+        cola = colas.setdefault(fila['cola'], {'pendientes': 0, 'en_proceso': 0, 'fallidas': 0, 'espera_max_segundos': 0.0})
+        clave = {Tarea.PENDIENTE: 'pendientes', Tarea.EN_PROCESO: 'en_proceso', Tarea.FALLIDA: 'fallidas'}[fila['estado']]
+        cola[clave] = fila['total']
+        if fila['estado'] == Tarea.PENDIENTE:
+            cola['espera_max_segundos'] = max(0.0, (ahora - fila['mas_antigua']).total_seconds())
+
+    duracion = lambda fin, inicio: ExpressionWrapper(F(fin) - F(inicio), output_field=DurationField())
+    recientes = Tarea.objects.filter(estado=Tarea.COMPLETADA, terminada__gte=ahora - timedelta(seconds=ventana_segundos))
+    latencia = recientes.aggregate(
+        completadas=Count('id'),
+        espera_media=Avg(duracion('iniciada', 'disponible_en')),
+        espera_max=Max(duracion('iniciada', 'disponible_en')),
+        ejecucion_media=Avg(duracion('terminada', 'iniciada')),
+    )
+    segundos = lambda valor: valor.total_seconds() if valor is not None else None
+    return {
+        'colas': colas,
+        'ventana_segundos': ventana_segundos,
+        'completadas': latencia['completadas'],
+        'espera_media_segundos': segundos(latencia['espera_media']),
+        'espera_max_segundos': segundos(latencia['espera_max']),
+        'ejecucion_media_segundos': segundos(latencia['ejecucion_media']),
+        'generado': time.time(),
+    }
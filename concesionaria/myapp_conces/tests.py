@@ -1,3 +1,1582 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import runpy
+import shutil
+import smtplib
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import F, Sum
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import OperationalError
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from PIL import Image
+
+from concesionaria import routers
+from concesionaria.media import servir_media
+from myapp_conces import (
+    analisis_precios, arranque, auditoria, autocompletado, cache_automoviles, carritos, correo, eventos, imagenes,
+    importacion, limites, recomendaciones, reportes, reservas, sucursales, tareas, views,
+)
+from myapp_conces.admin import PaginadorEstimado
+from myapp_conces.apps import verificar_sesiones
+from myapp_conces.models import (
+    Automovil, AutomovilSimilar, CambioAutomovil, Carrito, ClaveIdempotencia, Compra, ImportacionInventario, ItemCarrito,
+    MensajeContacto, Reserva, ResumenCambiosAutomovil, StockSucursal, Sucursal, Tarea,
+)
+
+
+# ========================================================================
+# RÉPLICAS DE LECTURA (concesionaria/routers.py)
+# ========================================================================
+@override_settings(REPLICA_HEALTH_SECONDS=60, REPLICA_RETRY_SECONDS=60)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        routers._salud_replicas.clear()
+        self.replica = mock.Mock()
+        for parche in (
+            mock.patch.dict(routers.settings.DATABASES, replica_0={'ENGINE': 'django.db.backends.postgresql'}),
+            mock.patch.object(routers, 'connections', {'replica_0': self.replica}),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_la_comprobacion_de_salud_se_recuerda(self):
+        for _ in range(3):
+            self.assertTrue(routers._replica_disponible('replica_0'))
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+
+    def test_una_replica_caida_no_se_reintenta_en_cada_consulta(self):
+        self.replica.ensure_connection.side_effect = OperationalError
+        for _ in range(3):
+            self.assertFalse(routers._replica_disponible('replica_0'))
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+
+    def test_una_replica_por_peticion(self):
+        router = routers.ReplicaRouter()
+        token = routers._usar_replica.set(True)
+        token_elegida = routers._replica_elegida.set(None)
+        try:
+            self.assertEqual({router.db_for_read(None) for _ in range(5)}, {'replica_0'})
+        finally:
+            routers._usar_replica.reset(token)
+            routers._replica_elegida.reset(token_elegida)
+
+    def test_error_en_la_replica_repite_la_vista_en_la_primaria(self):
+        lecturas = []
+
+        def vista(request):
+            lecturas.append(routers.ReplicaRouter().db_for_read(None))
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/catalogo/')
+        request.resolver_match = ResolverMatch(vista, (), {})
+        middleware = routers.ReplicaMiddleware(lambda request: None)
+        token = routers._usar_replica.set(True)
+        token_elegida = routers._replica_elegida.set('replica_0')
+        try:
+            with self.assertLogs('concesionaria.routers', 'WARNING'):
+                response = middleware.process_exception(request, OperationalError('conexión perdida'))
+        finally:
+            routers._usar_replica.reset(token)
+            routers._replica_elegida.reset(token_elegida)
+
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(lecturas, [DEFAULT_DB_ALIAS])
+        self.replica.close.assert_called_once()
+        self.assertFalse(routers._replica_disponible('replica_0'))
+
+
+# ========================================================================
+# VEHÍCULOS SIMILARES (recomendaciones.py)
+# ========================================================================
+def _distancias_fuerza_bruta(precios, anios, marcas, k):
+    precio_n = recomendaciones._normalizar(np.log1p(precios))
+    anio_n = recomendaciones._normalizar(anios.astype(np.float64))
+    d = (precio_n[:, None] - precio_n) ** 2 + (anio_n[:, None] - anio_n) ** 2
+    d += recomendaciones.PESO_MARCA * (marcas[:, None] != marcas)
+    np.fill_diagonal(d, np.inf)
+    return np.sort(d, axis=1)[:, :k]
+
+
+@mock.patch.multiple(recomendaciones, FILAS_POR_BANDA=16, MARGEN_BANDA=8)
+class VecinosMasCercanosTests(SimpleTestCase):
+    def comparar(self, precios, anios, marcas, k=6):
+        indices, distancias = recomendaciones.vecinos_mas_cercanos(precios, anios, marcas, k)
+        np.testing.assert_allclose(distancias, _distancias_fuerza_bruta(precios, anios, marcas, k))
+        self.assertFalse((indices == np.arange(len(precios))[:, None]).any())
+
+    def test_igual_que_fuerza_bruta(self):
+        rng = np.random.default_rng(7)
+        n = 600
+        self.comparar(rng.lognormal(10, 1, n).round(-2), rng.integers(1995, 2025, n), rng.integers(0, 8, n))
+
+    def test_marcas_con_pocos_autos_buscan_en_otras_marcas(self):
+        rng = np.random.default_rng(8)
+        marcas = rng.integers(0, 100, 400)
+        marcas[:3] = 999  # Marca con menos de k autos
+        self.comparar(rng.lognormal(10, 1, 400), rng.integers(1995, 2025, 400), marcas)
+
+    def test_precios_iguales(self):
+        rng = np.random.default_rng(9)
+        self.comparar(np.full(300, 15000.0), rng.integers(2000, 2003, 300), rng.integers(0, 3, 300))
+
+    def test_menos_autos_que_vecinos(self):
+        indices, _ = recomendaciones.vecinos_mas_cercanos(np.array([1.0, 2.0]), np.array([2000, 2001]), np.array([0, 0]), 6)
+        self.assertEqual(indices.tolist(), [[1], [0]])
+
+
+class RecalcularSimilaresTests(TestCase):
+    def test_guarda_por_lotes_y_reemplaza_la_tabla(self):
+        for i in range(7):
+            Automovil.objects.create(marca='Ford' if i % 2 else 'Fiat', modelo=f'M{i}', anio=2015 + i, precio=10000 + 1000 * i)
+        Automovil.objects.create(marca='Ford', modelo='Vendido', anio=2020, precio=1, disponible=False)
+
+        with mock.patch.object(AutomovilSimilar.objects, 'bulk_create', wraps=AutomovilSimilar.objects.bulk_create) as crear:
+            self.assertEqual(recomendaciones.recalcular_similares(k=3, tamano_lote=5), 21)
+        self.assertEqual([len(llamada.args[0]) for llamada in crear.call_args_list], [5, 5, 5, 5, 1])
+        self.assertEqual(AutomovilSimilar.objects.count(), 21)
+        self.assertFalse(AutomovilSimilar.objects.filter(similar__disponible=False).exists())
+
+        self.assertEqual(recomendaciones.recalcular_similares(k=2), 14)
+        self.assertEqual(AutomovilSimilar.objects.count(), 14)
+
+
+# ========================================================================
+# MENSAJES DE CONTACTO (correo.py)
+# ========================================================================
+class BackendContador(EmailBackend):
+    """locmem que cuenta aperturas/cierres y rechaza a quien se llame 'Rechazado'."""
+    aperturas = cierres = 0
+
+    def open(self):
+        BackendContador.aperturas += 1
+        return True
+
+    def close(self):
+        BackendContador.cierres += 1
+
+    def send_messages(self, messages):
+        if any('Rechazado' in message.subject for message in messages):
+            raise smtplib.SMTPRecipientsRefused({})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='myapp_conces.tests.BackendContador', CONTACTO_MAX_INTENTOS=2)
+class EnviarLoteTests(TestCase):
+    def setUp(self):
+        BackendContador.aperturas = BackendContador.cierres = 0
+
+    def crear(self, *nombres, intentos=0):
+        return [
+            MensajeContacto.objects.create(nombre=nombre, correo='cliente@example.com', mensaje='Hola', intentos=intentos)
+            for nombre in nombres
+        ]
+
+    def test_una_conexion_por_lote(self):
+        self.assertEqual(correo.enviar_lote(self.crear('Ana', 'Beto', 'Carla')), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual((BackendContador.aperturas, BackendContador.cierres), (1, 1))
+        self.assertEqual(MensajeContacto.objects.filter(estado=MensajeContacto.ENVIADO).count(), 3)
+
+    def test_reabre_solo_despues_de_un_error_smtp(self):
+        mensajes = self.crear('Ana', 'Rechazado', 'Carla')
+        mensajes += self.crear('Rechazado otra vez', intentos=1)
+        with self.assertLogs('myapp_conces.correo', 'ERROR'):
+            self.assertEqual(correo.enviar_lote(mensajes), (2, 2))
+        self.assertEqual(BackendContador.aperturas, 2)
+
+        reintento, descartado = MensajeContacto.objects.filter(nombre__startswith='Rechazado').order_by('id')
+        self.assertEqual((reintento.estado, reintento.intentos), (MensajeContacto.PENDIENTE, 1))
+        self.assertGreater(reintento.proximo_intento, timezone.now())
+        self.assertEqual(descartado.estado, MensajeContacto.FALLIDO)
+
+
+# ========================================================================
+# COLA DE TAREAS (tareas.py)
+# ========================================================================
+def tarea_de_prueba(fallar=False):
+    if fallar:
+        raise RuntimeError('falló')
+
+
+class ReclamarTareasTests(TestCase):
+    def crear_tareas(self):
+        self.primera = tareas.encolar(tarea_de_prueba)
+        self.segunda = tareas.encolar(tarea_de_prueba)
+        tareas.encolar(tarea_de_prueba, cola='reportes')
+        tareas.encolar(tarea_de_prueba, retraso=3600)
+
+    def comprobar_reclamo(self):
+        self.crear_tareas()
+        reclamadas = tareas.reclamar(['default'], 1, trabajador='w1')
+        self.assertEqual([tarea.id for tarea in reclamadas], [self.primera.id])
+        self.assertEqual((reclamadas[0].estado, reclamadas[0].intentos, reclamadas[0].trabajador), (Tarea.EN_PROCESO, 1, 'w1'))
+
+        # Otro worker no vuelve a tomar la reclamada, ni las de otra cola o futuras
+        self.assertEqual([tarea.id for tarea in tareas.reclamar(['default'], 10, trabajador='w2')], [self.segunda.id])
+        self.assertEqual(tareas.reclamar(['default'], 10), [])
+
+    def test_reclamo_con_skip_locked(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True):
+            self.comprobar_reclamo()
+
+    def test_reclamo_con_update_condicional(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False):
+            self.comprobar_reclamo()
+
+    def test_update_condicional_no_pisa_una_fila_ya_reclamada(self):
+        self.crear_tareas()
+        pendientes = Tarea.objects.filter(cola='default', estado=Tarea.PENDIENTE, disponible_en__lte=timezone.now()).order_by('id')
+        filtrar = pendientes.filter
+
+        def reclamada_por_otro(*args, **kwargs):
+            # Otro worker gana la primera fila entre el SELECT y el UPDATE
+            Tarea.objects.filter(id=self.primera.id).update(estado=Tarea.EN_PROCESO)
+            return filtrar(*args, **kwargs)
+
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False), \
+                mock.patch.object(pendientes, 'filter', side_effect=reclamada_por_otro):
+            ids = tareas.reclamar_filas(pendientes, 10, trabajador='w1')
+        self.assertEqual(ids, [self.segunda.id])
+
+    def test_reintento_y_falla_definitiva(self):
+        tarea = tareas.encolar(tarea_de_prueba, max_intentos=2, fallar=True)
+        with self.assertLogs('myapp_conces.tareas', 'WARNING'):
+            self.assertFalse(tareas.ejecutar(tareas.reclamar(['default'], 1)[0]))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, Tarea.PENDIENTE)
+        self.assertGreater(tarea.disponible_en, timezone.now())
+
+        Tarea.objects.filter(id=tarea.id).update(disponible_en=timezone.now())
+        with self.assertLogs('myapp_conces.tareas', 'ERROR'):
+            self.assertFalse(tareas.ejecutar(tareas.reclamar(['default'], 1)[0]))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.ultimo_error), (Tarea.FALLIDA, 2, 'falló'))
+
+    def test_recupera_solo_las_tareas_sin_latido(self):
+        viva = tareas.encolar(tarea_de_prueba)
+        caida = tareas.encolar(tarea_de_prueba)
+        agotada = tareas.encolar(tarea_de_prueba, max_intentos=1)
+        tareas.reclamar(['default'], 10, trabajador='w1')
+        hace_rato = timezone.now() - timedelta(seconds=settings.TAREAS_TIMEOUT_SEGUNDOS + 1)
+        # Las tres empezaron hace rato, pero el worker de `viva` sigue latiendo
+        Tarea.objects.update(iniciada=hace_rato, latido=hace_rato)
+        self.assertEqual(tareas.latir([viva.id]), 1)
+
+        self.assertEqual(tareas.recuperar_abandonadas(), (1, 1))
+        estados = dict(Tarea.objects.values_list('id', 'estado'))
+        self.assertEqual(estados, {viva.id: Tarea.EN_PROCESO, caida.id: Tarea.PENDIENTE, agotada.id: Tarea.FALLIDA})
+        agotada.refresh_from_db()
+        self.assertIsNotNone(agotada.terminada)
+        self.assertIn('worker', agotada.ultimo_error)
+        # La devuelta se puede volver a reclamar
+        self.assertEqual([tarea.id for tarea in tareas.reclamar(['default'], 10)], [caida.id])
+
+
+# ========================================================================
+# EVENTOS DE STOCK (eventos.py)
+# ========================================================================
+class EventosStockTests(TestCase):
+    def test_agrupa_los_deltas_por_auto(self):
+        async def escuchar():
+            broker = eventos.MemoriaBroker()
+            suscripcion = broker.suscribir(eventos.CANAL_STOCK)
+            broker.publicar(eventos.CANAL_STOCK, {'id': 1, 'cantidad': 3})
+            broker.publicar(eventos.CANAL_STOCK, {'id': 2, 'cantidad': 1})
+            broker.publicar(eventos.CANAL_STOCK, {'id': 1, 'cantidad': 2})
+            broker.publicar('otro', {'id': 3})
+            primero = await suscripcion.recibir(timeout=1)
+            segundo = await suscripcion.recibir(timeout=0.01)
+            broker.cancelar(suscripcion)
+            broker.publicar(eventos.CANAL_STOCK, {'id': 1, 'cantidad': 0})
+            return primero, segundo, await suscripcion.recibir(timeout=0.01)
+
+        primero, segundo, cancelada = asyncio.run(escuchar())
+        self.assertEqual(sorted(primero, key=lambda delta: delta['id']), [{'id': 1, 'cantidad': 2}, {'id': 2, 'cantidad': 1}])
+        self.assertEqual((segundo, cancelada), ([], []))
+
+    def test_publica_solo_al_confirmar(self):
+        with mock.patch('myapp_conces.signals.publicar_stock') as publicar, \
+                mock.patch('myapp_conces.signals.publicar_eliminado') as eliminar:
+            with self.captureOnCommitCallbacks(execute=True):
+                automovil = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=9000, cantidad=2)
+                publicar.assert_not_called()
+            publicar.assert_called_once_with(automovil)
+
+            automovil_id = automovil.id
+            with self.captureOnCommitCallbacks(execute=True):
+                automovil.delete()
+            eliminar.assert_called_once_with(automovil_id)
+
+    def abrir_stream(self):
+        request = RequestFactory().get(reverse('public:stream_stock'), REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+
+        async def leer():
+            response = await views.stream_stock(request)
+            if response.status_code != 200:
+                return response, []
+            return response, [parte async for parte in response.streaming_content]
+        return asyncio.run(leer())
+
+    def test_sin_asgi_no_hay_canal_ni_script(self):
+        with self.settings(EVENTOS_SSE_ACTIVO=False):
+            with self.assertRaises(Http404):
+                self.abrir_stream()
+            self.assertNotContains(self.client.get(reverse('public:catalogo')), 'js/stock.js')
+        with self.settings(EVENTOS_SSE_ACTIVO=True):
+            self.assertContains(self.client.get(reverse('public:catalogo')), 'js/stock.js')
+
+    @override_settings(EVENTOS_SSE_ACTIVO=True, EVENTOS_DURACION_MAX_SEGUNDOS=0.05, EVENTOS_LATIDO_SEGUNDOS=0.01,
+                       THROTTLE_ACTIVO=False)
+    def test_el_stream_se_cierra_a_la_duracion_maxima(self):
+        response, partes = self.abrir_stream()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(partes[0], b'retry: 5000\n\n')
+        self.assertGreater(len(partes), 1)
+        self.assertTrue(all(parte == b': latido\n\n' for parte in partes[1:]))
+
+    @override_settings(EVENTOS_SSE_ACTIVO=True, EVENTOS_DURACION_MAX_SEGUNDOS=0.01, THROTTLE_ACTIVO=True,
+                       THROTTLE_LIMITES={'eventos': {'anonimo': '2/m', 'autenticado': '2/m'}}, THROTTLE_PROXIES_CONFIABLES=0)
+    def test_conexiones_limitadas_por_ip(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        estados = [self.abrir_stream()[0].status_code for _ in range(3)]
+        self.assertEqual(estados, [200, 200, 429])
+
+
+# ========================================================================
+# API DEL CATÁLOGO (api.py)
+# ========================================================================
+@override_settings(THROTTLE_ACTIVO=False)
+class ApiCatalogoTests(TestCase):
+    def setUp(self):
+        # Precios repetidos: el cursor tiene que desempatar por id
+        for numero, precio in enumerate([300, 100, 200, 100, 300, 100, 200]):
+            Automovil.objects.create(marca='Ford', modelo=f'M{numero}', anio=2015 + numero % 3, precio=precio)
+
+    def recorrer(self, **parametros):
+        """Sigue los cursores hasta la última página; devuelve los ids en orden."""
+        ids, cursor = [], None
+        while True:
+            datos = self.client.get('/api/v1/automoviles/', dict(parametros, **({'cursor': cursor} if cursor else {}))).json()
+            ids += [fila['id'] for fila in datos['resultados']]
+            cursor = datos['siguiente']
+            if cursor is None:
+                return ids
+
+    def test_paginas_en_orden_sin_saltos_ni_repetidos(self):
+        autos = list(Automovil.objects.values_list('id', 'precio', 'anio'))
+        esperados = {
+            'id': sorted(autos),
+            'precio': sorted(autos, key=lambda auto: (auto[1], auto[0])),
+            '-precio': sorted(autos, key=lambda auto: (-auto[1], auto[0])),
+            '-anio': sorted(autos, key=lambda auto: (-auto[2], auto[0])),
+        }
+        for orden, autos_ordenados in esperados.items():
+            self.assertEqual(self.recorrer(orden=orden, limite=2), [auto[0] for auto in autos_ordenados], orden)
+
+    def test_cambios_entre_paginas_no_desplazan_el_cursor(self):
+        primera = self.client.get('/api/v1/automoviles/', {'orden': 'precio', 'limite': 3}).json()
+        # Un auto nuevo que ordena antes del cursor no aparece ni corre las páginas
+        Automovil.objects.create(marca='Ford', modelo='Nuevo', anio=2020, precio=50)
+        resto = self.client.get('/api/v1/automoviles/', {'orden': 'precio', 'limite': 10, 'cursor': primera['siguiente']}).json()
+        ids = [fila['id'] for fila in primera['resultados'] + resto['resultados']]
+        esperados = Automovil.objects.exclude(modelo='Nuevo').order_by('precio', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(esperados))
+
+    def test_solo_los_campos_pedidos(self):
+        datos = self.client.get('/api/v1/automoviles/', {'fields': 'marca', 'orden': '-precio', 'limite': 1}).json()
+        self.assertEqual(list(datos['resultados'][0]), ['id', 'marca'])
+        self.assertIsNotNone(datos['siguiente'])
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'cursor': '!!!'}, {'orden': 'precio', 'cursor': 'WyJ4Il0'}, {'fields': 'color'}, {'orden': 'color'}, {'precio_min': 'mucho'}):
+            response = self.client.get('/api/v1/automoviles/', parametros)
+            self.assertEqual(response.status_code, 400, parametros)
+            self.assertIn('error', response.json())
+
+    def test_etag_devuelve_304_hasta_que_cambia_el_inventario(self):
+        response = self.client.get('/api/v1/automoviles/', {'limite': 2})
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/v1/automoviles/', {'limite': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Otros parámetros, otro ETag
+        self.assertEqual(self.client.get('/api/v1/automoviles/', {'limite': 3}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Automovil.objects.filter(modelo='M0').first().save()
+        response = self.client.get('/api/v1/automoviles/', {'limite': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+# ========================================================================
+# LÍMITE DE PETICIONES (limites.py)
+# ========================================================================
+@override_settings(THROTTLE_LIMITES={'prueba': {'anonimo': '10/m', 'autenticado': '10/m'}}, THROTTLE_PROXIES_CONFIABLES=0)
+class LimitePeticionesTests(SimpleTestCase):
+    INICIO = 6000.0  # Comienzo de una ventana de 60 s
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def peticion(self, **meta):
+        request = RequestFactory().get('/buscar/', **meta)
+        request.user = AnonymousUser()
+        return request
+
+    def verificar(self, momento, request=None):
+        with mock.patch.object(limites.time, 'time', return_value=self.INICIO + momento):
+            return limites.verificar_limite(request or self.peticion(), 'prueba')
+
+    def rafaga(self, momentos):
+        """Peticiones en esos segundos (desde INICIO); devuelve la respuesta de la última."""
+        cache.clear()
+        for momento in momentos:
+            espera = self.verificar(momento)
+        return espera
+
+    def test_corta_al_superar_el_limite(self):
+        # La 11.ª se rechaza: faltan 59 s de ventana y en la siguiente 11 * (1 - f) + 1 <= 10 pide f >= 2/11 (11 s)
+        self.assertEqual([self.verificar(1) for _ in range(11)], [None] * 10 + [70])
+
+    def test_retry_after_cuando_el_peso_de_la_ventana_anterior_alcanza(self):
+        # 10 en la ventana anterior y 5 en esta, a los 30 s: 10 * 0.5 + 5 = 10
+        momentos = [10] * 10 + [60 + 30] * 5 + [60 + 30]
+        espera = self.rafaga(momentos)
+        # Pasa cuando 10 * (1 - f) + 6 + 1 <= 10, es decir f >= 0.7 (42 s)
+        self.assertEqual(espera, 12)
+        self.assertIsNotNone(self.rafaga(momentos + [60 + 30 + espera - 1]))
+        self.assertIsNone(self.rafaga(momentos + [60 + 30 + espera]))
+
+    def test_retry_after_se_extiende_a_la_ventana_siguiente(self):
+        # 20 peticiones en esta ventana: en la siguiente siguen pesando
+        momentos = [30] * 20
+        espera = self.rafaga(momentos)
+        # Fin de esta ventana (30 s) + hasta que 20 * (1 - f) + 1 <= 10 (f >= 0.55, 33 s)
+        self.assertEqual(espera, 63)
+        self.assertIsNotNone(self.rafaga(momentos + [30 + espera - 1]))
+        self.assertIsNone(self.rafaga(momentos + [30 + espera]))
+
+    def test_ip_de_x_forwarded_for_segun_proxies_confiables(self):
+        request = self.peticion(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 200.1.1.1')
+        self.assertEqual(limites._identidad(request), 'ip10.0.0.1')
+        with self.settings(THROTTLE_PROXIES_CONFIABLES=1):
+            # La entrada de la izquierda la escribió el cliente: no cuenta
+            self.assertEqual(limites._identidad(request), 'ip200.1.1.1')
+            self.assertEqual(limites._identidad(self.peticion(REMOTE_ADDR='10.0.0.1')), 'ip10.0.0.1')
+        with self.settings(THROTTLE_PROXIES_CONFIABLES=2):
+            self.assertEqual(limites._identidad(request), 'ip6.6.6.6')
+
+
+# ========================================================================
+# IMPORTACIÓN MASIVA (importacion.py)
+# ========================================================================
+class ImportacionTests(TestCase):
+    def test_upsert_por_clave_natural(self):
+        existente = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=9000, cantidad=1)
+        filas = [
+            {'marca': 'Ford', 'modelo': 'Ka', 'anio': '2018', 'precio': '9500', 'cantidad': '4'},
+            {'marca': 'Fiat', 'modelo': 'Uno', 'anio': '2015', 'precio': '5000', 'cantidad': '0'},
+            {'marca': 'Fiat', 'modelo': 'Uno', 'anio': '2015', 'precio': '5200', 'cantidad': '2'},
+            {'marca': 'VW', 'modelo': 'Gol', 'anio': 'viejo', 'precio': '1', 'cantidad': '1'},
+            {'marca': ' Renault ', 'modelo': 'Clio ', 'anio': '2012', 'precio': '4000', 'cantidad': '0'},
+        ]
+        lotes = []
+        resultado = importacion.importar(filas, tamano_lote=2, progreso=lambda r: lotes.append(r.importadas))
+
+        self.assertEqual((resultado.procesadas, resultado.importadas, resultado.total_errores), (5, 4, 1))
+        self.assertEqual(resultado.errores[0][0], 4)
+        self.assertEqual(lotes, [2, 4, 4])  # Tras cada lote y al terminar
+        existente.refresh_from_db()
+        self.assertEqual((existente.precio, existente.cantidad), (9500, 4))
+        # La clave repetida en el mismo lote: gana la última fila
+        uno = Automovil.objects.get(marca='Fiat', modelo='Uno', anio=2015)
+        self.assertEqual((uno.precio, uno.cantidad, uno.disponible), (5200, 2, True))
+        self.assertFalse(Automovil.objects.get(marca='Renault', modelo='Clio').disponible)
+        self.assertEqual(Automovil.objects.count(), 3)
+
+    def test_lee_json_por_bloques_y_json_lines(self):
+        filas = [{'marca': 'Ford', 'modelo': f'M{i}', 'anio': 2000 + i} for i in range(20)]
+        lista = io.StringIO(' [\n' + ',\n'.join(map(json.dumps, filas)) + '\n]')
+        self.assertEqual(list(importacion._leer_json(lista, tamano_bloque=16)), filas)
+        lineas = io.StringIO('\n'.join(map(json.dumps, filas)) + '\n\n')
+        self.assertEqual(list(importacion.leer_filas(lineas, 'jsonl')), filas)
+        with self.assertRaises(ValueError):
+            list(importacion._leer_json(io.StringIO('[{"marca": "Ford"}'), tamano_bloque=4))
+
+    def test_filas_json_que_no_son_objetos(self):
+        lineas = io.StringIO(
+            '{"marca": "Ford", "modelo": "Ka", "anio": 2018, "precio": 9000, "cantidad": 1}\n'
+            '[1, 2]\n'
+            '{"marca": "Fiat", "modelo": \n'
+            'null\n'
+            '{"marca": "Fiat", "modelo": "Uno", "anio": 2015, "precio": 5000, "cantidad": 0}\n'
+        )
+        resultado = importacion.importar(importacion.leer_filas(lineas, 'jsonl'))
+        self.assertEqual((resultado.procesadas, resultado.importadas, resultado.total_errores), (5, 2, 3))
+        self.assertEqual([numero for numero, _ in resultado.errores], [2, 3, 4])
+        self.assertTrue(all('no es un objeto JSON' in mensaje for _, mensaje in resultado.errores))
+        self.assertIn('"modelo":', resultado.errores[1][1])
+        # También en una lista JSON
+        lista = io.StringIO('[{"marca": "VW", "modelo": "Gol", "anio": 2010, "precio": 3000, "cantidad": 1}, "texto"]')
+        resultado = importacion.importar(importacion.leer_filas(lista, 'json'))
+        self.assertEqual(resultado.errores, [(2, 'La fila no es un objeto JSON: texto')])
+
+
+class ImportacionEnSegundoPlanoTests(TestCase):
+    def subir(self, contenido):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(lambda: os.path.isdir(directorio) and os.rmdir(directorio))
+        ruta = os.path.join(directorio, 'subido.csv')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+        subida = ImportacionInventario.objects.create(nombre_archivo='autos.csv', ruta=ruta, formato='csv')
+        tareas.encolar(importacion.importar_archivo_en_segundo_plano, cola='importaciones', importacion_id=subida.id, max_intentos=2)
+        return subida
+
+    def ejecutar(self):
+        return tareas.ejecutar(tareas.reclamar(['importaciones'], 1)[0])
+
+    def test_guarda_el_resultado_y_borra_el_archivo(self):
+        subida = self.subir('marca,modelo,anio,precio,cantidad\nFord,Ka,2018,9000,2\nFord,Ka,mal,1,1\n')
+        self.assertTrue(self.ejecutar())
+        subida.refresh_from_db()
+        self.assertEqual(subida.estado, ImportacionInventario.COMPLETADA)
+        self.assertEqual((subida.procesadas, subida.importadas, subida.total_errores), (2, 1, 1))
+        self.assertEqual(subida.errores[0][0], 2)
+        self.assertIsNotNone(subida.terminada)
+        self.assertFalse(os.path.exists(subida.ruta))
+
+    def test_conserva_el_archivo_hasta_el_ultimo_intento(self):
+        subida = self.subir('marca,modelo,anio,precio,cantidad\nFord,Ka,2018,9000,2\n')
+        with mock.patch.object(importacion, 'importar', side_effect=OSError('disco lleno')):
+            with self.assertLogs('myapp_conces.tareas', 'WARNING'):
+                self.assertFalse(self.ejecutar())
+            subida.refresh_from_db()
+            self.assertEqual((subida.estado, subida.ultimo_error), (ImportacionInventario.PENDIENTE, 'disco lleno'))
+            self.assertTrue(os.path.exists(subida.ruta))
+
+            Tarea.objects.update(disponible_en=timezone.now())
+            with self.assertLogs('myapp_conces.tareas', 'ERROR'):
+                self.assertFalse(self.ejecutar())
+        subida.refresh_from_db()
+        self.assertEqual(subida.estado, ImportacionInventario.FALLIDA)
+        self.assertFalse(os.path.exists(subida.ruta))
+
+
+class ClaveNaturalMigracionTests(TransactionTestCase):
+    anterior = [('myapp_conces', '0011_tarea')]
+    siguiente = [('myapp_conces', '0012_automovil_clave_natural')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_no_borra_duplicados_y_los_lista(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.anterior)
+        AutomovilAntes = executor.loader.project_state(self.anterior).apps.get_model('myapp_conces', 'Automovil')
+        for precio in (9000, 9500):
+            AutomovilAntes.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=precio)
+
+        executor = MigrationExecutor(connection)
+        with self.assertRaisesMessage(RuntimeError, 'Ford Ka (2018): ids'):
+            executor.migrate(self.siguiente)
+        self.assertEqual(AutomovilAntes.objects.count(), 2)
+        AutomovilAntes.objects.filter(precio=9500).update(anio=2019)
+
+
+# ========================================================================
+# CACHÉ DE AUTOMÓVILES (cache_automoviles.py)
+# ========================================================================
+class CacheAutomovilesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_automoviles._l1.limpiar()
+        self.addCleanup(cache.clear)
+        self.addCleanup(cache_automoviles._l1.limpiar)
+        self.automovil = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=9000)
+
+    def consultas(self, funcion):
+        with CaptureQueriesContext(connection) as capturadas:
+            resultado = funcion()
+        return resultado, len(capturadas)
+
+    @override_settings(CACHE_COMPARTIDA=True)
+    def test_con_cache_compartida_lee_de_la_cache_hasta_invalidar(self):
+        self.assertEqual(self.consultas(lambda: cache_automoviles.obtener(self.automovil.id))[1], 1)
+        cache_automoviles._l1.limpiar()  # Otro proceso: solo comparte el L2
+        automovil, consultas = self.consultas(lambda: cache_automoviles.obtener(self.automovil.id))
+        self.assertEqual((automovil.precio, consultas), (9000, 0))
+
+        version = cache_automoviles.version_inventario()
+        Automovil.objects.filter(id=self.automovil.id).update(precio=9900)
+        cache_automoviles.invalidar_ahora([self.automovil.id])
+        self.assertNotEqual(cache_automoviles.version_inventario(), version)
+        self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 9900)
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_con_cache_local_usa_solo_el_l1_y_la_version_vive_en_la_base(self):
+        automovil, consultas = self.consultas(lambda: cache_automoviles.obtener(self.automovil.id))
+        self.assertEqual((automovil.precio, consultas), (9000, 1))
+        self.assertEqual(self.consultas(lambda: cache_automoviles.obtener(self.automovil.id))[1], 0)
+
+        version = cache_automoviles.version_inventario()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.automovil.precio = 9900
+            self.automovil.save()
+        nueva = cache_automoviles.version_inventario()
+        self.assertEqual(nueva, version + 1)
+        # Este proceso descartó su L1 al invalidar
+        self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 9900)
+
+        cache.clear()  # Otro proceso, con su propia caché local, ve la misma versión
+        self.assertEqual(cache_automoviles.version_inventario(), nueva)
+
+        # Sin invalidar (otro proceso): se ve al vencer el L1
+        Automovil.objects.filter(id=self.automovil.id).update(precio=10500)
+        self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 9900)
+        cache_automoviles._l1.limpiar()
+        self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 10500)
+        self.assertEqual(cache_automoviles.obtener_varios([self.automovil.id, 999999]).keys(), {self.automovil.id})
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_con_cache_local_no_guarda_lo_leido_antes_de_invalidar(self):
+        in_bulk = Automovil.objects.in_bulk
+
+        def leer_e_invalidar(ids):
+            leidos = in_bulk(ids)
+            # Otro hilo guarda el auto entre la lectura y el llenado del L1
+            Automovil.objects.filter(id=self.automovil.id).update(precio=9900)
+            cache_automoviles.invalidar_ahora([self.automovil.id])
+            return leidos
+
+        with mock.patch.object(Automovil.objects, 'in_bulk', side_effect=leer_e_invalidar):
+            self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 9000)
+        self.assertEqual(cache_automoviles.obtener(self.automovil.id).precio, 9900)
+
+
+# ========================================================================
+# RETENCIÓN DE CARRITOS (carritos.py)
+# ========================================================================
+def crear_usuario(nombre):
+    return get_user_model().objects.create_user(nombre)
+
+
+class RetencionCarritosTests(TestCase):
+    def setUp(self):
+        self.automovil = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=9000, cantidad=5)
+
+    def carrito(self, nombre, dias, activo, compra=False, reservado=0):
+        carrito = Carrito.objects.create(usuario=crear_usuario(nombre), activo=activo)
+        ItemCarrito.objects.create(carrito=carrito, automovil=self.automovil, cantidad=1)
+        if reservado:
+            Reserva.objects.create(carrito=carrito, automovil=self.automovil, cantidad=reservado, vence=timezone.now())
+            Automovil.objects.filter(id=self.automovil.id).update(reservado=F('reservado') + reservado)
+        if compra:
+            Compra.objects.create(usuario=carrito.usuario, carrito=carrito, total=9000)
+        Carrito.objects.filter(id=carrito.id).update(actualizado=timezone.now() - timedelta(days=dias))
+        return carrito
+
+    def test_expira_los_abandonados_y_libera_sus_reservas(self):
+        abandonado = self.carrito('abandono', 40, True, reservado=2)
+        reciente = self.carrito('reciente', 1, True, reservado=1)
+
+        self.assertEqual(carritos.expirar_abandonados(30, tamano_lote=1), 1)
+        self.assertFalse(Carrito.objects.get(id=abandonado.id).activo)
+        self.assertTrue(Carrito.objects.get(id=reciente.id).activo)
+        self.assertEqual(list(Reserva.objects.values_list('carrito_id', flat=True)), [reciente.id])
+        self.assertEqual(Automovil.objects.get(id=self.automovil.id).reservado, 1)
+
+    def test_purga_por_lotes_los_cerrados_sin_compra_y_los_archiva(self):
+        viejos = [self.carrito(f'viejo{i}', 100, False) for i in range(3)]
+        vendido = self.carrito('vendido', 100, False, compra=True)
+        cerrado_hace_poco = self.carrito('poco', 5, False)
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        archivo = os.path.join(directorio, 'carritos.jsonl.gz')
+
+        self.assertEqual(carritos.purgar_cerrados(90, tamano_lote=2, archivo=archivo), 3)
+        self.assertEqual(set(Carrito.objects.values_list('id', flat=True)), {vendido.id, cerrado_hace_poco.id})
+        self.assertEqual(ItemCarrito.objects.count(), 2)
+        with gzip.open(archivo, 'rt', encoding='utf-8') as entrada:
+            archivados = [json.loads(linea) for linea in entrada]
+        self.assertEqual(sorted(carrito['id'] for carrito in archivados), [carrito.id for carrito in viejos])
+        self.assertEqual(archivados[0]['items'], [{'automovil_id': self.automovil.id, 'cantidad': 1}])
+
+    def test_purga_claves_de_idempotencia_vencidas(self):
+        usuario = crear_usuario('cliente')
+        vieja = ClaveIdempotencia.objects.create(usuario=usuario, clave='vieja', respuesta={})
+        ClaveIdempotencia.objects.create(usuario=usuario, clave='nueva', respuesta={})
+        ClaveIdempotencia.objects.filter(id=vieja.id).update(creado=timezone.now() - timedelta(hours=48))
+        self.assertEqual(carritos.purgar_claves_idempotencia(24), 1)
+        self.assertEqual(list(ClaveIdempotencia.objects.values_list('clave', flat=True)), ['nueva'])
+
+
+# ========================================================================
+# AUTOCOMPLETADO (autocompletado.py)
+# ========================================================================
+@override_settings(AUTOCOMPLETADO_MAX_SUGERENCIAS=3, AUTOCOMPLETADO_REVISION_SEGUNDOS=3600)
+@mock.patch.object(autocompletado, 'UMBRAL_MEMO', 3)
+class AutocompletadoTests(TestCase):
+    def setUp(self):
+        modelos = {'Toyota': ['Corolla', 'Camry', 'Hilux'], 'Citroën': ['C3', 'Berlingo'], 'Tesla': ['Model 3']}
+        for marca, nombres in modelos.items():
+            for numero, modelo in enumerate(nombres):
+                for anio in range(2018, 2018 + numero + 1):
+                    Automovil.objects.create(marca=marca, modelo=modelo, anio=anio, precio=10000)
+        autocompletado.indice.construir()
+        self.addCleanup(setattr, autocompletado.indice, 'version', None)
+        self.addCleanup(setattr, autocompletado.indice, '_reconstruyendo', False)
+
+    def comparar_con_indice_nuevo(self):
+        nuevo = autocompletado.IndicePrefijos()
+        nuevo.construir()
+        prefijos = {clave[:largo] for clave, _ in nuevo._claves for largo in range(1, len(clave) + 1)}
+        for prefijo in sorted(prefijos):
+            self.assertEqual(autocompletado.indice.sugerir(prefijo, 3), nuevo.sugerir(prefijo, 3), prefijo)
+
+    def test_sugerencias_por_prefijo_y_sin_acentos(self):
+        self.assertEqual(autocompletado.indice.sugerir('TOY', 2), [('Toyota', 6), ('Toyota Hilux', 3)])
+        self.assertEqual(autocompletado.indice.sugerir('citroen b', 3), [('Citroën Berlingo', 2), ('Citroën Berlingo 2018', 1), ('Citroën Berlingo 2019', 1)])
+        self.assertEqual(autocompletado.indice.sugerir('cor', 3)[0], ('Toyota Corolla', 1))
+        self.assertEqual(autocompletado.indice.sugerir('   ', 3), [])
+
+    def test_cambios_incrementales_igual_que_reconstruir(self):
+        with mock.patch.object(autocompletado.indice, 'construir') as construir:
+            with self.captureOnCommitCallbacks(execute=True):
+                Automovil.objects.create(marca='Toyota', modelo='Yaris', anio=2020, precio=10000)
+            with self.captureOnCommitCallbacks(execute=True):
+                Automovil.objects.filter(modelo='Hilux').first().delete()
+            hilux = Automovil.objects.filter(modelo='Hilux').first()
+            hilux.disponible = False
+            with self.captureOnCommitCallbacks(execute=True):
+                hilux.save()
+            self.comparar_con_indice_nuevo()
+        construir.assert_not_called()
+        self.assertEqual(autocompletado.indice.version, cache_automoviles.version_inventario())
+
+    def test_reconstruye_si_se_perdio_un_cambio(self):
+        hilos = []
+        # Un cambio de otro proceso que este no vio: la versión salta
+        Automovil.objects.create(marca='Tesla', modelo='Model Y', anio=2023, precio=10000)
+        cache_automoviles.invalidar_ahora([])
+        with self.captureOnCommitCallbacks(execute=True):
+            Automovil.objects.create(marca='Tesla', modelo='Model S', anio=2023, precio=10000)
+
+        # Mientras se reconstruye se sigue respondiendo con el índice anterior
+        with mock.patch.object(autocompletado, '_en_segundo_plano', side_effect=hilos.append):
+            self.assertEqual(autocompletado.indice.sugerir('tesla model', 3), [('Tesla Model 3', 1), ('Tesla Model 3 2018', 1)])
+            self.assertEqual(autocompletado.indice.sugerir('tesla model', 3), [('Tesla Model 3', 1), ('Tesla Model 3 2018', 1)])
+        self.assertEqual(len(hilos), 1)  # Una sola reconstrucción a la vez
+
+        hilos[0]()
+        self.assertEqual(autocompletado.indice.version, cache_automoviles.version_inventario())
+        self.assertEqual(autocompletado.indice.sugerir('tesla model y', 3), [('Tesla Model Y', 1), ('Tesla Model Y 2023', 1)])
+        self.comparar_con_indice_nuevo()
+
+    def test_solo_la_primera_busqueda_espera_la_construccion(self):
+        autocompletado.indice.version = None
+        with mock.patch.object(autocompletado, '_en_segundo_plano') as en_segundo_plano:
+            self.assertEqual(autocompletado.indice.sugerir('toyota c', 1), [('Toyota Camry', 2)])
+        en_segundo_plano.assert_not_called()
+        self.assertEqual(autocompletado.indice.version, cache_automoviles.version_inventario())
+
+
+# ========================================================================
+# STOCK POR SUCURSAL (sucursales.py)
+# ========================================================================
+class StockSucursalTests(TestCase):
+    def setUp(self):
+        self.centro = Sucursal.objects.create(nombre='Centro', latitud=-34.60, longitud=-58.38)
+        self.norte = Sucursal.objects.create(nombre='Norte', latitud=-34.45, longitud=-58.55)
+        self.lejana = Sucursal.objects.create(nombre='Córdoba', latitud=-31.42, longitud=-64.18)
+        self.auto = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000, cantidad=9)
+        self.otro = Automovil.objects.create(marca='Fiat', modelo='Uno', anio=2019, precio=8000, cantidad=1)
+        for sucursal, cantidad in ((self.centro, 2), (self.norte, 3), (self.lejana, 4)):
+            StockSucursal.objects.create(sucursal=sucursal, automovil=self.auto, cantidad=cantidad)
+        StockSucursal.objects.create(sucursal=self.lejana, automovil=self.otro, cantidad=1)
+
+    def stock(self, automovil):
+        return dict(StockSucursal.objects.filter(automovil=automovil).values_list('sucursal__nombre', 'cantidad'))
+
+    def test_asigna_primero_la_preferida_y_luego_la_que_mas_tiene(self):
+        asignaciones = sucursales.asignar_stock({self.auto.id: 6}, preferida_id=self.centro.id)
+        self.assertEqual(asignaciones, [(self.centro.id, self.auto.id, 2), (self.lejana.id, self.auto.id, 4)])
+        self.assertEqual(self.stock(self.auto), {'Centro': 0, 'Norte': 3, 'Córdoba': 0})
+
+    def test_sin_stock_suficiente_no_descuenta_nada(self):
+        with self.assertRaises(sucursales.StockInsuficiente) as contexto:
+            sucursales.asignar_stock({self.otro.id: 1, self.auto.id: 10})
+        self.assertEqual((contexto.exception.pedidos, contexto.exception.disponibles), (10, 9))
+        self.assertEqual(self.stock(self.auto), {'Centro': 2, 'Norte': 3, 'Córdoba': 4})
+        self.assertEqual(self.stock(self.otro), {'Córdoba': 1})
+
+    def test_auto_eliminado_es_stock_insuficiente(self):
+        eliminado_id = self.otro.id
+        self.otro.delete()
+        with self.assertRaises(sucursales.StockInsuficiente) as contexto:
+            sucursales.asignar_stock({self.auto.id: 1, eliminado_id: 1})
+        self.assertEqual(contexto.exception.automovil, f'el auto #{eliminado_id}')
+        self.assertEqual((contexto.exception.pedidos, contexto.exception.disponibles), (1, 0))
+
+    def test_sincronizar_totales(self):
+        sucursales.asignar_stock({self.otro.id: 1})
+        sucursales.sincronizar_totales([self.auto.id, self.otro.id])
+        self.auto.refresh_from_db()
+        self.otro.refresh_from_db()
+        self.assertEqual((self.auto.cantidad, self.auto.disponible), (9, True))
+        self.assertEqual((self.otro.cantidad, self.otro.disponible), (0, False))
+
+    def test_conciliar_lleva_la_diferencia_a_la_principal(self):
+        sin_stock = Automovil.objects.create(marca='Fiat', modelo='Palio', anio=2018, precio=7000, cantidad=2)
+        Automovil.objects.filter(id=self.auto.id).update(cantidad=12)
+        self.assertEqual(sucursales.conciliar_principal(), 2)
+        self.assertEqual(self.stock(self.auto)[settings.SUCURSAL_PRINCIPAL], 3)
+        self.assertEqual(self.stock(sin_stock), {settings.SUCURSAL_PRINCIPAL: 2})
+        self.assertEqual(sucursales.conciliar_principal(), 0)
+
+    def test_conciliar_no_deja_stock_negativo(self):
+        # El total baja por debajo de lo que tienen las otras sucursales
+        Automovil.objects.filter(id=self.auto.id).update(cantidad=5)
+        sucursales.conciliar_principal([self.auto.id])
+        self.assertEqual(self.stock(self.auto)[settings.SUCURSAL_PRINCIPAL], 0)
+        self.auto.refresh_from_db()
+        self.assertEqual(self.auto.cantidad, 9)
+
+    def test_cercanas_y_con_stock(self):
+        cercanas = sucursales.sucursales_cercanas(-34.61, -58.40, radio_km=50)
+        self.assertEqual(cercanas, [self.centro, self.norte])
+        sucursales.asignar_stock({self.auto.id: 5}, preferida_id=self.centro.id)
+        en_centro = sucursales.con_stock_en(Automovil.objects.all(), [self.centro.id])
+        self.assertFalse(en_centro.exists())
+        self.assertEqual(list(sucursales.con_stock_en(Automovil.objects.all(), [self.norte.id, self.lejana.id]).order_by('id')), [self.auto, self.otro])
+
+
+# ========================================================================
+# CARRITO E IDEMPOTENCIA (carritos.py)
+# ========================================================================
+@override_settings(THROTTLE_ACTIVO=False)
+class AgregarAlCarritoTests(TestCase):
+    def setUp(self):
+        self.usuario = crear_usuario('cliente')
+        self.client.force_login(self.usuario)
+        self.auto = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000, cantidad=5)
+        self.otro = Automovil.objects.create(marca='Fiat', modelo='Uno', anio=2019, precio=8000, cantidad=1)
+
+    def agregar(self, items, clave=None):
+        extra = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+        return self.client.post(
+            reverse('public:carrito_items'), json.dumps({'items': items}), content_type='application/json', **extra,
+        )
+
+    def items(self):
+        return dict(ItemCarrito.objects.filter(carrito__usuario=self.usuario).values_list('automovil_id', 'cantidad'))
+
+    def reservados(self):
+        return dict(Automovil.objects.values_list('id', 'reservado'))
+
+    def test_suma_items_y_reservas(self):
+        self.assertEqual(self.agregar([{'automovil_id': self.auto.id, 'cantidad': 2}]).status_code, 201)
+        response = self.agregar([{'automovil_id': self.auto.id}, {'automovil_id': self.otro.id}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['items'], [
+            {'automovil_id': self.auto.id, 'cantidad': 3}, {'automovil_id': self.otro.id, 'cantidad': 1},
+        ])
+        self.assertEqual(self.items(), {self.auto.id: 3, self.otro.id: 1})
+        self.assertEqual(self.reservados(), {self.auto.id: 3, self.otro.id: 1})
+        self.assertEqual(Carrito.objects.filter(usuario=self.usuario, activo=True).count(), 1)
+        self.assertEqual(Reserva.objects.get(automovil=self.auto).cantidad, 3)
+
+    def test_sin_el_orm_upsert_da_lo_mismo(self):
+        with mock.patch.object(carritos, 'MOTORES_UPSERT', ()), mock.patch.object(reservas, 'MOTORES_UPSERT', ()):
+            self.test_suma_items_y_reservas()
+
+    def test_sin_stock_libre_no_agrega_nada(self):
+        response = self.agregar([{'automovil_id': self.auto.id}, {'automovil_id': self.otro.id, 'cantidad': 2}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()['automovil_id'], response.json()['disponibles']), (self.otro.id, 1))
+        self.assertEqual(self.items(), {})
+        self.assertEqual(self.reservados(), {self.auto.id: 0, self.otro.id: 0})
+
+    def test_la_misma_clave_repite_la_respuesta(self):
+        primera = self.agregar([{'automovil_id': self.auto.id, 'cantidad': 2}], clave='abc')
+        repetida = self.agregar([{'automovil_id': self.auto.id, 'cantidad': 2}], clave='abc')
+        self.assertEqual((primera.status_code, repetida.status_code), (201, 200))
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(self.items(), {self.auto.id: 2})
+        self.assertEqual(self.reservados()[self.auto.id], 2)
+
+    def test_la_misma_clave_con_otro_contenido_responde_422(self):
+        self.agregar([{'automovil_id': self.auto.id, 'cantidad': 2}], clave='abc')
+        response = self.agregar([{'automovil_id': self.otro.id}], clave='abc')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.items(), {self.auto.id: 2})
+        self.assertEqual(self.reservados(), {self.auto.id: 2, self.otro.id: 0})
+
+    def test_clave_sin_huella_se_repite(self):
+        # Claves guardadas antes de que existiera la huella
+        self.agregar([{'automovil_id': self.auto.id}], clave='abc')
+        ClaveIdempotencia.objects.update(huella='')
+        self.assertEqual(self.agregar([{'automovil_id': self.otro.id}], clave='abc').status_code, 200)
+        self.assertEqual(self.items(), {self.auto.id: 1})
+
+
+# ========================================================================
+# RESERVAS Y CHECKOUT (reservas.py)
+# ========================================================================
+@override_settings(THROTTLE_ACTIVO=False)
+class ReservasCheckoutTests(TestCase):
+    def setUp(self):
+        self.auto = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000, cantidad=5)
+        sucursales.conciliar_principal()
+        self.ana = crear_usuario('ana')
+        self.beto = crear_usuario('beto')
+
+    def estado(self):
+        self.auto.refresh_from_db()
+        en_sucursales = StockSucursal.objects.filter(automovil=self.auto).aggregate(total=Sum('cantidad'))['total']
+        return {'cantidad': self.auto.cantidad, 'reservado': self.auto.reservado, 'sucursales': en_sucursales}
+
+    def comprar(self, usuario):
+        self.client.force_login(usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(reverse('public:finalizar_compra'))
+
+    def test_reservar_solo_lo_libre(self):
+        carritos.agregar(self.ana, {self.auto.id: 3})
+        with self.assertRaises(sucursales.StockInsuficiente) as contexto:
+            carritos.agregar(self.beto, {self.auto.id: 3})
+        self.assertEqual(contexto.exception.disponibles, 2)
+        self.assertEqual(self.estado(), {'cantidad': 5, 'reservado': 3, 'sucursales': 5})
+        self.assertFalse(ItemCarrito.objects.filter(carrito__usuario=self.beto).exists())
+
+    def test_compra_consume_la_reserva_y_el_stock_una_sola_vez(self):
+        carritos.agregar(self.ana, {self.auto.id: 2})
+        carritos.agregar(self.beto, {self.auto.id: 2})
+        self.assertEqual(self.comprar(self.ana).status_code, 200)
+        self.assertEqual(self.estado(), {'cantidad': 3, 'reservado': 2, 'sucursales': 3})
+        self.assertEqual(list(Reserva.objects.values_list('carrito__usuario__username', 'cantidad')), [('beto', 2)])
+        self.assertEqual(Compra.objects.get(usuario=self.ana).total, 20000)
+        # Lo apartado por beto sigue en pie y alcanza para su compra
+        self.comprar(self.beto)
+        self.assertEqual(self.estado(), {'cantidad': 1, 'reservado': 0, 'sucursales': 1})
+
+    def test_sin_reserva_no_se_vende_lo_apartado_por_otros(self):
+        carritos.agregar(self.ana, {self.auto.id: 2})
+        reservas.liberar(Reserva.objects.all())  # Venció la reserva de ana
+        carritos.agregar(self.beto, {self.auto.id: 4})
+        self.comprar(self.ana)
+        self.assertFalse(Compra.objects.exists())
+        self.assertEqual(self.estado(), {'cantidad': 5, 'reservado': 4, 'sucursales': 5})
+        self.assertTrue(Carrito.objects.get(usuario=self.ana).activo)
+
+    def test_confirmar_devuelve_lo_reservado_en_la_misma_transaccion(self):
+        carritos.agregar(self.ana, {self.auto.id: 2})
+        carrito = Carrito.objects.get(usuario=self.ana)
+        # Si la venta se revierte, la reserva sigue en pie
+        with self.assertRaises(ValueError), transaction.atomic():
+            reservas.confirmar(carrito.id, {self.auto.id: 2})
+            raise ValueError
+        self.assertEqual(self.estado(), {'cantidad': 5, 'reservado': 2, 'sucursales': 5})
+        self.assertTrue(Reserva.objects.filter(carrito=carrito).exists())
+
+        with auditoria.en_lote():
+            with self.captureOnCommitCallbacks() as al_confirmar:
+                reservas.confirmar(carrito.id, {self.auto.id: 2})
+            # Sin esperar a ningún callback
+            self.assertEqual(self.estado(), {'cantidad': 5, 'reservado': 0, 'sucursales': 3})
+            self.assertFalse(Reserva.objects.filter(carrito=carrito).exists())
+            for callback in al_confirmar:
+                callback()
+        self.assertEqual(CambioAutomovil.objects.get(accion=CambioAutomovil.VENTA).cambios, {'cantidad': [5, 3]})
+
+    def test_conciliar_reservado(self):
+        otro = Automovil.objects.create(marca='Fiat', modelo='Uno', anio=2019, precio=8000, cantidad=3)
+        sucursales.conciliar_principal()
+        carritos.agregar(self.ana, {self.auto.id: 2, otro.id: 1})
+        carritos.agregar(self.beto, {self.auto.id: 1})
+        # Un UPDATE perdido en un auto y una reserva borrada a mano en el otro
+        Automovil.objects.filter(id=self.auto.id).update(reservado=5)
+        Reserva.objects.filter(automovil=otro).delete()
+        sin_reservas = Automovil.objects.create(marca='VW', modelo='Gol', anio=2015, precio=5000, cantidad=1)
+
+        with mock.patch('myapp_conces.reservas.publicar_stock') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(reservas.conciliar_reservado(tamano_lote=1), 2)
+        self.assertEqual(
+            dict(Automovil.objects.values_list('id', 'reservado')),
+            {self.auto.id: 3, otro.id: 0, sin_reservas.id: 0},
+        )
+        self.assertEqual(sorted(llamada.args[0].id for llamada in publicar.call_args_list), [self.auto.id, otro.id])
+        # Ya cuadra: no hay nada que corregir
+        salida = io.StringIO()
+        call_command('conciliar_reservas', stdout=salida)
+        self.assertIn('0 automóviles', salida.getvalue())
+
+    def test_liberar_vencidas(self):
+        carritos.agregar(self.ana, {self.auto.id: 2})
+        carritos.agregar(self.beto, {self.auto.id: 1})
+        Reserva.objects.filter(carrito__usuario=self.ana).update(vence=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(reservas.liberar_vencidas(tamano_lote=1), 1)
+        self.assertEqual(self.estado()['reservado'], 1)
+
+
+# ========================================================================
+# AUDITORÍA (auditoria.py)
+# ========================================================================
+@override_settings(AUDITORIA_LOTE=3, AUDITORIA_MAX_SEGUNDOS=5)
+class AuditoriaTests(TestCase):
+    def setUp(self):
+        self.auto = Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000, cantidad=2)
+
+    def test_una_peticion_escribe_todo_en_un_insert(self):
+        usuario = crear_usuario('gestor')
+
+        def vista(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                for precio in (11000, 12000, 13000):
+                    auditoria.registrar(self.auto.id, CambioAutomovil.PRECIO, {'precio': (precio - 1000, precio)})
+            # Nada se escribe durante la vista
+            self.assertFalse(CambioAutomovil.objects.exists())
+            return HttpResponse()
+
+        request = RequestFactory().post('/')
+        request.user = usuario
+        with CaptureQueriesContext(connection) as consultas:
+            auditoria.AuditoriaMiddleware(vista)(request)
+        tabla = CambioAutomovil._meta.db_table
+        self.assertEqual(len([consulta for consulta in consultas if consulta['sql'].startswith(f'INSERT INTO "{tabla}"')]), 1)
+        self.assertEqual(
+            list(CambioAutomovil.objects.order_by('id').values_list('usuario_id', 'cambios')),
+            [(usuario.id, {'precio': [precio - 1000, precio]}) for precio in (11000, 12000, 13000)],
+        )
+
+    def test_lo_revertido_no_queda_en_el_historial(self):
+        with auditoria.en_lote(), self.captureOnCommitCallbacks(execute=True):
+            auditoria.registrar(self.auto.id, CambioAutomovil.EDITADO, {'cantidad': (2, 3)})
+            with self.assertRaises(ValueError), transaction.atomic():
+                auditoria.registrar(self.auto.id, CambioAutomovil.EDITADO, {'cantidad': (3, 4)})
+                raise ValueError
+        self.assertEqual(list(CambioAutomovil.objects.values_list('cambios', flat=True)), [{'cantidad': [2, 3]}])
+
+    def test_fuera_de_una_peticion_vacia_por_cantidad_o_por_tiempo(self):
+        buffer = auditoria._BufferProceso()
+
+        def agregar(momento, cantidad):
+            with mock.patch.object(auditoria.time, 'monotonic', return_value=momento):
+                buffer.agregar(CambioAutomovil(automovil_id=self.auto.id, accion=CambioAutomovil.EDITADO, fecha=timezone.now(), cambios={'cantidad': [0, cantidad]}))
+            return CambioAutomovil.objects.count()
+
+        self.assertEqual([agregar(100, 1), agregar(101, 2), agregar(102, 3)], [0, 0, 3])
+        # El más viejo espera AUDITORIA_MAX_SEGUNDOS aunque no se junten AUDITORIA_LOTE
+        self.assertEqual([agregar(200, 4), agregar(204, 5), agregar(205, 6)], [3, 3, 6])
+        buffer.agregar(CambioAutomovil(automovil_id=self.auto.id, accion=CambioAutomovil.EDITADO, fecha=timezone.now(), cambios={}))
+        buffer.vaciar()
+        self.assertEqual(CambioAutomovil.objects.count(), 7)
+
+    def test_un_error_al_escribir_no_propaga(self):
+        with mock.patch.object(CambioAutomovil.objects, 'bulk_create', side_effect=OperationalError('sin tabla')):
+            with self.assertLogs('myapp_conces.auditoria', 'ERROR'):
+                with auditoria.en_lote(), self.captureOnCommitCallbacks(execute=True):
+                    auditoria.registrar(self.auto.id, CambioAutomovil.EDITADO, {'cantidad': (2, 3)})
+
+    def test_actualizar_auditado_solo_anota_lo_que_cambio(self):
+        vendido = Automovil.objects.create(marca='Fiat', modelo='Uno', anio=2019, precio=8000, disponible=False)
+        with auditoria.en_lote(), self.captureOnCommitCallbacks(execute=True):
+            actualizados = auditoria.actualizar_auditado(Automovil.objects.all(), CambioAutomovil.EDITADO, disponible=False)
+        self.assertEqual(actualizados, 2)
+        self.assertEqual(
+            list(CambioAutomovil.objects.values_list('automovil_id', 'cambios')), [(self.auto.id, {'disponible': [True, False]})],
+        )
+        self.assertFalse(CambioAutomovil.objects.filter(automovil_id=vendido.id).exists())
+
+    def test_compactar_resume_por_auto_y_dia(self):
+        hace_un_anio = timezone.now() - timedelta(days=365)
+        CambioAutomovil.objects.bulk_create([
+            CambioAutomovil(automovil_id=self.auto.id, accion=CambioAutomovil.PRECIO, fecha=hace_un_anio + timedelta(seconds=segundos), cambios=cambios)
+            for segundos, cambios in enumerate([{'precio': ['100', '110']}, {'precio': ['110', '120'], 'cantidad': [2, 1]}, {'precio': ['120', '90']}])
+        ] + [CambioAutomovil(automovil_id=self.auto.id, accion=CambioAutomovil.PRECIO, fecha=timezone.now(), cambios={'precio': ['90', '95']})])
+        self.assertEqual(auditoria.compactar(90, tamano_lote=2), 3)
+        resumen = ResumenCambiosAutomovil.objects.get()
+        self.assertEqual((resumen.registros, resumen.cambios), (3, {'precio': ['100', '90'], 'cantidad': [2, 1]}))
+        self.assertEqual(list(CambioAutomovil.objects.values_list('cambios', flat=True)), [{'precio': ['90', '95']}])
+
+
+# ========================================================================
+# SESIONES (apps.py)
+# ========================================================================
+class VerificarSesionesTests(SimpleTestCase):
+    LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+    REDIS = 'django.core.cache.backends.redis.RedisCache'
+
+    def verificar(self, motor, backend):
+        with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{motor}', CACHES={'sesiones': {'BACKEND': backend}}):
+            verificar_sesiones()
+
+    def test_por_defecto_en_la_base(self):
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        self.verificar('db', self.LOCMEM)
+
+    def test_cache_local_se_rechaza(self):
+        for motor in ('cached_db', 'cache'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.verificar(motor, self.LOCMEM)
+
+    def test_cache_compartida_se_acepta(self):
+        for motor in ('cached_db', 'cache'):
+            self.verificar(motor, self.REDIS)
+
+
+# ========================================================================
+# REPORTE IMPRIMIBLE (reportes.py)
+# ========================================================================
+@override_settings(REPORTES_LOTE=2, THROTTLE_ACTIVO=False)
+class ReportesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media, REPORTES_STORAGE={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': os.path.join(self.media, '.reportes')},
+        })
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for modelo, anio, imagen in (('Ka', 2018, 'autos/ka.jpg'), ('Ka', 2019, 'autos/ka.jpg'), ('Ka', 2020, 'autos/ka.jpg'), ('Fiesta', 2020, '')):
+            Automovil.objects.create(marca='Ford', modelo=modelo, anio=anio, precio=10000, imagen=imagen)
+        Automovil.objects.create(marca='Fiat', modelo='Uno', anio=2019, precio=8000, disponible=False)
+
+    def ejecutar_tareas(self):
+        for tarea in tareas.reclamar(['reportes'], 10):
+            tareas.ejecutar(tarea)
+
+    def test_se_genera_en_segundo_plano_y_queda_listo(self):
+        clave = reportes.solicitar({'disponible': 'true'})
+        self.assertEqual(reportes.estado(clave), reportes.EN_PROCESO)
+        # Pedirlo otra vez mientras se genera no encola de nuevo
+        self.assertEqual(reportes.solicitar({'disponible': 'true'}), clave)
+        self.assertEqual(Tarea.objects.count(), 1)
+
+        with mock.patch.object(reportes, '_miniatura', return_value='data:image/jpeg;base64,') as miniatura:
+            self.ejecutar_tareas()
+        # Lotes de a dos (Fiesta, Ka | Ka, Ka): la imagen compartida se reduce una vez por lote
+        self.assertEqual(miniatura.call_count, 2)
+        self.assertEqual(reportes.estado(clave), reportes.LISTO)
+        with reportes.abrir(clave) as archivo:
+            html = archivo.read().decode()
+        self.assertIn('Fiesta', html)
+        self.assertNotIn('Uno', html)
+        self.assertEqual(os.listdir(os.path.join(self.media, '.reportes')), [f'inventario-{clave}.html'])
+
+        reportes.solicitar({'disponible': 'true'})
+        self.assertEqual(Tarea.objects.count(), 1)
+        # La carpeta está en MEDIA_ROOT pero no se sirve como media
+        self.assertEqual(self.client.get(f'/media/.reportes/inventario-{clave}.html').status_code, 404)
+
+    def test_si_falla_se_informa_y_se_puede_volver_a_pedir(self):
+        clave = reportes.solicitar({})
+        Tarea.objects.update(estado=Tarea.FALLIDA)
+        self.assertEqual(reportes.estado(clave), reportes.ERROR)
+        reportes.solicitar({})
+        self.assertEqual(reportes.estado(clave), reportes.EN_PROCESO)
+        self.assertEqual(Tarea.objects.filter(estado=Tarea.PENDIENTE).count(), 1)
+        self.assertIsNone(reportes.estado('0' * 32))
+
+    def test_el_estado_se_busca_por_la_referencia_indexada(self):
+        clave = reportes.solicitar({})
+        self.assertEqual(Tarea.objects.get().referencia, f'reporte:{clave}')
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(reportes.estado(clave), reportes.EN_PROCESO)
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('"referencia" =', consultas[0]['sql'])
+        self.assertNotIn('argumentos', consultas[0]['sql'].split('FROM')[1])
+
+    def test_otra_version_del_inventario_es_otro_reporte(self):
+        clave = reportes.solicitar({})
+        with self.captureOnCommitCallbacks(execute=True):
+            Automovil.objects.create(marca='Fiat', modelo='Palio', anio=2018, precio=7000)
+        self.assertNotEqual(reportes.solicitar({}), clave)
+
+    def test_purga_los_viejos(self):
+        storage = reportes.almacenamiento()
+        for clave in ('viejo', 'nuevo'):
+            storage.save(reportes.nombre_archivo(clave), io.BytesIO(b'<html></html>'))
+        hace_dos_dias = timezone.now().timestamp() - 48 * 3600
+        os.utime(storage.path(reportes.nombre_archivo('viejo')), (hace_dos_dias, hace_dos_dias))
+        self.assertEqual(reportes.purgar_viejos(), 1)
+        self.assertEqual(storage.listdir('')[1], [reportes.nombre_archivo('nuevo')])
+
+
+# ========================================================================
+# ARRANQUE (arranque.py y `manage.py warmup`)
+# ========================================================================
+def paso_que_falla():
+    raise RuntimeError('sin índice')
+
+
+@override_settings(ARRANQUE_PASOS=['myapp_conces.arranque.resolver_urls', 'myapp_conces.tests.paso_que_falla'])
+class ArranqueTests(TestCase):
+    def test_un_paso_que_falla_no_corta_el_arranque(self):
+        with self.assertLogs('myapp_conces.arranque', 'ERROR'):
+            resultados = arranque.calentar()
+        (resolver, _, armados, sin_error), (fallido, _, resultado, error) = resultados
+        self.assertEqual((resolver, sin_error), ('myapp_conces.arranque.resolver_urls', None))
+        self.assertGreater(armados, 1)
+        self.assertEqual((fallido, resultado, error), ('myapp_conces.tests.paso_que_falla', None, 'RuntimeError: sin índice'))
+
+    def test_warmup_mide_pasos_y_peticiones(self):
+        salida = io.StringIO()
+        with self.assertLogs('myapp_conces.arranque', 'ERROR'):
+            call_command('warmup', url=['/'], stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertTrue(lineas[0].startswith('myapp_conces.arranque.resolver_urls: '))
+        self.assertIn('myapp_conces.tests.paso_que_falla: RuntimeError: sin índice', lineas[1])
+        self.assertRegex(lineas[3], r'^/: 200, primera [\d.]+ ms, segunda [\d.]+ ms$')
+        self.assertIn('1 paso(s) fallaron', lineas[4])
+
+
+class DebugPorDefectoTests(SimpleTestCase):
+    def cargar(self, comando='runserver', **entorno):
+        entorno = {
+            nombre: valor for nombre, valor in os.environ.items() if nombre not in ('DJANGO_DEBUG', 'DJANGO_SECRET_KEY')
+        } | entorno
+        with mock.patch.dict(os.environ, entorno, clear=True), mock.patch.object(sys, 'argv', ['manage.py', comando]):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'concesionaria', 'settings.py'))
+
+    def test_apagado_salvo_que_se_pida(self):
+        self.assertFalse(self.cargar(DJANGO_SECRET_KEY='secreta')['DEBUG'])
+        self.assertFalse(self.cargar(DJANGO_DEBUG='0', DJANGO_SECRET_KEY='secreta')['DEBUG'])
+        self.assertTrue(self.cargar(DJANGO_DEBUG='1')['DEBUG'])
+
+    def test_sin_debug_la_clave_secreta_es_obligatoria(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DJANGO_SECRET_KEY'):
+            self.cargar()
+        self.assertEqual(self.cargar(DJANGO_SECRET_KEY='secreta')['SECRET_KEY'], 'secreta')
+        # En desarrollo y al correr los tests se usa la clave de ejemplo
+        self.assertTrue(self.cargar(DJANGO_DEBUG='1')['SECRET_KEY'].startswith('django-insecure-'))
+        self.assertTrue(self.cargar('test')['SECRET_KEY'].startswith('django-insecure-'))
+
+
+# ========================================================================
+# ANÁLISIS DE PRECIOS (analisis_precios.py)
+# ========================================================================
+@override_settings(PRECIOS_MIN_COMPARABLES=5, PRECIOS_MAX_ATIPICOS=1000)
+class AnalisisPreciosTests(TestCase):
+    def columnas(self, filas=3000, semilla=7):
+        generador = np.random.default_rng(semilla)
+        marcas = generador.choice(['Ford', 'ford ', 'Fiat', 'Toyota', 'Kia'], filas).tolist()
+        anios = generador.integers(2000, 2024, filas)
+        # Precios con repetidos y algunos extremos para que haya atípicos
+        precios = np.round(generador.lognormal(10, 0.3, filas), -2)
+        precios[generador.random(filas) < 0.02] *= 5
+        return marcas, [f'M{i}' for i in range(filas)], anios.tolist(), precios.tolist(), generador.integers(0, 5, filas).tolist()
+
+    def test_cuartiles_por_grupo_iguales_a_np_percentile(self):
+        generador = np.random.default_rng(3)
+        grupos = generador.integers(0, 40, 5000)
+        precios = generador.normal(100, 30, 5000)
+        orden = analisis_precios._ordenar(grupos, np.argsort(precios))
+        claves, conteos, cuartiles, indice = analisis_precios._cuartiles_por_grupo(grupos, precios, orden)
+        for i, clave in enumerate(claves):
+            del_grupo = precios[grupos == clave]
+            self.assertEqual(conteos[i], len(del_grupo))
+            np.testing.assert_allclose(cuartiles[i], np.percentile(del_grupo, [25, 50, 75]))
+        np.testing.assert_array_equal(claves[indice], grupos)
+
+    def test_analizar_contra_el_calculo_por_grupo(self):
+        marcas, modelos, anios, precios, cantidades = self.columnas()
+        resultado = analisis_precios.analizar(marcas, modelos, anios, precios, cantidades)
+        precios_np = np.array(precios)
+        marcas_np = np.array([marca.strip().lower() for marca in marcas])
+        anios_np = np.array(anios)
+        total_atipicos = 0
+        for resumen in resultado['marcas']:
+            de_la_marca = marcas_np == resumen['marca'].lower()
+            self.assertEqual(resumen['mediana'], round(float(np.median(precios_np[de_la_marca])), 2))
+            for punto in resumen['curva']:
+                grupo = precios_np[de_la_marca & (anios_np == punto['anio'])]
+                p25, p50, p75 = np.percentile(grupo, [25, 50, 75])
+                self.assertEqual((punto['autos'], punto['p25'], punto['mediana'], punto['p75']), (len(grupo), round(p25, 2), round(p50, 2), round(p75, 2)))
+                atipico = np.zeros(len(grupo), dtype=bool)
+                if len(grupo) >= settings.PRECIOS_MIN_COMPARABLES:
+                    margen = analisis_precios.FACTOR_IQR * (p75 - p25)
+                    atipico = (grupo < p25 - margen) | (grupo > p75 + margen)
+                total_atipicos += int(atipico.sum())
+                banda = np.percentile(grupo[~atipico], [25, 50, 75])
+                self.assertEqual(list(punto['banda'].values()), [round(valor, 2) for valor in banda])
+        self.assertEqual(resultado['total_atipicos'], total_atipicos)
+        self.assertGreater(total_atipicos, 0)
+        self.assertEqual(len(resultado['atipicos']), total_atipicos)
+        self.assertEqual({resumen['marca'] for resumen in resultado['marcas']}, {'Fiat', 'Ford', 'Kia', 'Toyota'})
+        self.assertEqual(list(resultado['percentiles'].values()), [round(valor, 2) for valor in np.percentile(precios_np, analisis_precios.PERCENTILES)])
+        self.assertEqual(resultado['unidades'], sum(cantidades))
+
+    def test_inventario_vacio(self):
+        self.assertEqual(analisis_precios.analizar([], [], [], [], [])['autos'], 0)
+
+    def test_se_recalcula_solo_si_cambia_el_inventario(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000, cantidad=2)
+        primero = analisis_precios.analisis()
+        with self.assertNumQueries(1):  # Solo version_inventario()
+            self.assertEqual(analisis_precios.analisis(), primero)
+        with self.captureOnCommitCallbacks(execute=True):
+            Automovil.objects.create(marca='Ford', modelo='Fiesta', anio=2020, precio=12000, cantidad=1)
+        self.assertEqual(analisis_precios.analisis()['autos'], 2)
+
+
+# ========================================================================
+# ADMIN DE AUTOMÓVILES (admin.py)
+# ========================================================================
+class AutomovilAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@autoventas.local', None))
+        self.autos = {
+            modelo: Automovil.objects.create(marca='Ford', modelo=modelo, anio=anio, precio=precio, cantidad=cantidad, disponible=False)
+            for modelo, anio, precio, cantidad in (
+                ('Ka', 1999, 9999, 1), ('Fiesta', 2000, 10000, 2), ('Focus', 2019, 24999, 0), ('Ranger', 2020, 25000, 3),
+            )
+        }
+
+    def listado(self, **parametros):
+        response = self.client.get(reverse('admin:myapp_conces_automovil_changelist'), parametros)
+        return sorted(automovil.modelo for automovil in response.context['cl'].result_list)
+
+    def test_filtros_por_rango_incluyen_desde_y_excluyen_hasta(self):
+        self.assertEqual(self.listado(rango_precio='0-10k'), ['Ka'])
+        self.assertEqual(self.listado(rango_precio='10k-25k'), ['Fiesta', 'Focus'])
+        self.assertEqual(self.listado(rango_precio='25k-50k'), ['Ranger'])
+        self.assertEqual(self.listado(rango_anio='-2000'), ['Ka'])
+        self.assertEqual(self.listado(rango_anio='2010s'), ['Focus'])
+        self.assertEqual(self.listado(rango_anio='2020+', rango_precio='25k-50k'), ['Ranger'])
+
+    def test_conteo_exacto_fuera_de_postgresql(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(PaginadorEstimado(Automovil.objects.filter(anio__gte=2000).order_by('id'), 2).count, 3)
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('COUNT(*)', consultas[0]['sql'])
+
+    def test_conteo_estimado_en_postgresql(self):
+        cursor = mock.MagicMock()
+        conexion = mock.MagicMock(vendor='postgresql')
+        conexion.cursor.return_value.__enter__.return_value = cursor
+        with mock.patch('myapp_conces.admin.connections', {DEFAULT_DB_ALIAS: conexion}):
+            cursor.fetchone.return_value = [250000]  # reltuples
+            self.assertEqual(PaginadorEstimado(Automovil.objects.order_by('id'), 50).count, 250000)
+            self.assertIn('reltuples', cursor.execute.call_args[0][0])
+            cursor.fetchone.return_value = [[{'Plan': {'Plan Rows': 12}}]]  # EXPLAIN: poco → COUNT(*) real
+            self.assertEqual(PaginadorEstimado(Automovil.objects.filter(anio__gte=2000).order_by('id'), 50).count, 3)
+            self.assertTrue(cursor.execute.call_args[0][0].startswith('EXPLAIN (FORMAT JSON) '))
+
+    def accion(self, accion, *modelos):
+        return self.client.post(reverse('admin:myapp_conces_automovil_changelist'), {
+            'action': accion, '_selected_action': [self.autos[modelo].id for modelo in modelos],
+        })
+
+    def test_acciones_masivas_quedan_auditadas(self):
+        with mock.patch('myapp_conces.admin.actualizar_auditado', wraps=auditoria.actualizar_auditado) as auditado:
+            self.accion('marcar_disponible', 'Ka', 'Focus')
+            self.accion('subir_precio_5', 'Ka', 'Ranger')
+        # Focus no tiene unidades: no se marca
+        self.assertEqual(list(Automovil.objects.filter(disponible=True).values_list('modelo', flat=True)), ['Ka'])
+        self.assertEqual(Automovil.objects.get(modelo='Ranger').precio, 26250)
+        self.assertEqual([llamada.args[1] for llamada in auditado.call_args_list], [CambioAutomovil.EDITADO, CambioAutomovil.PRECIO])
+        self.assertEqual(sorted(auditado.call_args_list[1].args[0].values_list('modelo', flat=True)), ['Ka', 'Ranger'])
+
+
+# ========================================================================
+# IMÁGENES (storage.py e imagenes.py)
+# ========================================================================
+class ImagenesTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ajustes = override_settings(MEDIA_ROOT=directorio, IMAGENES_EN_SEGUNDO_PLANO=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.storage = Automovil._meta.get_field('imagen').storage
+
+    def png(self, color):
+        salida = io.BytesIO()
+        Image.new('RGB', (40, 20), color).save(salida, format='PNG')
+        return ContentFile(salida.getvalue())
+
+    def envejecer(self, nombre, horas=48):
+        antes = time.time() - horas * 3600
+        os.utime(self.storage.path(nombre), (antes, antes))
+
+    def test_mismo_contenido_mismo_nombre(self):
+        primero = self.storage.save('autos/camaro.png', self.png('red'))
+        segundo = self.storage.save('autos/otro.png', self.png('red'))
+        distinto = self.storage.save('autos/camaro.png', self.png('blue'))
+        self.assertEqual(primero, segundo)
+        self.assertNotEqual(primero, distinto)
+        self.assertRegex(primero, r'^autos/[0-9a-f]{2}/[0-9a-f]{32}\.png$')
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(primero))), [os.path.basename(primero)])
+
+    def test_procesar_conserva_el_original(self):
+        nombre = self.storage.save('autos/camaro.png', self.png('red'))
+        auto = Automovil.objects.create(
+            marca='Chevrolet', modelo='Camaro', anio=2020, precio=50000, imagen=nombre, imagen_procesada=False,
+        )
+        # Otro auto con la misma foto (deduplicada) sigue viéndola
+        otro = Automovil.objects.create(marca='Chevrolet', modelo='Camaro', anio=2021, precio=52000, imagen=nombre)
+
+        self.assertTrue(imagenes.procesar_imagen(auto.id))
+        auto.refresh_from_db()
+        self.assertTrue(auto.imagen.name.endswith('.webp'))
+        self.assertTrue(auto.imagen_procesada)
+        self.assertTrue(self.storage.exists(nombre))
+        self.assertEqual(Automovil.objects.get(id=otro.id).imagen.name, nombre)
+        # Ya procesado: no se vuelve a tocar
+        self.assertFalse(imagenes.procesar_imagen(auto.id))
+
+    def test_purgar_borra_solo_los_archivos_sin_referencia(self):
+        usada = self.storage.save('autos/a.png', self.png('red'))
+        huerfana = self.storage.save('autos/b.png', self.png('green'))
+        reciente = self.storage.save('autos/c.png', self.png('blue'))
+        Automovil.objects.create(marca='Ford', modelo='Ka', anio=2018, precio=9000, imagen=usada)
+        self.envejecer(usada)
+        self.envejecer(huerfana)
+
+        self.assertEqual(imagenes.purgar_huerfanas(24), 1)
+        self.assertTrue(self.storage.exists(usada))
+        self.assertFalse(self.storage.exists(huerfana))
+        self.assertTrue(self.storage.exists(reciente))
+
+    def test_subida_deduplicada_no_se_purga(self):
+        nombre = self.storage.save('autos/a.png', self.png('red'))
+        self.envejecer(nombre)
+        # Una subida nueva reutiliza el archivo antes de guardar su fila
+        self.assertEqual(self.storage.save('autos/otra.png', self.png('red')), nombre)
+        self.assertEqual(imagenes.purgar_huerfanas(24), 0)
+        self.assertTrue(self.storage.exists(nombre))
+
+
+# ========================================================================
+# ARCHIVOS MULTIMEDIA (concesionaria/media.py)
+# ========================================================================
+class ServirMediaTests(SimpleTestCase):
+    CONTENIDO = bytes(range(100))
+    HASH = 'ab' + 'c' * 30
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ajustes = override_settings(MEDIA_ROOT=directorio, MEDIA_X_ACCEL_PREFIX='', MEDIA_SENDFILE_HEADER='')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for nombre in ('autos/viejo.jpg', f'autos/ab/{self.HASH}.webp'):
+            os.makedirs(os.path.join(directorio, os.path.dirname(nombre)), exist_ok=True)
+            with open(os.path.join(directorio, nombre), 'wb') as archivo:
+                archivo.write(self.CONTENIDO)
+        self.factory = RequestFactory()
+
+    def pedir(self, path=None, **cabeceras):
+        path = path or f'autos/ab/{self.HASH}.webp'
+        response = servir_media(self.factory.get(f'/media/{path}', headers=cabeceras), path)
+        self.addCleanup(response.close)
+        return response
+
+    def cuerpo(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_archivo_completo(self):
+        response = self.pedir()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cuerpo(response), self.CONTENIDO)
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(response['ETag'], f'"{self.HASH}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_nombre_sin_hash_no_es_inmutable(self):
+        response = self.pedir('autos/viejo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_rangos(self):
+        for rango, inicio, fin in (
+            ('bytes=10-19', 10, 19),
+            ('bytes=90-', 90, 99),          # Abierto: hasta el final
+            ('bytes=-5', 95, 99),           # Sufijo: últimos 5 bytes
+            ('bytes=-500', 0, 99),          # Sufijo más largo que el archivo
+            ('bytes=95-500', 95, 99),       # Fin más allá del archivo
+        ):
+            with self.subTest(rango=rango):
+                response = self.pedir(Range=rango)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.cuerpo(response), self.CONTENIDO[inicio:fin + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {inicio}-{fin}/100')
+                self.assertEqual(response['Content-Length'], str(fin - inicio + 1))
+
+    def test_varios_rangos_o_cabecera_invalida_devuelven_el_archivo(self):
+        for rango in ('bytes=0-1,5-6', 'bytes=-', 'items=0-5'):
+            with self.subTest(rango=rango):
+                response = self.pedir(Range=rango)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.cuerpo(response), self.CONTENIDO)
+
+    def test_rango_imposible(self):
+        for rango in ('bytes=100-', 'bytes=50-10', 'bytes=-0'):
+            with self.subTest(rango=rango):
+                response = self.pedir(Range=rango)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range_distinto_devuelve_el_archivo(self):
+        response = self.pedir(Range='bytes=0-9', If_Range='"otro"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pedir(Range='bytes=0-9', If_Range=f'"{self.HASH}"').status_code, 206)
+
+    def test_if_none_match(self):
+        response = self.pedir(If_None_Match=f'"{self.HASH}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"{self.HASH}"')
+        self.assertEqual(self.pedir(If_None_Match='"otro"').status_code, 200)
+
+    def test_x_accel_redirect(self):
+        with override_settings(MEDIA_X_ACCEL_PREFIX='/protected-media/'):
+            response = self.pedir(Range='bytes=0-9')
+        # El proxy resuelve el rango: Django no manda cuerpo
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/autos/ab/{self.HASH}.webp')
+        self.assertEqual(response.content, b'')
+        self.assertNotIn('Content-Range', response)
+
+    def test_x_sendfile(self):
+        with override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile'):
+            response = self.pedir('autos/viejo.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(settings.MEDIA_ROOT, 'autos', 'viejo.jpg'))
+
+    def test_archivos_ocultos_o_fuera_de_media(self):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, '.tmp'))
+        open(os.path.join(settings.MEDIA_ROOT, '.tmp', 'x'), 'wb').close()
+        for path in ('.tmp/x', '../etc/passwd', 'autos/no-existe.jpg'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.pedir(path)
@@ -10,6 +10,8 @@ Estructura:
 - /contacto/ → Formulario de contacto
 - /auto/<id>/ → Detalle público de un vehículo
 - /buscar/ → Búsqueda de vehículos
+- /buscar/sugerencias/ → Autocompletado del buscador (JSON)
+- /eventos/stock/ → Cambios de stock en vivo (Server-Sent Events)
 """
 
 from django.urls import path
@@ -31,10 +33,13 @@ urlpatterns = [
     # ========================================================================
     path('auto/<int:automovil_id>/', views.detalle_automovil, name='detalle_auto'),
     path('buscar/', views.buscar_automovil, name='buscar_automovil'),
+    path('buscar/sugerencias/', views.autocompletar, name='autocompletar'),
+    path('eventos/stock/', views.stream_stock, name='stream_stock'),
 
     # ===================== PROCESO DE COMPRA =====================
     path('carrito/', views.ver_carrito, name='ver_carrito'),
     path('carrito/agregar/<int:automovil_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
+    path('carrito/items/', views.carrito_items, name='carrito_items'),
     path('carrito/eliminar/<int:item_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
     path('carrito/finalizar/', views.finalizar_compra, name='finalizar_compra'),
 ]
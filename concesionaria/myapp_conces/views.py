@@ -1,9 +1,23 @@
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Automovil, Carrito, ItemCarrito, Compra
+from .models import Automovil, AutomovilSimilar, Carrito, ItemCarrito, Compra, MensajeContacto, Reserva, Sucursal
 from .forms import ContactoForm
+from . import cache_automoviles, carritos, reservas
+from .autocompletado import indice
+from .eventos import CANAL_STOCK, obtener_broker
+from .limites import limitar_peticiones
+from .sucursales import StockInsuficiente, con_stock_en, sincronizar_totales, sucursales_cercanas
 
 # Vista para la página de inicio
 def index(request):
@@ -13,28 +27,65 @@ def index(request):
     return render(request, 'index.html')
 
 # Vista para el formulario de contacto
+@limitar_peticiones('contacto', metodos=('POST',))
 def contacto(request):
     if request.method == 'POST':
         form = ContactoForm(request.POST)
         if form.is_valid():
-            # Procesar el formulario
+            # Guardar en la bandeja de salida: el correo lo envía `manage.py enviar_contactos`
             nombre = form.cleaned_data['nombre']
-            correo = form.cleaned_data['correo']
-            mensaje = form.cleaned_data['mensaje']
-            # Aquí podrías enviar un correo o guardar el mensaje en la base de datos
+            MensajeContacto.objects.create(
+                nombre=nombre,
+                correo=form.cleaned_data['correo'],
+                mensaje=form.cleaned_data['mensaje'],
+            )
             return render(request, 'contacto_exito.html', {'nombre': nombre})
     else:
         form = ContactoForm()
     return render(request, 'contacto.html', {'form': form})
 
+def _recordar_sucursal(request, sucursal_id):
+    """Sucursal preferida al finalizar la compra. Solo si cambió: asignar marca la sesión para guardar."""
+    if request.session.get('sucursal_id') != sucursal_id:
+        request.session['sucursal_id'] = sucursal_id
+
+
 # Vista para mostrar el catálogo de automóviles
 def catalogo(request):
     automoviles = Automovil.objects.all()
+    sucursales = Sucursal.objects.filter(activa=True)
+    contexto = {
+        'sucursales': sucursales, 'sucursal_id': None, 'cerca': None,
+        # Clave de idempotencia de los botones "Agregar": un doble clic no suma dos veces
+        'clave_carrito': uuid.uuid4().hex,
+    }
+
+    # "Disponible en mi sucursal" o "cerca de mí" (?cerca=lat,lon desde el navegador)
+    sucursales_ids = None
+    if request.GET.get('sucursal', '').isdigit():
+        sucursales_ids = [int(request.GET['sucursal'])]
+        contexto['sucursal_id'] = sucursales_ids[0]
+        _recordar_sucursal(request, sucursales_ids[0])
+    elif request.GET.get('cerca'):
+        try:
+            latitud, longitud = (float(valor) for valor in request.GET['cerca'].split(','))
+        except ValueError:
+            latitud = longitud = None
+        if latitud is not None:
+            cercanas = sucursales_cercanas(latitud, longitud)
+            sucursales_ids = [sucursal.id for sucursal in cercanas]
+            contexto['cerca'] = cercanas
+            if cercanas:
+                _recordar_sucursal(request, cercanas[0].id)
+    if sucursales_ids is not None:
+        automoviles = con_stock_en(automoviles, sucursales_ids)
+
     if not automoviles:
-        mensaje = "No hay automóviles disponibles en el catálogo."
-        return render(request, 'catalogo.html', {'mensaje': mensaje})
+        contexto['mensaje'] = "No hay automóviles disponibles en el catálogo."
+        return render(request, 'catalogo.html', contexto)
     
-    return render(request, 'catalogo.html', {'automoviles': automoviles})
+    contexto['automoviles'] = automoviles
+    return render(request, 'catalogo.html', contexto)
 
 # ========================================================================
 # NOTA: Las vistas de administración (inventario, crear, editar, eliminar)
@@ -48,27 +99,39 @@ def detalle_automovil(request, automovil_id):
     Vista pública para mostrar los detalles de un automóvil específico.
     Esta es la vista pública del catálogo, sin requerir autenticación.
     """
-    try:
-        automovil = Automovil.objects.get(id=automovil_id, disponible=True)
-        return render(request, 'detalle_auto.html', {'auto': automovil})
-    except Automovil.DoesNotExist:
+    automovil = cache_automoviles.obtener(automovil_id)
+    if automovil is None or not automovil.disponible:
         return render(request, 'catalogo.html', {
             'mensaje': 'El automóvil solicitado no está disponible.'
         })
+    # Recomendaciones precalculadas por `manage.py calcular_similares`
+    similares = [
+        fila.similar for fila in AutomovilSimilar.objects
+        .filter(automovil_id=automovil.id, similar__disponible=True)
+        .select_related('similar')
+        .order_by('posicion')
+    ]
+    return render(request, 'detalle_auto.html', {'auto': automovil, 'similares': similares})
 
 # Vista para buscar automóviles en el catálogo público
+@limitar_peticiones('busqueda')
 def buscar_automovil(request):
     """
     Vista pública para buscar automóviles en el catálogo.
     """
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     resultados = []
     
     if query:
-        resultados = Automovil.objects.filter(
-            (models.Q(marca__icontains=query) | models.Q(modelo__icontains=query)),
-            disponible=True
-        )
+        # Cada palabra debe aparecer en la marca, el modelo o el año,
+        # así funcionan las sugerencias "Toyota Corolla 2020"
+        filtro = models.Q()
+        for palabra in query.split():
+            coincide = models.Q(marca__icontains=palabra) | models.Q(modelo__icontains=palabra)
+            if palabra.isdigit():
+                coincide |= models.Q(anio=int(palabra))
+            filtro &= coincide
+        resultados = Automovil.objects.filter(filtro, disponible=True)
     
     return render(request, 'buscar_automovil.html', {
         'resultados': resultados, 
@@ -76,24 +139,171 @@ def buscar_automovil(request):
     })
 
 
+# Sugerencias mientras se escribe en el buscador (JSON)
+@limitar_peticiones('autocompletado')
+def autocompletar(request):
+    """
+    Vista pública: /buscar/sugerencias/?q=toy → las mejores coincidencias
+    de marca / modelo / año. Se responde desde un índice en memoria
+    (ver autocompletado.py), sin consultar la base.
+    """
+    query = request.GET.get('q', '')[:100]
+    sugerencias = indice.sugerir(query, settings.AUTOCOMPLETADO_MAX_SUGERENCIAS)
+    response = JsonResponse({
+        'q': query,
+        'sugerencias': [{'texto': texto, 'autos': autos} for texto, autos in sugerencias],
+    })
+    response['Cache-Control'] = 'public, max-age=30'
+    return response
+
+
+# Vista de eventos en vivo (Server-Sent Events)
+@limitar_peticiones('eventos')
+async def stream_stock(request):
+    """
+    Canal SSE con los cambios de stock de los automóviles (ver eventos.py).
+    Solo con EVENTOS_SSE_ACTIVO, que se enciende al servir por ASGI
+    (uvicorn, ver build.sh): bajo WSGI cada conexión abierta ocuparía un
+    worker entero. La conexión se cierra a los EVENTOS_DURACION_MAX_SEGUNDOS
+    y el navegador reconecta solo (retry), así ninguna queda abierta para siempre.
+    """
+    if not settings.EVENTOS_SSE_ACTIVO:
+        raise Http404
+
+    async def eventos():
+        broker = obtener_broker()
+        suscripcion = broker.suscribir(CANAL_STOCK)
+        fin = time.monotonic() + settings.EVENTOS_DURACION_MAX_SEGUNDOS
+        try:
+            yield 'retry: 5000\n\n'
+            while (restante := fin - time.monotonic()) > 0:
+                deltas = await suscripcion.recibir(timeout=min(settings.EVENTOS_LATIDO_SEGUNDOS, restante))
+                if deltas:
+                    yield f'event: stock\ndata: {json.dumps(deltas)}\n\n'
+                else:
+                    yield ': latido\n\n'  # Mantiene viva la conexión a través de proxies
+        finally:
+            broker.cancelar(suscripcion)
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular el stream
+    return response
+
+
+
 # ===================== PROCESO DE COMPRA =====================
 
+class PedidoInvalido(Exception):
+    pass
+
+
+def _cantidades(pares):
+    """[(automovil_id, cantidad)] del formulario o del JSON → {id: cantidad}, sumando repetidos."""
+    cantidades = {}
+    try:
+        for automovil_id, cantidad in pares:
+            automovil_id, cantidad = int(automovil_id), int(cantidad)
+            if not 1 <= cantidad <= settings.CARRITO_MAX_CANTIDAD:
+                raise PedidoInvalido(f'La cantidad debe estar entre 1 y {settings.CARRITO_MAX_CANTIDAD}.')
+            cantidades[automovil_id] = cantidades.get(automovil_id, 0) + cantidad
+    except (TypeError, ValueError):
+        raise PedidoInvalido('automovil_id y cantidad deben ser números enteros.')
+    if not cantidades:
+        raise PedidoInvalido('No se indicó ningún automóvil.')
+    if len(cantidades) > settings.CARRITO_MAX_ITEMS:
+        raise PedidoInvalido(f'Como máximo {settings.CARRITO_MAX_ITEMS} automóviles por petición.')
+    # Los autos salen de la caché (ver cache_automoviles.py), no de la base
+    autos = cache_automoviles.obtener_varios(cantidades)
+    no_disponibles = [automovil_id for automovil_id in cantidades if automovil_id not in autos or not autos[automovil_id].disponible]
+    if no_disponibles:
+        raise PedidoInvalido(f'Automóviles no disponibles: {", ".join(map(str, no_disponibles))}.')
+    return cantidades, autos
+
+
 @login_required
+@require_POST
+@limitar_peticiones('carrito')
 def agregar_al_carrito(request, automovil_id):
-    auto = get_object_or_404(Automovil, id=automovil_id, disponible=True)
-    carrito, creado = Carrito.objects.get_or_create(usuario=request.user, activo=True)
-    item, creado_item = ItemCarrito.objects.get_or_create(carrito=carrito, automovil=auto)
-    if not creado_item:
-        item.cantidad += 1
-        item.save()
-    messages.success(request, f"{auto} agregado al carrito.")
-    return redirect('public:catalogo')
+    """Botón "Agregar al carrito" (formulario POST) del catálogo y del detalle."""
+    destino = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(destino, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        destino = reverse('public:catalogo')
+    try:
+        cantidades, autos = _cantidades([(automovil_id, request.POST.get('cantidad', 1))])
+    except PedidoInvalido as error:
+        messages.error(request, str(error))
+        return redirect(destino)
+    try:
+        _, repetida = carritos.agregar(
+            request.user, cantidades, request.POST.get('clave', '')[:64] or None, carritos.huella_de(request),
+        )
+    except StockInsuficiente as error:
+        messages.error(request, f"No quedan unidades libres de {error.automovil}: otros clientes las tienen reservadas.")
+        return redirect(destino)
+    except carritos.ClaveReutilizada:
+        messages.error(request, "Ese formulario ya se envió con otros datos. Vuelve a intentarlo desde la página.")
+        return redirect(destino)
+    if not repetida:
+        messages.success(request, f"{autos[automovil_id]} agregado al carrito.")
+    return redirect(destino)
+
+
+@require_POST
+@limitar_peticiones('carrito')
+def carrito_items(request):
+    """
+    API del carrito (JSON). POST /carrito/items/ con uno o varios autos:
+
+        {"items": [{"automovil_id": 3, "cantidad": 2}, {"automovil_id": 8}]}
+
+    o un formulario con `automovil_id` (y `cantidad`) repetidos. Los autos
+    quedan reservados RESERVA_MINUTOS; si alguno no tiene unidades libres
+    responde 409 y no agrega ninguno. Con el header Idempotency-Key (o el
+    campo `clave`) los reintentos devuelven la misma respuesta sin volver
+    a sumar; la misma clave con otro contenido responde 422. Requiere
+    sesión y token CSRF.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Debes iniciar sesión.'}, status=401)
+    clave = request.headers.get('Idempotency-Key') or request.POST.get('clave') or None
+    if clave and len(clave) > 64:
+        return JsonResponse({'error': 'Idempotency-Key admite hasta 64 caracteres.'}, status=400)
+    try:
+        if request.content_type == 'application/json':
+            try:
+                items = json.loads(request.body)['items']
+                pares = [(item['automovil_id'], item.get('cantidad', 1)) for item in items]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                raise PedidoInvalido('Se esperaba {"items": [{"automovil_id": ..., "cantidad": ...}]}.')
+        else:
+            ids = request.POST.getlist('automovil_id')
+            cantidades = request.POST.getlist('cantidad') or [1] * len(ids)
+            if len(cantidades) != len(ids):
+                raise PedidoInvalido('Debe haber una cantidad por cada automovil_id.')
+            pares = zip(ids, cantidades)
+        cantidades, _ = _cantidades(pares)
+    except PedidoInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    try:
+        respuesta, repetida = carritos.agregar(request.user, cantidades, clave, carritos.huella_de(request))
+    except carritos.ClaveReutilizada:
+        return JsonResponse({'error': 'La Idempotency-Key ya se usó con otra petición.'}, status=422)
+    except StockInsuficiente as error:
+        return JsonResponse({
+            'error': f'No hay unidades libres suficientes de {error.automovil}.',
+            'automovil_id': getattr(error.automovil, 'id', None),
+            'disponibles': error.disponibles,
+        }, status=409)
+    response = JsonResponse(respuesta, status=200 if repetida else 201)
+    if repetida:
+        response['Idempotent-Replayed'] = 'true'
+    return response
 
 
 
 from django.contrib.auth import get_user_model
 from django.http import HttpResponseRedirect
-from django.urls import reverse
 
 def ver_carrito(request):
     if not request.user.is_authenticated:
@@ -104,7 +314,12 @@ def ver_carrito(request):
         return render(request, 'carrito.html', {'carrito': None, 'items': items, 'total': total})
     else:
         carrito = Carrito.objects.filter(usuario=request.user, activo=True).first()
-        items = carrito.items.all() if carrito else []
+        items = list(carrito.items.all()) if carrito else []
+        # Todos los autos del carrito en un solo viaje a la caché (no uno por item)
+        autos = cache_automoviles.obtener_varios(item.automovil_id for item in items)
+        items = [item for item in items if item.automovil_id in autos]
+        for item in items:
+            item.automovil = autos[item.automovil_id]
         total = sum(item.automovil.precio * item.cantidad for item in items)
         return render(request, 'carrito.html', {'carrito': carrito, 'items': items, 'total': total})
 
@@ -112,34 +327,39 @@ def ver_carrito(request):
 @login_required
 def eliminar_del_carrito(request, item_id):
     item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user, carrito__activo=True)
-    item.delete()
+    with transaction.atomic():
+        item.delete()
+        reservas.liberar(Reserva.objects.filter(carrito_id=item.carrito_id, automovil_id=item.automovil_id))
     messages.info(request, "Auto eliminado del carrito.")
     return redirect('public:ver_carrito')
 
 
 @login_required
 def finalizar_compra(request):
-    carrito = Carrito.objects.filter(usuario=request.user, activo=True).first()
-    if not carrito or not carrito.items.exists():
-        messages.error(request, "El carrito está vacío.")
+    try:
+        with transaction.atomic():
+            # Bloquear el carrito: un doble clic no genera dos compras
+            carrito = Carrito.objects.select_for_update().filter(usuario=request.user, activo=True).first()
+            # Precio y stock se leen de la base (no de la caché): aquí se cobra y se descuenta
+            items = list(carrito.items.select_related('automovil')) if carrito else []
+            if not items:
+                messages.error(request, "El carrito está vacío.")
+                return redirect('public:ver_carrito')
+            total = sum(item.automovil.precio * item.cantidad for item in items)
+            pedidos = {}
+            for item in items:
+                pedidos[item.automovil_id] = pedidos.get(item.automovil_id, 0) + item.cantidad
+
+            # Las reservas del carrito pasan a venta y se descuenta de las sucursales
+            reservas.confirmar(carrito.id, pedidos, preferida_id=request.session.get('sucursal_id'))
+            compra = Compra.objects.create(usuario=request.user, carrito=carrito, total=total)
+            carrito.activo = False
+            carrito.save()
+            # El total de cada auto se recalcula después, sin alargar esta transacción
+            transaction.on_commit(lambda: sincronizar_totales(pedidos))
+    except StockInsuficiente as error:
+        messages.error(request, f"No hay stock suficiente de {error.automovil}: quedan {error.disponibles}.")
         return redirect('public:ver_carrito')
-    total = sum(item.automovil.precio * item.cantidad for item in carrito.items.all())
-    # Descontar cantidad y marcar como no disponible si llega a 0
-    for item in carrito.items.all():
-        auto = item.automovil
-        if auto.cantidad >= item.cantidad:
-            auto.cantidad -= item.cantidad
-        else:
-            auto.cantidad = 0
-        # Actualizar disponibilidad según cantidad
-        if auto.cantidad > 0:
-            auto.disponible = True
-        else:
-            auto.disponible = False
-        auto.save()
-    compra = Compra.objects.create(usuario=request.user, carrito=carrito, total=total)
-    carrito.activo = False
-    carrito.save()
     messages.success(request, "¡Compra realizada con éxito!")
     return render(request, 'compra_exitosa.html', {'compra': compra})
 
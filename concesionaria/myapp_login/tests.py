@@ -1,3 +1,93 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from myapp_conces import reportes
+from myapp_conces.models import Automovil, ImportacionInventario, Tarea
+
+
+def crear_usuario(*permisos):
+    usuario = get_user_model().objects.create_user('gestor', password='clave-segura-123')
+    for permiso in permisos:
+        app_label, codename = permiso.split('.')
+        usuario.user_permissions.add(Permission.objects.get(content_type__app_label=app_label, codename=codename))
+    return usuario
+
+
+# ========================================================================
+# IMPORTACIÓN DE INVENTARIO
+# ========================================================================
+class ImportarInventarioViewTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(IMPORTACIONES_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(crear_usuario('myapp_conces.add_auto'))
+
+    def test_subida_encola_y_muestra_el_estado(self):
+        archivo = SimpleUploadedFile('autos.csv', b'marca,modelo,anio,precio,cantidad\nFord,Ka,2018,9000,2\n')
+        response = self.client.post(reverse('panel:importar_inventario'), {'archivo': archivo})
+
+        subida = ImportacionInventario.objects.get()
+        self.assertRedirects(response, reverse('panel:detalle_importacion', args=[subida.id]))
+        self.assertEqual((subida.nombre_archivo, subida.formato, subida.estado), ('autos.csv', 'csv', ImportacionInventario.PENDIENTE))
+        self.assertTrue(subida.ruta.startswith(self.directorio))
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.cola, tarea.argumentos), ('importaciones', {'importacion_id': subida.id}))
+
+        response = self.client.get(reverse('panel:detalle_importacion', args=[subida.id]))
+        self.assertContains(response, 'autos.csv')
+        self.assertTrue(response.context['en_curso'])
+        self.assertContains(self.client.get(reverse('panel:importar_inventario')), 'Importaciones recientes')
+
+    def test_detalle_muestra_las_filas_con_error(self):
+        subida = ImportacionInventario.objects.create(
+            nombre_archivo='autos.csv', ruta='/no/existe.csv', formato='csv', estado=ImportacionInventario.COMPLETADA,
+            procesadas=3, importadas=1, total_errores=2, errores=[[2, 'anio: Introduzca un número entero.']],
+        )
+        response = self.client.get(reverse('panel:detalle_importacion', args=[subida.id]))
+        self.assertContains(response, 'Fila 2:')
+        self.assertContains(response, 'y 1 errores más')
+        self.assertFalse(response.context['en_curso'])
+
+
+# ========================================================================
+# REPORTE IMPRIMIBLE
+# ========================================================================
+class ReporteInventarioViewTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(REPORTES_STORAGE={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.directorio},
+        })
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(crear_usuario('myapp_login.InventarioView'))
+
+    def test_encola_informa_el_estado_y_descarga(self):
+        Automovil.objects.create(marca='Ford', modelo='Ka', anio=2020, precio=10000)
+        response = self.client.get(reverse('panel:imprimir_inventario'), {'marca': 'ford'}, HTTP_ACCEPT='application/json')
+        self.assertEqual((response.status_code, response.json()['estado']), (202, reportes.EN_PROCESO))
+        estado_url, descarga_url = response.json()['estado_url'], response.json()['descarga_url']
+        self.assertEqual(self.client.get(descarga_url).status_code, 404)
+
+        tarea = Tarea.objects.get()
+        reportes.generar(**tarea.argumentos)
+        Tarea.objects.update(estado=Tarea.COMPLETADA)
+        self.assertEqual(self.client.get(estado_url).json()['estado'], reportes.LISTO)
+        response = self.client.get(descarga_url, {'descargar': '1'})
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('Ka', b''.join(response.streaming_content).decode())
+
+    def test_sin_permiso_no_encola(self):
+        self.client.force_login(get_user_model().objects.create_user('sin_permisos'))
+        self.assertEqual(self.client.get(reverse('panel:imprimir_inventario')).status_code, 302)
+        self.assertFalse(Tarea.objects.exists())
@@ -10,9 +10,15 @@ Estructura:
 - /panel/logout/ → Cerrar sesión
 - /panel/inventario/ → Ver inventario completo
 - /panel/crear/ → Crear nuevo automóvil
+- /panel/importar/ → Importar inventario desde CSV/JSON
+- /panel/importar/<id>/ → Estado y resultado de una importación
 - /panel/editar/<id>/ → Editar automóvil
 - /panel/eliminar/<id>/ → Eliminar automóvil
 - /panel/detalle/<id>/ → Ver detalle administrativo
+- /panel/automoviles/print/ → Reporte imprimible del inventario (en segundo plano)
+- /panel/precios/analisis/ → Análisis de precios (página y datos/ en JSON)
+- /panel/tareas/metricas/ → Métricas de la cola de tareas (JSON)
+- /panel/arranque/metricas/ → Tiempos de arranque del worker (JSON)
 """
 
 from django.urls import path
@@ -38,7 +44,28 @@ urlpatterns = [
     # CRUD DE AUTOMÓVILES - Operaciones administrativas
     # ========================================================================
     path('crear/', views.Crear_AutomovilView, name='crear_automovil'),
+    path('importar/', views.Importar_InventarioView, name='importar_inventario'),
+    path('importar/<int:importacion_id>/', views.Detalle_ImportacionView, name='detalle_importacion'),
     path('editar/<int:automovil_id>/', views.Editar_AutomovilView, name='editar_automovil'),
     path('eliminar/<int:automovil_id>/', views.Eliminar_AutomovilView, name='eliminar_automovil'),
     path('detalle/<int:automovil_id>/', views.Detalle_AutomovilView, name='detalle_automovil'),
+
+    # ========================================================================
+    # REPORTE IMPRIMIBLE - Generado en segundo plano, se descarga cuando está listo
+    # ========================================================================
+    path('automoviles/print/', views.Imprimir_InventarioView, name='imprimir_inventario'),
+    path('automoviles/print/<str:clave>/', views.Estado_ReporteView, name='estado_reporte'),
+    path('automoviles/print/<str:clave>/descargar/', views.Descargar_ReporteView, name='descargar_reporte'),
+
+    # ========================================================================
+    # ANÁLISIS DE PRECIOS - Requiere permiso manage_precio
+    # ========================================================================
+    path('precios/analisis/', views.Analisis_PreciosView, name='analisis_precios'),
+    path('precios/analisis/datos/', views.Analisis_PreciosDatosView, name='analisis_precios_datos'),
+
+    # ========================================================================
+    # MONITOREO - Tareas en segundo plano y arranque de workers
+    # ========================================================================
+    path('tareas/metricas/', views.Metricas_TareasView, name='metricas_tareas'),
+    path('arranque/metricas/', views.Metricas_ArranqueView, name='metricas_arranque'),
 ]
\ No newline at end of file
@@ -4,9 +4,26 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Group
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
 from .models import CustomUser
-from myapp_conces.models import Automovil
-from myapp_conces.forms import AutomovilForm
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from myapp_conces.models import Automovil, CambioAutomovil, ImportacionInventario, Sucursal
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from myapp_conces import analisis_precios, arranque, cache_automoviles, reportes
+from myapp_conces.api import ErrorConsulta, filtrar
+from myapp_conces.auditoria import instantanea, registrar_diferencias
+from myapp_conces.forms import AutomovilForm, ImportarInventarioForm
+from myapp_conces.importacion import formato_de, importar_archivo_en_segundo_plano
+from myapp_conces.imagenes import programar_procesamiento
+from myapp_conces.sucursales import conciliar_principal
+from myapp_conces.tareas import encolar, metricas
 from .mixins import verificar_login_y_permisos, solo_login_requerido
 
 # ========================================================================
@@ -94,12 +111,29 @@ def InventarioView(request):
         return resultado
     
     # PASO 2: Si llegamos aquí, todo está bien, hacer el trabajo normal
-    automoviles = Automovil.objects.all().order_by('-id')
+    # Mismos filtros que la API y el reporte imprimible (?marca=...&disponible=...)
+    try:
+        filtrados = filtrar(request.GET, Automovil.objects.all())
+    except ErrorConsulta as error:
+        messages.error(request, str(error))
+        filtrados = Automovil.objects.all()
+    # Stock sumado de todas las sucursales, en la misma consulta del listado
+    automoviles = filtrados.annotate(
+        sucursales_con_stock=Count('stocks', filter=Q(stocks__cantidad__gt=0)),
+    ).order_by('-id')
+    conteos = Automovil.objects.aggregate(
+        total_autos=Count('id'),
+        autos_disponibles=Count('id', filter=Q(disponible=True)),
+        autos_no_disponibles=Count('id', filter=Q(disponible=False)),
+    )
+    sucursales = Sucursal.objects.annotate(
+        unidades=Coalesce(Sum('stocks__cantidad'), 0),
+        modelos=Count('stocks', filter=Q(stocks__cantidad__gt=0)),
+    )
     context = {
         'automoviles': automoviles,
-        'total_autos': automoviles.count(),
-        'autos_disponibles': automoviles.filter(disponible=True).count(),
-        'autos_no_disponibles': automoviles.filter(disponible=False).count(),
+        'sucursales': sucursales,
+        **conteos,
     }
     return render(request, 'inventario.html', context)
 
@@ -124,6 +158,12 @@ def Crear_AutomovilView(request):
             else:
                 automovil.disponible = False
             automovil.save()
+            registrar_diferencias(automovil.id, CambioAutomovil.CREADO, {}, instantanea(automovil))
+            # La cantidad del formulario es el total: la diferencia va a la sucursal principal
+            conciliar_principal([automovil.id])
+            if 'imagen' in form.changed_data and automovil.imagen:
+                # Decodificar y recomprimir la imagen queda fuera de la petición
+                programar_procesamiento(automovil)
             messages.success(request, f'Automóvil {automovil.marca} {automovil.modelo} creado exitosamente.')
             return redirect('panel:inventario')
         else:
@@ -133,6 +173,58 @@ def Crear_AutomovilView(request):
     
     return render(request, 'crear_automovil.html', {'form': form})
 
+def Importar_InventarioView(request):
+    """
+    Vista administrativa para cargar inventario desde un archivo.
+    El archivo se guarda por bloques y la importación corre en segundo plano;
+    su estado y resultado se consultan en Detalle_ImportacionView.
+    Requiere: autenticación + permiso add_auto
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_conces.add_auto')
+    if resultado:
+        return resultado
+
+    if request.method == 'POST':
+        form = ImportarInventarioForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            formato = formato_de(archivo.name)
+            os.makedirs(settings.IMPORTACIONES_DIR, exist_ok=True)
+            ruta = os.path.join(settings.IMPORTACIONES_DIR, f'{uuid.uuid4().hex}.{formato}')
+            with open(ruta, 'wb') as destino:
+                for chunk in archivo.chunks():
+                    destino.write(chunk)
+            importacion = ImportacionInventario.objects.create(
+                usuario=request.user, nombre_archivo=archivo.name[:255], ruta=ruta, formato=formato,
+            )
+            encolar(importar_archivo_en_segundo_plano, cola='importaciones', importacion_id=importacion.id)
+            messages.success(request, f'Archivo recibido. La importación #{importacion.id} se está procesando en segundo plano.')
+            return redirect('panel:detalle_importacion', importacion_id=importacion.id)
+        else:
+            messages.error(request, 'Por favor corrige los errores en el formulario.')
+    else:
+        form = ImportarInventarioForm()
+
+    importaciones = ImportacionInventario.objects.select_related('usuario')[:10]
+    return render(request, 'importar_inventario.html', {'form': form, 'importaciones': importaciones})
+
+def Detalle_ImportacionView(request, importacion_id):
+    """
+    Estado y resultado de una importación: filas procesadas, importadas y
+    las primeras filas con error. La página se recarga sola mientras corre.
+    Requiere: autenticación + permiso add_auto
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_conces.add_auto')
+    if resultado:
+        return resultado
+
+    importacion = get_object_or_404(ImportacionInventario, id=importacion_id)
+    return render(request, 'detalle_importacion.html', {
+        'importacion': importacion,
+        'en_curso': importacion.estado in (ImportacionInventario.PENDIENTE, ImportacionInventario.EN_PROCESO),
+        'errores_no_mostrados': importacion.total_errores - len(importacion.errores),
+    })
+
 @solo_login_requerido
 def Detalle_AutomovilView(request, automovil_id):
     """
@@ -140,7 +232,9 @@ def Detalle_AutomovilView(request, automovil_id):
     Incluye información administrativa no visible en la vista pública.
     Requiere: solo login (usando decorador súper simple)
     """
-    automovil = get_object_or_404(Automovil, id=automovil_id)
+    automovil = cache_automoviles.obtener(automovil_id)
+    if automovil is None:
+        raise Http404('No existe el automóvil.')
     return render(request, 'detalle_automovil.html', {'automovil': automovil})
 
 
@@ -158,6 +252,7 @@ def Editar_AutomovilView(request, automovil_id):
     automovil = get_object_or_404(Automovil, id=automovil_id)
     
     if request.method == 'POST':
+        antes = instantanea(automovil)  # Antes de que el formulario modifique la instancia
         form = AutomovilForm(request.POST, request.FILES, instance=automovil)
         if form.is_valid():
             automovil = form.save(commit=False)
@@ -167,6 +262,12 @@ def Editar_AutomovilView(request, automovil_id):
             else:
                 automovil.disponible = False
             automovil.save()
+            registrar_diferencias(automovil.id, CambioAutomovil.EDITADO, antes, instantanea(automovil))
+            # La cantidad del formulario es el total: la diferencia va a la sucursal principal
+            conciliar_principal([automovil.id])
+            if 'imagen' in form.changed_data and automovil.imagen:
+                # Decodificar y recomprimir la imagen queda fuera de la petición
+                programar_procesamiento(automovil)
             messages.success(request, f'Automóvil {automovil.marca} {automovil.modelo} actualizado exitosamente.')
             return redirect('panel:inventario')
         else:
@@ -187,8 +288,161 @@ def Eliminar_AutomovilView(request, automovil_id):
     
     if request.method == 'POST':
         marca_modelo = f"{automovil.marca} {automovil.modelo}"
+        antes = instantanea(automovil)
         automovil.delete()
+        registrar_diferencias(automovil_id, CambioAutomovil.ELIMINADO, antes, {})
         messages.success(request, f'Automóvil {marca_modelo} eliminado exitosamente.')
         return redirect('panel:inventario')
     
     return render(request, 'eliminar_automovil.html', {'automovil': automovil})
+
+
+def Metricas_TareasView(request):
+    """
+    Profundidad y latencia de la cola de tareas en segundo plano (JSON).
+    Requiere: autenticación + permiso ConfiguracionView
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_login.ConfiguracionView')
+    if resultado:
+        return resultado
+    return JsonResponse(metricas())
+
+
+def Metricas_ArranqueView(request):
+    """
+    Tiempos de arranque y de la primera petición del worker que responde (JSON).
+    Requiere: autenticación + permiso ConfiguracionView
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_login.ConfiguracionView')
+    if resultado:
+        return resultado
+    return JsonResponse(arranque.metricas())
+
+
+# ========================================================================
+# REPORTE IMPRIMIBLE - Se genera en segundo plano (ver myapp_conces/reportes.py)
+# ========================================================================
+
+CLAVE_REPORTE = re.compile(r'[0-9a-f]{32}')
+
+
+def _urls_reporte(clave):
+    return {
+        'estado_url': reverse('panel:estado_reporte', args=[clave]),
+        'descarga_url': reverse('panel:descargar_reporte', args=[clave]),
+    }
+
+
+def Imprimir_InventarioView(request):
+    """
+    Pide el reporte imprimible del inventario con los filtros de la URL.
+    Si ya está generado para esta versión del inventario se entrega en el
+    momento; si no, se encola y se muestra una página que espera a que esté.
+    Con Accept: application/json responde el estado y las URLs (202 si aún
+    se está generando).
+    Requiere: autenticación + permiso InventarioView
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_login.InventarioView')
+    if resultado:
+        return resultado
+
+    quiere_json = 'application/json' in request.headers.get('Accept', '')
+    try:
+        filtros = reportes.filtros_de(request.GET)
+    except ErrorConsulta as error:
+        if quiere_json:
+            return JsonResponse({'error': str(error)}, status=400)
+        messages.error(request, str(error))
+        return redirect('panel:inventario')
+
+    clave = reportes.solicitar(filtros)
+    estado = reportes.estado(clave)
+    urls = _urls_reporte(clave)
+    if quiere_json:
+        return JsonResponse({'estado': estado, **urls}, status=200 if estado == reportes.LISTO else 202)
+    if estado == reportes.LISTO:
+        return redirect(urls['descarga_url'])
+    return render(request, 'imprimir_inventario.html', {'filtros': filtros, **urls})
+
+
+def Estado_ReporteView(request, clave):
+    """
+    Estado del reporte (JSON): listo, en_proceso o error.
+    Requiere: autenticación + permiso InventarioView
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_login.InventarioView')
+    if resultado:
+        return resultado
+    estado = reportes.estado(clave) if CLAVE_REPORTE.fullmatch(clave) else None
+    if estado is None:
+        return JsonResponse({'error': 'No existe el reporte.'}, status=404)
+    return JsonResponse({'estado': estado, **_urls_reporte(clave)})
+
+
+def Descargar_ReporteView(request, clave):
+    """
+    Entrega el reporte generado (para imprimir; ?descargar=1 para guardarlo).
+    Requiere: autenticación + permiso InventarioView
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_login.InventarioView')
+    if resultado:
+        return resultado
+    if not CLAVE_REPORTE.fullmatch(clave) or reportes.estado(clave) != reportes.LISTO:
+        raise Http404('El reporte no existe o todavía no está listo.')
+    response = FileResponse(
+        reportes.abrir(clave),
+        content_type='text/html; charset=utf-8',
+        as_attachment=request.GET.get('descargar') == '1',
+        filename=f'inventario-{timezone.localdate():%Y-%m-%d}.html',
+    )
+    # El contenido de una clave no cambia: el navegador puede reutilizarlo
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+# ========================================================================
+# ANÁLISIS DE PRECIOS - Para quien gestiona precios (ver myapp_conces/analisis_precios.py)
+# ========================================================================
+
+def _analisis_de_marca(request):
+    """El análisis del inventario, con las marcas reducidas a ?marca= si se pidió."""
+    analisis = analisis_precios.analisis()
+    marca = request.GET.get('marca', '').strip()
+    if marca:
+        analisis = dict(
+            analisis,
+            marcas=[m for m in analisis['marcas'] if m['marca'].lower() == marca.lower()],
+            atipicos=[a for a in analisis['atipicos'] if a['marca'].lower() == marca.lower()],
+        )
+    return analisis, marca
+
+
+def Analisis_PreciosView(request):
+    """
+    Percentiles, curva de precios por marca y año, bandas sugeridas y
+    atípicos. Se calcula una vez por versión del inventario.
+    Requiere: autenticación + permiso manage_precio
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_conces.manage_precio')
+    if resultado:
+        return resultado
+    analisis, marca = _analisis_de_marca(request)
+    context = {
+        'analisis': analisis,
+        'marca': marca,
+        'todas_las_marcas': [m['marca'] for m in analisis_precios.analisis()['marcas']],
+        'min_comparables': settings.PRECIOS_MIN_COMPARABLES,
+    }
+    return render(request, 'analisis_precios.html', context)
+
+
+def Analisis_PreciosDatosView(request):
+    """
+    El mismo análisis en JSON (?marca= para una sola marca).
+    Requiere: autenticación + permiso manage_precio
+    """
+    resultado = verificar_login_y_permisos(request, 'myapp_conces.manage_precio')
+    if resultado:
+        return resultado
+    analisis, _ = _analisis_de_marca(request)
+    return JsonResponse(analisis, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,63 @@
+/**
+ * Autocompletado del buscador
+ * Concesionaria AutoVentas - Búsqueda pública
+ *
+ * Para cada input[data-autocompletar="<url>"] consulta las sugerencias
+ * mientras se escribe y las muestra en el [data-sugerencias] vecino.
+ * Al elegir una, se envía el formulario con ese texto.
+ */
+
+const Autocompletado = {
+    ESPERA_MS: 120,  // No pedir en cada tecla si se escribe rápido
+
+    iniciar: (input) => {
+        const lista = input.closest('form').querySelector('[data-sugerencias]');
+        let temporizador = null;
+        let ultima = '';
+
+        input.addEventListener('input', () => {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(async () => {
+                const texto = input.value.trim();
+                ultima = texto;
+                if (!texto) {
+                    Autocompletado.mostrar(input, lista, []);
+                    return;
+                }
+                const respuesta = await fetch(`${input.dataset.autocompletar}?q=${encodeURIComponent(texto)}`);
+                if (!respuesta.ok) return;
+                const datos = await respuesta.json();
+                if (datos.q.trim() === ultima) {  // Ignorar respuestas que llegan tarde
+                    Autocompletado.mostrar(input, lista, datos.sugerencias);
+                }
+            }, Autocompletado.ESPERA_MS);
+        });
+
+        input.addEventListener('blur', () => setTimeout(() => lista.classList.add('d-none'), 150));
+    },
+
+    mostrar: (input, lista, sugerencias) => {
+        lista.replaceChildren(...sugerencias.map(sugerencia => {
+            const opcion = document.createElement('button');
+            opcion.type = 'button';
+            opcion.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+            opcion.textContent = sugerencia.texto;
+            const cantidad = document.createElement('span');
+            cantidad.className = 'badge bg-primary rounded-pill';
+            cantidad.textContent = sugerencia.autos;
+            opcion.appendChild(cantidad);
+            opcion.addEventListener('mousedown', () => {
+                input.value = sugerencia.texto;
+                input.form.submit();
+            });
+            return opcion;
+        }));
+        lista.classList.toggle('d-none', sugerencias.length === 0);
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('[data-autocompletar]').forEach(Autocompletado.iniciar);
+});
+
+window.Autocompletado = Autocompletado;
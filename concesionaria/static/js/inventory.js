@@ -297,12 +297,33 @@ const InventoryManager = {
         document.body.removeChild(link);
     },
 
-    // Imprimir lista
+    // Imprimir lista: el reporte se genera en segundo plano con los filtros
+    // actuales; se consulta su estado hasta que está listo y se abre
     printInventory: () => {
-        const printWindow = window.open('/panel/automoviles/print/', '_blank');
-        printWindow.onload = function() {
-            printWindow.print();
+        const params = new URLSearchParams(window.location.search);
+        const printWindow = window.open('', '_blank');
+        const consultar = (url) => {
+            fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                if (data.estado === 'listo') {
+                    printWindow.location.href = data.descarga_url;
+                    printWindow.onload = function() {
+                        printWindow.print();
+                    };
+                } else if (data.estado === 'en_proceso') {
+                    setTimeout(() => consultar(data.estado_url), 2000);
+                } else {
+                    printWindow.close();
+                    console.error('Error generando el reporte:', data.error || data.estado);
+                }
+            })
+            .catch(error => {
+                printWindow.close();
+                console.error('Error generando el reporte:', error);
+            });
         };
+        consultar(`/panel/automoviles/print/?${params.toString()}`);
     }
 };
 
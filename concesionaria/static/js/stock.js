@@ -0,0 +1,55 @@
+/**
+ * Stock en vivo
+ * Concesionaria AutoVentas - Catálogo e Inventario
+ *
+ * Escucha /eventos/stock/ (Server-Sent Events) y actualiza las tarjetas o
+ * filas marcadas con data-auto-id, sin recargar ni consultar al servidor.
+ *
+ * Marcado esperado dentro de cada [data-auto-id]:
+ *   [data-stock-cantidad]    → texto con la cantidad
+ *   [data-stock-disponible]  → visible solo si está disponible
+ *   [data-stock-agotado]     → visible solo si NO está disponible
+ *   [data-stock-libre]       → visible si está disponible y quedan unidades sin reservar
+ *   [data-stock-reservado]   → visible si no (todo vendido o apartado en carritos)
+ */
+
+const StockEnVivo = {
+    conectar: (url = '/eventos/stock/') => {
+        if (!window.EventSource) return;  // Navegadores antiguos: sin tiempo real
+
+        const fuente = new EventSource(url);
+        fuente.addEventListener('stock', (evento) => {
+            JSON.parse(evento.data).forEach(StockEnVivo.aplicar);
+        });
+        // EventSource reconecta solo (el servidor indica retry: 5000)
+    },
+
+    aplicar: (delta) => {
+        document.querySelectorAll(`[data-auto-id="${delta.id}"]`).forEach(elemento => {
+            if (delta.eliminado) {
+                elemento.remove();
+                return;
+            }
+            elemento.querySelectorAll('[data-stock-cantidad]').forEach(nodo => {
+                nodo.textContent = delta.cantidad;
+            });
+            elemento.querySelectorAll('[data-stock-disponible]').forEach(nodo => {
+                nodo.classList.toggle('d-none', !delta.disponible);
+            });
+            elemento.querySelectorAll('[data-stock-agotado]').forEach(nodo => {
+                nodo.classList.toggle('d-none', delta.disponible);
+            });
+            const libre = delta.disponible && delta.libres > 0;
+            elemento.querySelectorAll('[data-stock-libre]').forEach(nodo => {
+                nodo.classList.toggle('d-none', !libre);
+            });
+            elemento.querySelectorAll('[data-stock-reservado]').forEach(nodo => {
+                nodo.classList.toggle('d-none', libre);
+            });
+        });
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => StockEnVivo.conectar());
+
+window.StockEnVivo = StockEnVivo;